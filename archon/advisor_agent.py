@@ -2,69 +2,60 @@ from __future__ import annotations as _annotations
 
 from dataclasses import dataclass
 from dotenv import load_dotenv
-import logfire
-import asyncio
-import httpx
+from functools import cache
+from typing import List
+from pydantic_ai import Agent, RunContext
 import os
 import sys
-import json
-from typing import List
-from pydantic import BaseModel
-from pydantic_ai import Agent, ModelRetry, RunContext
-from pydantic_ai.models.anthropic import AnthropicModel
-from pydantic_ai.models.openai import OpenAIModel
-from openai import AsyncOpenAI
-from supabase import Client
 
 # Add the parent directory to sys.path to allow importing from the parent directory
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.utils import get_env_var
+from archon.model_registry import get_model
 from archon.agent_prompts import advisor_prompt
 from archon.agent_tools import get_file_content_tool
 
 load_dotenv()
 
-provider = get_env_var('LLM_PROVIDER') or 'OpenAI'
-llm = get_env_var('PRIMARY_MODEL') or 'gpt-4o-mini'
-base_url = get_env_var('BASE_URL') or 'https://api.openai.com/v1'
-api_key = get_env_var('LLM_API_KEY') or 'no-llm-api-key-provided'
-
-model = AnthropicModel(llm, api_key=api_key) if provider == "Anthropic" else OpenAIModel(llm, base_url=base_url, api_key=api_key)
-
-logfire.configure(send_to_logfire='if-token-present')
-
 @dataclass
 class AdvisorDeps:
     file_list: List[str]
 
-advisor_agent = Agent(
-    model,
-    system_prompt=advisor_prompt,
-    deps_type=AdvisorDeps,
-    retries=2
-)
-
-@advisor_agent.system_prompt  
-def add_file_list(ctx: RunContext[str]) -> str:
-    joined_files = "\n".join(ctx.deps.file_list)
-    return f"""
-    
-    Here is the list of all the files that you can pull the contents of with the
-    'get_file_content' tool if the example/tool/MCP server is relevant to the
-    agent the user is trying to build:
+@cache
+def get_advisor_agent() -> Agent:
+    """Build the advisor agent on first use."""
+    llm = get_env_var('PRIMARY_MODEL') or 'gpt-4o-mini'
+
+    advisor_agent = Agent(
+        get_model(llm),
+        system_prompt=advisor_prompt,
+        deps_type=AdvisorDeps,
+        retries=2
+    )
+
+    @advisor_agent.system_prompt  
+    def add_file_list(ctx: RunContext[str]) -> str:
+        joined_files = "\n".join(ctx.deps.file_list)
+        return f"""
+        
+        Here is the list of all the files that you can pull the contents of with the
+        'get_file_content' tool if the example/tool/MCP server is relevant to the
+        agent the user is trying to build:
 
-    {joined_files}
-    """
+        {joined_files}
+        """
 
-@advisor_agent.tool_plain
-def get_file_content(file_path: str) -> str:
-    """
-    Retrieves the content of a specific file. Use this to get the contents of an example, tool, config for an MCP server
-    
-    Args:
-        file_path: The path to the file
+    @advisor_agent.tool_plain
+    def get_file_content(file_path: str) -> str:
+        """
+        Retrieves the content of a specific file. Use this to get the contents of an example, tool, config for an MCP server
         
-    Returns:
-        The raw contents of the file
-    """
-    return get_file_content_tool(file_path)
\ No newline at end of file
+        Args:
+            file_path: The path to the file
+            
+        Returns:
+            The raw contents of the file
+        """
+        return get_file_content_tool(file_path)
+
+    return advisor_agent
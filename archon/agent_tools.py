@@ -1,40 +1,134 @@
+from __future__ import annotations as _annotations
+
 import os
+import re
 import sys
-from typing import List
-from supabase import Client
+import threading
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+from cachetools import TTLCache
 import logging
 import json
 
-# Remove imports related to old RAG functions
-# from openai import AsyncOpenAI (assuming it was only for embeddings)
-# from archon.utils.vector_db_utils import get_embedding, list_documentation_pages, list_documentation_titles, get_page_content (or similar)
-
-
 # Add parent directory for utils import
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-# Keep necessary utils imports if any
-# from utils.utils import get_env_var
+from utils.utils import get_env_var
+from archon.utils.supabase_retriever import retrieve_n8n_context
+from archon.utils.context_packer import pack_context, get_context_budget
+
+if TYPE_CHECKING:
+    from supabase import Client
 
 logger = logging.getLogger(__name__)
 
-# --- Remove obsolete RAG/Embedding functions ---
+# --- n8n context retrieval ---
+
+# Maximum number of keywords taken from the reasoner's KEYWORDS: line
+MAX_KEYWORDS = 8
+
+# Characters of ts_content kept per row when the context is stored in the graph state
+MAX_CONTEXT_CONTENT_CHARS = 2000
+
+# Retrieved context per normalized keyword set, retrieval mode and json_data choice,
+# shared by all threads (LRU with a TTL)
+_context_cache = TTLCache(
+    maxsize=int(get_env_var("N8N_CONTEXT_CACHE_SIZE") or 128),
+    ttl=float(get_env_var("N8N_CONTEXT_CACHE_TTL") or 3600)
+)
+_context_cache_lock = threading.Lock()
+
+def parse_keywords(text: str) -> List[str]:
+    """Extract the keywords from the last `KEYWORDS:` line of the reasoner's scope.
+
+    Args:
+        text: The scope document written by the reasoner
+
+    Returns:
+        The keywords in order of appearance, without markdown decoration
+    """
+    matches = re.findall(r"^[\s>*_`-]*KEYWORDS[*_`]*\s*:[*_`]*(.+)$", text or "", flags=re.IGNORECASE | re.MULTILINE)
+    if not matches:
+        return []
+
+    keywords = []
+    for keyword in matches[-1].split(","):
+        keyword = keyword.strip().strip("*_`'\".")
+        if keyword and keyword not in keywords:
+            keywords.append(keyword)
+    return keywords[:MAX_KEYWORDS]
+
+def normalize_keywords(keywords: List[str]) -> Tuple[str, ...]:
+    """Lowercase, deduplicate and sort keywords so equivalent sets share a cache entry."""
+    return tuple(sorted({" ".join(kw.lower().split()) for kw in keywords if kw.strip()}))
+
+def compact_context_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Keep only the fields the agents use, with a bounded ts_content."""
+    compact = {
+        "source_table": row.get("source_table"),
+        "name": row.get("name"),
+        "schema_projection": row.get("schema_projection")
+    }
+    if row.get("json_data"):
+        compact["json_data"] = row["json_data"]
+    if row.get("tools"):
+        compact["tools"] = row["tools"]
+    if row.get("ts_content"):
+        compact["ts_content"] = row["ts_content"][:MAX_CONTEXT_CONTENT_CHARS]
+    return compact
+
+async def retrieve_n8n_context_tool(
+    supabase: Optional[Client],
+    keywords: List[str],
+    limit: int = 10,
+    mode: Optional[str] = None,
+    include_json_data: bool = False
+) -> List[Dict[str, Any]]:
+    """Retrieve compact n8n node/credential context for keywords, memoized per keyword set.
+
+    Args:
+        supabase: The Supabase client, may be None when the local catalog is used
+        keywords: Keywords to search for
+        limit: The maximum number of rows to return
+        mode: The retrieval mode (see retrieve_n8n_context), defaults to N8N_RETRIEVAL_MODE
+        include_json_data: Also return the full json_data of each row
+
+    Returns:
+        The compact context rows, best matches first
+    """
+    # Resolved here so a mode changed at runtime does not get the old mode's results
+    mode = mode or get_env_var("N8N_RETRIEVAL_MODE") or "ranked"
+    key = (normalize_keywords(keywords), limit, mode, include_json_data)
+    if not key[0]:
+        return []
+
+    with _context_cache_lock:
+        cached = _context_cache.get(key)
+    if cached is not None:
+        logger.info(f"Using cached n8n context for keywords: {list(key[0])}")
+        return cached
+
+    rows = await retrieve_n8n_context(supabase, list(key[0]), limit=limit, mode=mode, include_json_data=include_json_data)
+    context = [compact_context_row(row) for row in rows]
 
-# async def get_embedding(text: str, client: AsyncOpenAI):
-#     """Generate embedding for text using OpenAI API."""
-#     # ... function body removed ...
+    # Empty results are not cached so a failed lookup is retried on the next run
+    if context:
+        with _context_cache_lock:
+            _context_cache[key] = context
+    return context
 
-# async def retrieve_relevant_documentation_tool(supabase: Client, embedding_client: AsyncOpenAI, user_query: str) -> str:
-#     """Retrieve relevant documentation chunks based on the query with RAG."""
-#     # ... function body removed ...
+def format_n8n_context(context: List[Dict[str, Any]], agent: str = "coder", plan: Optional[str] = None) -> str:
+    """Format retrieved context rows for an agent's system prompt within its token budget.
 
-# async def list_documentation_pages_tool(supabase: Client) -> str:
-#      """List all documentation pages available in the database."""
-#      # ... function body removed ...
-#
-# async def get_page_content_tool(supabase: Client, page_title: str) -> str:
-#      """Get the full content of a specific documentation page."""
-#      # ... function body removed ...
+    Args:
+        context: The retrieved context rows, best matches first
+        agent: The agent the context is for, selects the token budget (see context_packer.py)
+        plan: The reasoner's scope, used to keep only the parameters of the planned operations
 
+    Returns:
+        The packed context, one JSON object per line
+    """
+    if not context:
+        return "No n8n node or credential context was retrieved."
+    return pack_context(context, get_context_budget(agent), plan=plan)
 
 # --- Keep any other existing, valid tools below ---
 
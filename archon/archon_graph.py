@@ -1,70 +1,84 @@
-from pydantic_ai.models.anthropic import AnthropicModel
-from pydantic_ai.models.openai import OpenAIModel
 from pydantic_ai import Agent, RunContext
 from langgraph.graph import StateGraph, START, END
-from langgraph.checkpoint.memory import MemorySaver
-from typing import TypedDict, Annotated, List, Any
+from typing import TypedDict, Annotated, List, Dict, Any
 from langgraph.config import get_stream_writer
+from langchain_core.runnables import RunnableConfig
 from langgraph.types import interrupt
+from functools import cache
 from dotenv import load_dotenv
-from openai import AsyncOpenAI
-from supabase import Client
-import logfire
+import json
 import os
 import sys
 
 # Import the message classes from Pydantic AI
 from pydantic_ai.messages import (
     ModelMessage,
-    ModelMessagesTypeAdapter
+    ModelMessagesTypeAdapter,
+    ModelRequest,
+    ModelResponse,
+    TextPart,
+    UserPromptPart
 )
 
 # Add the parent directory to Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from archon.pydantic_ai_coder import pydantic_ai_coder, PydanticAIDeps
-from archon.advisor_agent import advisor_agent, AdvisorDeps
-from archon.refiner_agents.prompt_refiner_agent import prompt_refiner_agent
-from archon.refiner_agents.tools_refiner_agent import tools_refiner_agent, ToolsRefinerDeps
-from archon.refiner_agents.agent_refiner_agent import agent_refiner_agent, AgentRefinerDeps
-from archon.agent_tools import get_file_content_tool
-from utils.utils import get_env_var, get_clients
+from archon.pydantic_ai_coder import get_pydantic_ai_coder, PydanticAIDeps
+from archon.advisor_agent import get_advisor_agent, AdvisorDeps
+from archon.refiner_agents.prompt_refiner_agent import get_prompt_refiner_agent
+from archon.refiner_agents.tools_refiner_agent import get_tools_refiner_agent, ToolsRefinerDeps
+from archon.refiner_agents.agent_refiner_agent import get_agent_refiner_agent, AgentRefinerDeps
+from archon.agent_tools import get_file_content_tool, parse_keywords, retrieve_n8n_context_tool, format_n8n_context
+from archon.agent_prompts import reasoner_prompt
+from archon.checkpointer import get_checkpointer
+from archon.model_registry import get_model
+from archon.utils.message_history import get_message_history
+from archon.utils.workflow_validator import (
+    parse_workflow, validate_workflow_text, build_node_specs, missing_node_types, has_errors, format_errors
+)
+from archon.utils.workflow_stream import WorkflowStreamParser
+from archon.utils.workflow_patch import (
+    to_compact, canonical_json, apply_refinement, PatchError
+)
+from utils.utils import get_env_var, get_clients, write_to_log
 
 # Load environment variables
 load_dotenv()
 
-# Configure logfire to suppress warnings (optional)
-logfire.configure(send_to_logfire='never')
-
 provider = get_env_var('LLM_PROVIDER') or 'OpenAI'
-base_url = get_env_var('BASE_URL') or 'https://api.openai.com/v1'
-api_key = get_env_var('LLM_API_KEY') or 'no-llm-api-key-provided'
-
-is_anthropic = provider == "Anthropic"
 is_openai = provider == "OpenAI"
 
-reasoner_llm_model_name = get_env_var('REASONER_MODEL') or 'o3-mini'
-reasoner_llm_model = AnthropicModel(reasoner_llm_model_name, api_key=api_key) if is_anthropic else OpenAIModel(reasoner_llm_model_name, base_url=base_url, api_key=api_key)
+# Repair rounds after a workflow fails validation, before it goes to the user as is
+max_workflow_repairs = int(get_env_var('WORKFLOW_MAX_REPAIRS') or 2)
 
-reasoner = Agent(  
-    reasoner_llm_model,
-    system_prompt='You are an expert at coding AI agents with Pydantic AI and defining the scope for doing so.',  
-)
-
-primary_llm_model_name = get_env_var('PRIMARY_MODEL') or 'gpt-4o-mini'
-primary_llm_model = AnthropicModel(primary_llm_model_name, api_key=api_key) if is_anthropic else OpenAIModel(primary_llm_model_name, base_url=base_url, api_key=api_key)
+# The agents and clients are built on first use so importing the graph stays cheap
+@cache
+def get_reasoner() -> Agent:
+    reasoner_llm_model_name = get_env_var('REASONER_MODEL') or 'o3-mini'
+    return Agent(  
+        get_model(reasoner_llm_model_name),
+        system_prompt=reasoner_prompt,  
+    )
 
-router_agent = Agent(  
-    primary_llm_model,
-    system_prompt='Your job is to route the user message either to the end of the conversation or to continue coding the AI agent.',  
-)
+@cache
+def get_router_agent() -> Agent:
+    primary_llm_model_name = get_env_var('PRIMARY_MODEL') or 'gpt-4o-mini'
+    return Agent(  
+        get_model(primary_llm_model_name),
+        system_prompt='Your job is to route the user message either to the end of the conversation or to continue coding the AI agent.',  
+    )
 
-end_conversation_agent = Agent(  
-    primary_llm_model,
-    system_prompt='Your job is to end a conversation for creating an AI agent by giving instructions for how to execute the agent and they saying a nice goodbye to the user.',  
-)
+@cache
+def get_end_conversation_agent() -> Agent:
+    primary_llm_model_name = get_env_var('PRIMARY_MODEL') or 'gpt-4o-mini'
+    return Agent(  
+        get_model(primary_llm_model_name),
+        system_prompt='Your job is to end a conversation for creating an AI agent by giving instructions for how to execute the agent and they saying a nice goodbye to the user.',  
+    )
 
-# Initialize clients
-embedding_client, supabase = get_clients()
+@cache
+def get_graph_clients():
+    """Initialize the embedding and Supabase clients used by the nodes."""
+    return get_clients()
 
 # Define state schema
 class AgentState(TypedDict):
@@ -75,34 +89,28 @@ class AgentState(TypedDict):
     advisor_output: str
     file_list: List[str]
 
+    keywords: List[str]
+    retrieved_context: List[Dict[str, Any]]
+
     refined_prompt: str
     refined_tools: str
     refined_agent: str
 
+    workflow_json: str
+    validation_errors: List[Dict[str, Any]]
+    repair_attempts: int
+
+    stream_errors: List[Dict[str, Any]]
+    generation_attempts: int
+
 # Scope Definition Node with Reasoner LLM
 async def define_scope_with_reasoner(state: AgentState):
-    # First, get the documentation pages so the reasoner can decide which ones are necessary
-    documentation_pages = await list_documentation_pages_tool(supabase)
-    documentation_pages_str = "\n".join(documentation_pages)
-
-    # Then, use the reasoner to define the scope
+    # The reasoner plans the workflow and ends the plan with a KEYWORDS: line for context retrieval
     prompt = f"""
-    User AI Agent Request: {state['latest_user_message']}
-    
-    Create detailed scope document for the AI agent including:
-    - Architecture diagram
-    - Core components
-    - External dependencies
-    - Testing strategy
-
-    Also based on these documentation pages available:
-
-    {documentation_pages_str}
-
-    Include a list of documentation pages that are relevant to creating this agent for the user in the scope document.
+    User n8n Workflow Request: {state['latest_user_message']}
     """
 
-    result = await reasoner.run(prompt)
+    result = await get_reasoner().run(prompt)
     scope = result.data
 
     # Get the directory one level up from the current file
@@ -116,6 +124,20 @@ async def define_scope_with_reasoner(state: AgentState):
     
     return {"scope": scope}
 
+# Retrieve the n8n node and credential context for the keywords in the scope, once per run.
+# The nodes after this one (coder and refiners, on every turn) read it from the state.
+async def retrieve_context(state: AgentState):
+    keywords = parse_keywords(state['scope'])
+    if not keywords:
+        write_to_log("No KEYWORDS: line found in the scope, continuing without n8n context")
+        return {"keywords": [], "retrieved_context": []}
+
+    embedding_client, supabase = get_graph_clients()
+    retrieved_context = await retrieve_n8n_context_tool(supabase, keywords)
+    write_to_log(f"Retrieved {len(retrieved_context)} n8n context items for keywords: {', '.join(keywords)}")
+
+    return {"keywords": keywords, "retrieved_context": retrieved_context}
+
 # Advisor agent - create a starting point based on examples and prebuilt tools/MCP servers
 async def advisor_with_examples(state: AgentState):
     # Get the directory one level up from the current file (archon_graph.py)
@@ -137,25 +159,40 @@ async def advisor_with_examples(state: AgentState):
     
     # Then, prompt the advisor with the list of files it can use for examples and tools
     deps = AdvisorDeps(file_list=file_list)
-    result = await advisor_agent.run(state['latest_user_message'], deps=deps)
+    result = await get_advisor_agent().run(state['latest_user_message'], deps=deps)
     advisor_output = result.data
     
     return {"file_list": file_list, "advisor_output": advisor_output}
 
+# The refiners and the repair step see the current workflow in its compact form and
+# answer with a JSON Patch against it instead of repeating the whole workflow
+def patch_request(task: str, compact: Dict[str, Any]) -> str:
+    return f"""
+    {task}
+
+    Current workflow in compact form (nodes keyed by name, without ids and positions):
+    {canonical_json(compact)}
+
+    Answer only with a JSON Patch (RFC 6902) array against this compact form, e.g.
+    [{{"op": "replace", "path": "/nodes/<node name>/parameters/<parameter>", "value": ...}}].
+    Rename a node with a move of /nodes/<old name> to /nodes/<new name>.
+    Answer [] if nothing needs to change.
+    """
+
 # Coding Node with Feedback Handling
-async def coder_agent(state: AgentState, writer):    
+async def coder_agent(state: AgentState, config: RunnableConfig, writer):    
     # Prepare dependencies
+    embedding_client, supabase = get_graph_clients()
     deps = PydanticAIDeps(
         supabase=supabase,
         embedding_client=embedding_client,
         reasoner_output=state['scope'],
-        advisor_output=state['advisor_output']
+        advisor_output=state['advisor_output'],
+        retrieved_context=format_n8n_context(state.get('retrieved_context', []), "coder", plan=state['scope'])
     )
 
-    # Get the message history into the format for Pydantic AI
-    message_history: list[ModelMessage] = []
-    for message_row in state['messages']:
-        message_history.extend(ModelMessagesTypeAdapter.validate_json(message_row))
+    # Get the message history into the format for Pydantic AI (decoded once per thread)
+    message_history: list[ModelMessage] = get_message_history(state, config)
 
     # The prompt either needs to be the user message (initial agent request or feedback)
     # or the refined prompt/tools/agent if we are in that stage of the agent creation process
@@ -177,20 +214,59 @@ async def coder_agent(state: AgentState, writer):
     else:
         prompt = state['latest_user_message']
 
+    # A previous generation was stopped because its workflow JSON broke, ask again with the reason
+    stream_errors = state.get('stream_errors') or []
+    attempt = state.get('generation_attempts', 0) + 1 if stream_errors else 1
+    if stream_errors:
+        prompt = f"""
+        {prompt}
+
+        Your previous answer was stopped because its workflow JSON was broken:
+        {format_errors(stream_errors)}
+
+        Output the complete workflow JSON again without these problems.
+        """
+
+    # Nodes and connections are parsed and validated while the workflow is generated.
+    # Each one is sent to the stream as soon as it is complete.
+    parser = WorkflowStreamParser(build_node_specs(state.get('retrieved_context', [])) or None)
+
     # Run the agent in a stream
     if not is_openai:
         writer = get_stream_writer()
-        result = await pydantic_ai_coder.run(prompt, deps=deps, message_history=message_history)
-        writer(result.data)
+        result = await get_pydantic_ai_coder().run(prompt, deps=deps, message_history=message_history)
+        output = result.data
+        writer(output)
+        for event in parser.feed(output) + parser.close():
+            writer(event)
     else:
-        async with pydantic_ai_coder.run_stream(
-            state['latest_user_message'],
+        chunks = []
+        async with get_pydantic_ai_coder().run_stream(
+            prompt,
             deps=deps,
             message_history=message_history
         ) as result:
             # Stream partial text as it arrives
             async for chunk in result.stream_text(delta=True):
+                chunks.append(chunk)
                 writer(chunk)
+                for event in parser.feed(chunk):
+                    writer(event)
+                # Stop paying for output tokens once the structure is already broken
+                if parser.broken:
+                    break
+        output = "".join(chunks)
+
+    if parser.broken:
+        errors = [error.to_dict() for error in parser.errors if error.severity == "error"]
+        write_to_log(f"Stopped generating a broken workflow after {len(output)} characters:\n{format_errors(errors)}")
+        writer(f"\n\nStopped generating, the workflow JSON is broken:\n{format_errors(errors)}\n\n")
+        # The stopped run is left out of the conversation, the retry asks again
+        return {
+            "workflow_json": output,
+            "stream_errors": errors,
+            "generation_attempts": attempt
+        }
 
     # print(ModelMessagesTypeAdapter.validate_json(result.new_messages_json()))
 
@@ -200,7 +276,99 @@ async def coder_agent(state: AgentState, writer):
         "messages": [result.new_messages_json()],
         "refined_prompt": "",
         "refined_tools": "",
-        "refined_agent": ""
+        "refined_agent": "",
+        "workflow_json": output,
+        "repair_attempts": 0,
+        "stream_errors": [],
+        "generation_attempts": 0
+    }
+
+# Generate again when the stream was stopped early, at most max_workflow_repairs times
+def route_generation(state: AgentState):
+    if state.get('stream_errors') and state.get('generation_attempts', 0) <= max_workflow_repairs:
+        return "coder_agent"
+    return "validate_workflow"
+
+# Check the generated workflow in plain Python (structure, connections, node types,
+# parameters and credentials), so an LLM only looks at it again when something is wrong
+async def validate_workflow(state: AgentState):
+    context = state.get('retrieved_context', [])
+    node_specs = build_node_specs(context)
+    workflow, errors = validate_workflow_text(state.get('workflow_json', ''), node_specs or None)
+
+    # Look up node types the retrieved context does not cover before calling them unknown
+    missing = missing_node_types(workflow, node_specs) if workflow and node_specs else []
+    if missing:
+        embedding_client, supabase = get_graph_clients()
+        lookup = await retrieve_n8n_context_tool(supabase, [node_type.rsplit(".", 1)[-1] for node_type in missing])
+        node_specs.update(build_node_specs(lookup))
+        # The lookup is a keyword search that comes back empty when Supabase is down or
+        # the local catalog is empty, so a type it did not find may still be valid. It
+        # is only a warning, a correct workflow is not sent to repair for it.
+        unresolved = missing_node_types(workflow, node_specs)
+        if unresolved:
+            write_to_log(f"Node types not found by the catalog lookup: {', '.join(unresolved)}")
+        workflow, errors = validate_workflow_text(state['workflow_json'], node_specs, unresolved)
+
+    if errors:
+        write_to_log(f"Workflow validation found {len(errors)} problems:\n{format_errors(errors)}")
+    # Stream errors of a generation that stayed broken are covered by this validation
+    return {"validation_errors": [error.to_dict() for error in errors], "stream_errors": []}
+
+# Repair the workflow only when validation failed, at most max_workflow_repairs times
+def route_validation(state: AgentState):
+    if has_errors(state.get('validation_errors', [])) and state.get('repair_attempts', 0) < max_workflow_repairs:
+        return "repair_workflow"
+    return "get_next_user_message"
+
+# Fix the validation errors with the tools refiner. It gets the workflow and the error
+# list only, not the conversation, and the fix is checked again by validate_workflow.
+async def repair_workflow(state: AgentState, writer):
+    embedding_client, supabase = get_graph_clients()
+    deps = ToolsRefinerDeps(
+        supabase=supabase,
+        embedding_client=embedding_client,
+        file_list=state['file_list'],
+        retrieved_context=format_n8n_context(state.get('retrieved_context', []), "tools_refiner", plan=state['scope'])
+    )
+
+    # Warnings (e.g. credentials the user still has to select) are not for the model to fix
+    errors = [error for error in state['validation_errors'] if error.get('severity', 'error') == 'error']
+    error_list = format_errors(errors)
+    task = f"""
+    The n8n workflow below failed validation. Fix exactly these problems and
+    change nothing else:
+    {error_list}
+    """
+
+    workflow, _ = parse_workflow(state['workflow_json'])
+    if workflow is None:
+        # Not parseable, so there is nothing to patch: ask for the whole workflow
+        result = await get_tools_refiner_agent().run(
+            f"{task}\n\nWorkflow JSON:\n{state['workflow_json']}\n\nOutput the complete corrected workflow JSON.",
+            deps=deps
+        )
+        workflow_json = result.data
+    else:
+        result = await get_tools_refiner_agent().run(patch_request(task, to_compact(workflow)), deps=deps)
+        try:
+            workflow_json = json.dumps(apply_refinement(workflow, [result.data]), indent=2)
+        except PatchError as e:
+            # Validated again unchanged, so the next repair round sees the same errors
+            write_to_log(f"Could not apply the repair patch: {e}")
+            workflow_json = state['workflow_json']
+
+    writer(f"\n\nFixed {len(errors)} validation errors:\n\n{workflow_json}")
+
+    # Record the fix in the conversation so the coder continues from the repaired workflow
+    repair_messages = ModelMessagesTypeAdapter.dump_json([
+        ModelRequest(parts=[UserPromptPart(content=f"The workflow failed validation:\n{error_list}")]),
+        ModelResponse(parts=[TextPart(content=workflow_json)])
+    ])
+    return {
+        "messages": [repair_messages],
+        "workflow_json": workflow_json,
+        "repair_attempts": state.get('repair_attempts', 0) + 1
     }
 
 # Interrupt the graph to get the user's next message
@@ -224,81 +392,122 @@ async def route_user_message(state: AgentState):
     If the user asks specifically to "refine" the agent, respond with just the text "refine".
     """
 
-    result = await router_agent.run(prompt)
+    result = await get_router_agent().run(prompt)
     
     if result.data == "finish_conversation": return "finish_conversation"
     if result.data == "refine": return ["refine_prompt", "refine_tools", "refine_agent"]
     return "coder_agent"
 
 # Refines the prompt for the AI agent
-async def refine_prompt(state: AgentState):
-    # Get the message history into the format for Pydantic AI
-    message_history: list[ModelMessage] = []
-    for message_row in state['messages']:
-        message_history.extend(ModelMessagesTypeAdapter.validate_json(message_row))
+async def refine_prompt(state: AgentState, config: RunnableConfig):
+    # Get the message history into the format for Pydantic AI (decoded once per thread)
+    message_history: list[ModelMessage] = get_message_history(state, config)
 
     prompt = "Based on the current conversation, refine the prompt for the agent."
+    workflow, _ = parse_workflow(state.get('workflow_json', ''))
+    if workflow is not None:
+        prompt = patch_request("Based on the current conversation, refine the names and notes of the workflow.", to_compact(workflow))
 
     # Run the agent to refine the prompt for the agent being created
-    result = await prompt_refiner_agent.run(prompt, message_history=message_history)
+    result = await get_prompt_refiner_agent().run(prompt, message_history=message_history)
 
     return {"refined_prompt": result.data}
 
 # Refines the tools for the AI agent
-async def refine_tools(state: AgentState):
+async def refine_tools(state: AgentState, config: RunnableConfig):
     # Prepare dependencies
+    embedding_client, supabase = get_graph_clients()
     deps = ToolsRefinerDeps(
         supabase=supabase,
         embedding_client=embedding_client,
-        file_list=state['file_list']
+        file_list=state['file_list'],
+        retrieved_context=format_n8n_context(state.get('retrieved_context', []), "tools_refiner", plan=state['scope'])
     )
 
-    # Get the message history into the format for Pydantic AI
-    message_history: list[ModelMessage] = []
-    for message_row in state['messages']:
-        message_history.extend(ModelMessagesTypeAdapter.validate_json(message_row))
+    # Get the message history into the format for Pydantic AI (decoded once per thread)
+    message_history: list[ModelMessage] = get_message_history(state, config)
 
     prompt = "Based on the current conversation, refine the tools for the agent."
+    workflow, _ = parse_workflow(state.get('workflow_json', ''))
+    if workflow is not None:
+        prompt = patch_request("Based on the current conversation, refine the node parameters, credentials and connections of the workflow.", to_compact(workflow))
 
     # Run the agent to refine the tools for the agent being created
-    result = await tools_refiner_agent.run(prompt, deps=deps, message_history=message_history)
+    result = await get_tools_refiner_agent().run(prompt, deps=deps, message_history=message_history)
 
     return {"refined_tools": result.data}
 
 # Refines the defintion for the AI agent
-async def refine_agent(state: AgentState):
+async def refine_agent(state: AgentState, config: RunnableConfig):
     # Prepare dependencies
+    embedding_client, supabase = get_graph_clients()
     deps = AgentRefinerDeps(
         supabase=supabase,
-        embedding_client=embedding_client
+        embedding_client=embedding_client,
+        retrieved_context=format_n8n_context(state.get('retrieved_context', []), "agent_refiner", plan=state['scope'])
     )
 
-    # Get the message history into the format for Pydantic AI
-    message_history: list[ModelMessage] = []
-    for message_row in state['messages']:
-        message_history.extend(ModelMessagesTypeAdapter.validate_json(message_row))
+    # Get the message history into the format for Pydantic AI (decoded once per thread)
+    message_history: list[ModelMessage] = get_message_history(state, config)
 
     prompt = "Based on the current conversation, refine the agent definition."
+    workflow, _ = parse_workflow(state.get('workflow_json', ''))
+    if workflow is not None:
+        prompt = patch_request("Based on the current conversation, fix the structure of the workflow (missing steps, dead ends, wrong branching).", to_compact(workflow))
 
     # Run the agent to refine the definition for the agent being created
-    result = await agent_refiner_agent.run(prompt, deps=deps, message_history=message_history)
+    result = await get_agent_refiner_agent().run(prompt, deps=deps, message_history=message_history)
 
     return {"refined_agent": result.data}
 
+# Apply the refiners' patches locally. Only when they do not apply does the coder
+# rewrite the workflow from the refinements, as before.
+async def apply_refinements(state: AgentState, writer):
+    workflow, _ = parse_workflow(state.get('workflow_json', ''))
+    if workflow is None:
+        return {}
+    answers = [state.get('refined_tools', ''), state.get('refined_agent', ''), state.get('refined_prompt', '')]
+    try:
+        refined = apply_refinement(workflow, answers)
+    except PatchError as e:
+        write_to_log(f"Could not apply the refinements as patches, the coder applies them: {e}")
+        return {}
+
+    workflow_json = json.dumps(refined, indent=2)
+    write_to_log(f"Applied refinement patches ({sum(len(answer) for answer in answers)} characters of model output)")
+    writer(workflow_json)
+
+    refinement_messages = ModelMessagesTypeAdapter.dump_json([
+        ModelRequest(parts=[UserPromptPart(content="Refine the workflow.")]),
+        ModelResponse(parts=[TextPart(content=workflow_json)])
+    ])
+    return {
+        "messages": [refinement_messages],
+        "workflow_json": workflow_json,
+        "refined_prompt": "",
+        "refined_tools": "",
+        "refined_agent": "",
+        "repair_attempts": 0
+    }
+
+# Refinements left in the state did not apply as patches
+def route_refinements(state: AgentState):
+    if state.get('refined_prompt') or state.get('refined_tools') or state.get('refined_agent'):
+        return "coder_agent"
+    return "validate_workflow"
+
 # End of conversation agent to give instructions for executing the agent
-async def finish_conversation(state: AgentState, writer):    
-    # Get the message history into the format for Pydantic AI
-    message_history: list[ModelMessage] = []
-    for message_row in state['messages']:
-        message_history.extend(ModelMessagesTypeAdapter.validate_json(message_row))
+async def finish_conversation(state: AgentState, config: RunnableConfig, writer):    
+    # Get the message history into the format for Pydantic AI (decoded once per thread)
+    message_history: list[ModelMessage] = get_message_history(state, config)
 
     # Run the agent in a stream
     if not is_openai:
         writer = get_stream_writer()
-        result = await end_conversation_agent.run(state['latest_user_message'], message_history= message_history)
+        result = await get_end_conversation_agent().run(state['latest_user_message'], message_history= message_history)
         writer(result.data)   
     else: 
-        async with end_conversation_agent.run_stream(
+        async with get_end_conversation_agent().run_stream(
             state['latest_user_message'],
             message_history= message_history
         ) as result:
@@ -313,30 +522,48 @@ builder = StateGraph(AgentState)
 
 # Add nodes
 builder.add_node("define_scope_with_reasoner", define_scope_with_reasoner)
+builder.add_node("retrieve_context", retrieve_context)
 builder.add_node("advisor_with_examples", advisor_with_examples)
 builder.add_node("coder_agent", coder_agent)
+builder.add_node("validate_workflow", validate_workflow)
+builder.add_node("repair_workflow", repair_workflow)
 builder.add_node("get_next_user_message", get_next_user_message)
 builder.add_node("refine_prompt", refine_prompt)
 builder.add_node("refine_tools", refine_tools)
 builder.add_node("refine_agent", refine_agent)
+builder.add_node("apply_refinements", apply_refinements)
 builder.add_node("finish_conversation", finish_conversation)
 
 # Set edges
 builder.add_edge(START, "define_scope_with_reasoner")
 builder.add_edge(START, "advisor_with_examples")
-builder.add_edge("define_scope_with_reasoner", "coder_agent")
-builder.add_edge("advisor_with_examples", "coder_agent")
-builder.add_edge("coder_agent", "get_next_user_message")
+builder.add_edge("define_scope_with_reasoner", "retrieve_context")
+# The coder waits for both the retrieved context and the advisor output
+builder.add_edge(["retrieve_context", "advisor_with_examples"], "coder_agent")
+builder.add_conditional_edges(
+    "coder_agent",
+    route_generation,
+    ["coder_agent", "validate_workflow"]
+)
+builder.add_conditional_edges(
+    "validate_workflow",
+    route_validation,
+    ["repair_workflow", "get_next_user_message"]
+)
+builder.add_edge("repair_workflow", "validate_workflow")
 builder.add_conditional_edges(
     "get_next_user_message",
     route_user_message,
     ["coder_agent", "finish_conversation", "refine_prompt", "refine_tools", "refine_agent"]
 )
-builder.add_edge("refine_prompt", "coder_agent")
-builder.add_edge("refine_tools", "coder_agent")
-builder.add_edge("refine_agent", "coder_agent")
+# The patches are applied once all three refiners are done
+builder.add_edge(["refine_prompt", "refine_tools", "refine_agent"], "apply_refinements")
+builder.add_conditional_edges(
+    "apply_refinements",
+    route_refinements,
+    ["coder_agent", "validate_workflow"]
+)
 builder.add_edge("finish_conversation", END)
 
-# Configure persistence
-memory = MemorySaver()
-agentic_flow = builder.compile(checkpointer=memory)
\ No newline at end of file
+# Configure persistence (memory, SQLite or Postgres, see archon/checkpointer.py)
+agentic_flow = builder.compile(checkpointer=get_checkpointer())
\ No newline at end of file
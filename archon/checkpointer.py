@@ -0,0 +1,131 @@
+"""Checkpointer backends for the Archon graph.
+
+The backend is selected with the CHECKPOINTER environment variable:
+
+- "memory" (default): in-process MemorySaver, state is lost on restart
+- "sqlite": a WAL-mode SQLite file, for a single node running one or more workers
+- "postgres": the Supabase (or any) Postgres database, shared by every worker/container
+
+The SQLite and Postgres savers are synchronous, so they are wrapped in
+ThreadedCheckpointSaver, which runs each call in a worker thread. This keeps them
+usable from any event loop (FastAPI, and Streamlit which starts a new loop per rerun).
+"""
+
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import MemorySaver
+from typing import Any, AsyncIterator, Optional
+import asyncio
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.utils import get_env_var, write_to_log, workbench_dir
+
+class ThreadedCheckpointSaver(BaseCheckpointSaver):
+    """Expose a synchronous checkpoint saver through the async saver interface.
+
+    Args:
+        saver: The synchronous saver (SqliteSaver or PostgresSaver) to delegate to
+    """
+
+    def __init__(self, saver: BaseCheckpointSaver):
+        super().__init__(serde=saver.serde)
+        self.saver = saver
+
+    @property
+    def config_specs(self) -> list:
+        return self.saver.config_specs
+
+    def get_tuple(self, config):
+        return self.saver.get_tuple(config)
+
+    def list(self, config, **kwargs):
+        return self.saver.list(config, **kwargs)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        return self.saver.put(config, checkpoint, metadata, new_versions)
+
+    def put_writes(self, config, writes, task_id, *args, **kwargs):
+        return self.saver.put_writes(config, writes, task_id, *args, **kwargs)
+
+    def get_next_version(self, current, channel):
+        return self.saver.get_next_version(current, channel)
+
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.saver.get_tuple, config)
+
+    async def alist(self, config, **kwargs) -> AsyncIterator[Any]:
+        items = await asyncio.to_thread(lambda: list(self.saver.list(config, **kwargs)))
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.saver.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, *args, **kwargs):
+        return await asyncio.to_thread(self.saver.put_writes, config, writes, task_id, *args, **kwargs)
+
+def _create_sqlite_saver() -> BaseCheckpointSaver:
+    """Create a SQLite checkpointer in WAL mode so several processes can share the file."""
+    import sqlite3
+    from langgraph.checkpoint.sqlite import SqliteSaver
+
+    db_path = get_env_var("CHECKPOINTER_SQLITE_PATH") or os.path.join(workbench_dir, "checkpoints.sqlite")
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+
+    conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+
+    saver = SqliteSaver(conn)
+    saver.setup()
+    write_to_log(f"Using SQLite checkpointer at {db_path}")
+    return saver
+
+def _create_postgres_saver() -> BaseCheckpointSaver:
+    """Create a Postgres checkpointer backed by a connection pool.
+
+    Uses CHECKPOINTER_DB_URL, or SUPABASE_DB_URL (the Postgres connection string of
+    the Supabase project, found under Project Settings -> Database).
+    """
+    from langgraph.checkpoint.postgres import PostgresSaver
+    from psycopg.rows import dict_row
+    from psycopg_pool import ConnectionPool
+
+    db_url = get_env_var("CHECKPOINTER_DB_URL") or get_env_var("SUPABASE_DB_URL")
+    if not db_url:
+        raise ValueError("CHECKPOINTER is set to 'postgres' but neither CHECKPOINTER_DB_URL nor SUPABASE_DB_URL is configured.")
+
+    pool = ConnectionPool(
+        db_url,
+        min_size=1,
+        max_size=int(get_env_var("CHECKPOINTER_POOL_SIZE") or 10),
+        # prepare_threshold=0 keeps this compatible with the Supabase transaction pooler
+        kwargs={"autocommit": True, "prepare_threshold": 0, "row_factory": dict_row},
+        open=True
+    )
+
+    saver = PostgresSaver(pool)
+    saver.setup()
+    write_to_log("Using Postgres checkpointer")
+    return saver
+
+def get_checkpointer(backend: Optional[str] = None) -> BaseCheckpointSaver:
+    """Create the checkpointer configured for this deployment.
+
+    Args:
+        backend: "memory", "sqlite" or "postgres" (if None, uses the CHECKPOINTER env var)
+
+    Returns:
+        A checkpointer that can be passed to StateGraph.compile
+    """
+    backend = (backend or get_env_var("CHECKPOINTER") or "memory").strip().lower()
+
+    if backend == "sqlite":
+        return ThreadedCheckpointSaver(_create_sqlite_saver())
+    if backend == "postgres":
+        return ThreadedCheckpointSaver(_create_postgres_saver())
+    if backend != "memory":
+        write_to_log(f"Unknown CHECKPOINTER '{backend}', falling back to in-memory checkpoints")
+
+    return MemorySaver()
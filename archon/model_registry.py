@@ -0,0 +1,121 @@
+"""Shared model clients for all Archon agents.
+
+Every agent module used to build its own OpenAIModel/AnthropicModel, each with its
+own HTTP client and connection pool. The registry builds one pooled httpx client per
+provider/base URL (keep-alive, HTTP/2 when available) and one model instance per
+model name, and hands the same objects to every agent, so parallel nodes reuse warm
+connections instead of opening new ones.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Dict, Tuple, Union
+import threading
+import httpx
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.utils import get_env_var
+
+if TYPE_CHECKING:
+    from pydantic_ai.models.anthropic import AnthropicModel
+    from pydantic_ai.models.openai import OpenAIModel
+    from openai import AsyncOpenAI
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+_lock = threading.Lock()
+_http_clients: Dict[Tuple[str, str], httpx.AsyncClient] = {}
+_models: Dict[Tuple[str, str, str, str], Union[AnthropicModel, OpenAIModel]] = {}
+_embedding_clients: Dict[Tuple[str, str], AsyncOpenAI] = {}
+_logfire_configured = False
+
+def _configure_logfire():
+    """Configure logfire once, the first time a model is built."""
+    global _logfire_configured
+    if _logfire_configured:
+        return
+    import logfire
+    # Suppress logfire warnings (optional)
+    logfire.configure(send_to_logfire='never')
+    _logfire_configured = True
+
+def get_http_client(provider: str, base_url: str) -> httpx.AsyncClient:
+    """Get the pooled HTTP client for a provider and base URL.
+
+    Args:
+        provider: The provider name (e.g. "OpenAI", "Anthropic", "OpenRouter")
+        base_url: The API base URL the client talks to
+
+    Returns:
+        A shared httpx.AsyncClient with keep-alive connection pooling
+    """
+    key = (provider, base_url)
+    with _lock:
+        if key not in _http_clients:
+            _http_clients[key] = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                timeout=httpx.Timeout(timeout=600, connect=5),
+                limits=httpx.Limits(
+                    max_connections=int(get_env_var('HTTP_MAX_CONNECTIONS') or 100),
+                    max_keepalive_connections=int(get_env_var('HTTP_MAX_KEEPALIVE_CONNECTIONS') or 20),
+                    keepalive_expiry=30
+                )
+            )
+        return _http_clients[key]
+
+def get_model(model_name: str) -> Union[AnthropicModel, OpenAIModel]:
+    """Get the shared model instance for a model name using the configured LLM provider.
+
+    Args:
+        model_name: The model to use (e.g. the PRIMARY_MODEL or REASONER_MODEL value)
+
+    Returns:
+        An AnthropicModel or OpenAIModel sharing the provider's HTTP client
+    """
+    provider = get_env_var('LLM_PROVIDER') or 'OpenAI'
+    base_url = get_env_var('BASE_URL') or 'https://api.openai.com/v1'
+    api_key = get_env_var('LLM_API_KEY') or 'no-llm-api-key-provided'
+
+    key = (provider, model_name, base_url, api_key)
+    if key in _models:
+        return _models[key]
+
+    # The provider SDKs are only imported once a model is actually needed
+    _configure_logfire()
+    if provider == "Anthropic":
+        from pydantic_ai.models.anthropic import AnthropicModel
+        model = AnthropicModel(model_name, api_key=api_key, http_client=get_http_client(provider, "https://api.anthropic.com"))
+    else:
+        from pydantic_ai.models.openai import OpenAIModel
+        model = OpenAIModel(model_name, base_url=base_url, api_key=api_key, http_client=get_http_client(provider, base_url))
+
+    with _lock:
+        return _models.setdefault(key, model)
+
+def get_embedding_client() -> AsyncOpenAI:
+    """Get the shared OpenAI-compatible client used for embeddings.
+
+    Returns:
+        An AsyncOpenAI client for the configured embedding provider
+    """
+    base_url = get_env_var('EMBEDDING_BASE_URL') or 'https://api.openai.com/v1'
+    api_key = get_env_var('EMBEDDING_API_KEY') or 'no-api-key-provided'
+    provider = get_env_var('EMBEDDING_PROVIDER') or 'OpenAI'
+
+    if provider == "Ollama" and api_key == "NOT_REQUIRED":
+        api_key = "ollama"  # Use a dummy key for Ollama
+
+    key = (base_url, api_key)
+    if key in _embedding_clients:
+        return _embedding_clients[key]
+
+    from openai import AsyncOpenAI
+    client = AsyncOpenAI(base_url=base_url, api_key=api_key, http_client=get_http_client(provider, base_url))
+    with _lock:
+        return _embedding_clients.setdefault(key, client)
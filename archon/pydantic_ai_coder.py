@@ -2,35 +2,24 @@ from __future__ import annotations as _annotations
 
 from dataclasses import dataclass
 from dotenv import load_dotenv
-import logfire
-import asyncio
-import httpx
+from functools import cache
+from typing import TYPE_CHECKING, List
+from pydantic_ai import Agent, RunContext
 import os
 import sys
-import json
-from typing import List
-from pydantic import BaseModel
-from pydantic_ai import Agent, ModelRetry, RunContext
-from pydantic_ai.models.anthropic import AnthropicModel
-from pydantic_ai.models.openai import OpenAIModel
-from openai import AsyncOpenAI
-from supabase import Client
 
 # Add the parent directory to sys.path to allow importing from the parent directory
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.utils import get_env_var
+from archon.model_registry import get_model
 from archon.agent_prompts import primary_coder_prompt
+from archon.agent_tools import retrieve_n8n_context_tool, format_n8n_context
 
-load_dotenv()
-
-provider = get_env_var('LLM_PROVIDER') or 'OpenAI'
-llm = get_env_var('PRIMARY_MODEL') or 'gpt-4o-mini'
-base_url = get_env_var('BASE_URL') or 'https://api.openai.com/v1'
-api_key = get_env_var('LLM_API_KEY') or 'no-llm-api-key-provided'
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+    from supabase import Client
 
-model = AnthropicModel(llm, api_key=api_key) if provider == "Anthropic" else OpenAIModel(llm, base_url=base_url, api_key=api_key)
-
-logfire.configure(send_to_logfire='if-token-present')
+load_dotenv()
 
 @dataclass
 class PydanticAIDeps:
@@ -38,60 +27,50 @@ class PydanticAIDeps:
     embedding_client: AsyncOpenAI
     reasoner_output: str
     advisor_output: str
+    retrieved_context: str
 
-pydantic_ai_coder = Agent(
-    model,
-    system_prompt=primary_coder_prompt,
-    deps_type=PydanticAIDeps,
-    retries=2
-)
+@cache
+def get_pydantic_ai_coder() -> Agent:
+    """Build the primary coder agent on first use."""
+    llm = get_env_var('PRIMARY_MODEL') or 'gpt-4o-mini'
 
-@pydantic_ai_coder.system_prompt  
-def add_reasoner_output(ctx: RunContext[str]) -> str:
-    return f"""
-    
-    Additional thoughts/instructions from the reasoner LLM. 
-    This scope includes documentation pages for you to search as well: 
-    {ctx.deps.reasoner_output}
+    pydantic_ai_coder = Agent(
+        get_model(llm),
+        system_prompt=primary_coder_prompt,
+        deps_type=PydanticAIDeps,
+        retries=2
+    )
 
-    Recommended starting point from the advisor agent:
-    {ctx.deps.advisor_output}
-    """
-
-@pydantic_ai_coder.tool
-async def retrieve_relevant_documentation(ctx: RunContext[PydanticAIDeps], user_query: str) -> str:
-    """
-    Retrieve relevant documentation chunks based on the query with RAG.
-    
-    Args:
-        ctx: The context including the Supabase client and OpenAI client
-        user_query: The user's question or query
+    @pydantic_ai_coder.system_prompt  
+    def add_reasoner_output(ctx: RunContext[str]) -> str:
+        return f"""
         
-    Returns:
-        A formatted string containing the top 4 most relevant documentation chunks
-    """
-    return await retrieve_relevant_documentation_tool(ctx.deps.supabase, ctx.deps.embedding_client, user_query)
+        Additional thoughts/instructions from the reasoner LLM: 
+        {ctx.deps.reasoner_output}
+
+        Recommended starting point from the advisor agent:
+        {ctx.deps.advisor_output}
 
-@pydantic_ai_coder.tool
-async def list_documentation_pages(ctx: RunContext[PydanticAIDeps]) -> List[str]:
-    """
-    Retrieve a list of all available Pydantic AI documentation pages.
-    
-    Returns:
-        List[str]: List of unique URLs for all documentation pages
-    """
-    return await list_documentation_pages_tool(ctx.deps.supabase)
+        Retrieved context for the n8n nodes and credentials in the plan:
+        {ctx.deps.retrieved_context}
+        """
 
-@pydantic_ai_coder.tool
-async def get_page_content(ctx: RunContext[PydanticAIDeps], url: str) -> str:
-    """
-    Retrieve the full content of a specific documentation page by combining all its chunks.
-    
-    Args:
-        ctx: The context including the Supabase client
-        url: The URL of the page to retrieve
+    @pydantic_ai_coder.tool
+    async def search_n8n_context(ctx: RunContext[PydanticAIDeps], keywords: List[str]) -> str:
+        """
+        Look up n8n nodes or credentials that are missing from the retrieved context.
         
-    Returns:
-        str: The complete page content with all chunks combined in order
-    """
-    return await get_page_content_tool(ctx.deps.supabase, url)
\ No newline at end of file
+        Args:
+            ctx: The context including the Supabase client
+            keywords: Node or credential names to search for, e.g. ["slack", "google sheets"]
+            
+        Returns:
+            The matching nodes/credentials as JSON objects with name, source_table, tools, a
+            short ts_content and schema_projection: the compact schema listing the parameters
+            (name, type, default, option values, the resource/operation they apply to) and the
+            credential types per typeVersion
+        """
+        context = await retrieve_n8n_context_tool(ctx.deps.supabase, keywords)
+        return format_n8n_context(context)
+
+    return pydantic_ai_coder
@@ -1,31 +1,25 @@
 from __future__ import annotations as _annotations
 
-import logfire
+from dotenv import load_dotenv
+from functools import cache
+from pydantic_ai import Agent
 import os
 import sys
-from pydantic_ai import Agent
-from dotenv import load_dotenv
-from pydantic_ai.models.anthropic import AnthropicModel
-from pydantic_ai.models.openai import OpenAIModel
-from supabase import Client
 
 # Add the parent directory to sys.path to allow importing from the parent directory
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from utils.utils import get_env_var
+from archon.model_registry import get_model
 from archon.agent_prompts import prompt_refiner_prompt
 
 load_dotenv()
 
-provider = get_env_var('LLM_PROVIDER') or 'OpenAI'
-llm = get_env_var('PRIMARY_MODEL') or 'gpt-4o-mini'
-base_url = get_env_var('BASE_URL') or 'https://api.openai.com/v1'
-api_key = get_env_var('LLM_API_KEY') or 'no-llm-api-key-provided'
-
-model = AnthropicModel(llm, api_key=api_key) if provider == "Anthropic" else OpenAIModel(llm, base_url=base_url, api_key=api_key)
-
-logfire.configure(send_to_logfire='if-token-present')
+@cache
+def get_prompt_refiner_agent() -> Agent:
+    """Build the prompt refiner agent on first use."""
+    llm = get_env_var('PRIMARY_MODEL') or 'gpt-4o-mini'
 
-prompt_refiner_agent = Agent(
-    model,
-    system_prompt=prompt_refiner_prompt
-)
\ No newline at end of file
+    return Agent(
+        get_model(llm),
+        system_prompt=prompt_refiner_prompt
+    )
@@ -0,0 +1,187 @@
+"""Token-budgeted packing of retrieved n8n context for agent prompts.
+
+n8n node schemas (schema_projection, or the full json_data) list the parameters of
+every resource/operation the node supports, often repeated for each node version. Only a few of them matter
+for a given workflow, so the packer:
+
+- keeps the parameters whose displayOptions match the resources/operations named
+  in the plan (parameters without conditions are always kept),
+- drops presentation-only fields (icons, codex metadata),
+- replaces parameter definitions already shown for another node or version with a
+  short reference,
+- adds rows best match first until the agent's token budget is used, falling back
+  to a summary (parameter names only) for rows that do not fit in full.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Set
+from functools import cache
+import json
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from utils.utils import get_env_var
+from archon.utils.n8n_catalog import tokenize
+
+# Default token budget for the retrieved context, per agent.
+# Override with <AGENT>_CONTEXT_TOKENS, e.g. CODER_CONTEXT_TOKENS=8000
+DEFAULT_CONTEXT_TOKENS = {
+    "coder": 6000,
+    "tools_refiner": 4000,
+    "agent_refiner": 1500
+}
+
+# Fields of a node description that do not help generate workflow JSON
+DROPPED_FIELDS = {"icon", "iconUrl", "iconColor", "badgeIconUrl", "codex", "defaults", "hidden"}
+
+# Characters of ts_content kept in a summary when the full row does not fit
+SUMMARY_CONTENT_CHARS = 300
+
+@cache
+def _get_encoding():
+    """Load the tiktoken encoding once, or None if tiktoken or its data is unavailable."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+def count_tokens(text: str) -> int:
+    """Count the tokens of text with tiktoken, estimating 4 characters per token without it."""
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode_ordinary(text))
+
+def get_context_budget(agent: str) -> int:
+    """Get the context token budget of an agent ("coder", "tools_refiner" or "agent_refiner")."""
+    configured = get_env_var(f"{agent.upper()}_CONTEXT_TOKENS")
+    return int(configured) if configured else DEFAULT_CONTEXT_TOKENS.get(agent, 4000)
+
+def _matches_plan(values: Iterable[Any], plan_terms: Set[str]) -> bool:
+    """Check whether any displayOptions value (e.g. "getAll") is named in the plan."""
+    for value in values:
+        tokens = tokenize(str(value))
+        if tokens and all(token in plan_terms for token in tokens):
+            return True
+    return False
+
+def _get_show(prop: Dict[str, Any]) -> Dict[str, Any]:
+    """Get the conditions of a parameter, from a schema projection or a raw description."""
+    return prop.get("show") or (prop.get("displayOptions") or {}).get("show") or {}
+
+def _is_relevant(prop: Dict[str, Any], plan_terms: Set[str]) -> bool:
+    show = _get_show(prop)
+    for key in ("resource", "operation"):
+        if key in show and not _matches_plan(show[key], plan_terms):
+            return False
+    return True
+
+def _canonical(prop: Dict[str, Any]) -> str:
+    """Serialize a parameter definition, ignoring the version conditions it is shown under."""
+    definition = {k: v for k, v in prop.items() if k not in ("displayOptions", "show")}
+    return json.dumps(definition, sort_keys=True, default=str)
+
+def _pack_properties(properties: List[Any], plan_terms: Set[str], seen: Dict[str, str], node_name: str) -> List[Any]:
+    """Filter a node's parameters to the planned operations and dedupe repeated definitions."""
+    dict_props = [prop for prop in properties if isinstance(prop, dict)]
+    conditional = [prop for prop in dict_props if _get_show(prop).keys() & {"resource", "operation"}]
+    relevant = [prop for prop in conditional if _is_relevant(prop, plan_terms)]
+    # Without a plan, or if the plan names none of the node's operations, keep them all rather than guess
+    keep_all = not plan_terms or (bool(conditional) and not relevant)
+
+    packed = []
+    for prop in properties:
+        if not isinstance(prop, dict):
+            packed.append(prop)
+            continue
+        if not keep_all and not _is_relevant(prop, plan_terms):
+            continue
+
+        key = _canonical(prop)
+        if key in seen:
+            reference = {"name": prop.get("name"), "same_as": seen[key]}
+            if _get_show(prop):
+                reference["show"] = _get_show(prop)
+            packed.append(reference)
+            continue
+        seen[key] = node_name
+        packed.append(prop)
+    return packed
+
+def _pack_json_data(json_data: Any, plan_terms: Set[str], seen: Dict[str, str], node_name: str) -> Any:
+    if isinstance(json_data, list):
+        # Some nodes store one description per version
+        return [_pack_json_data(item, plan_terms, seen, node_name) for item in json_data]
+    if not isinstance(json_data, dict):
+        return json_data
+
+    packed = {}
+    for field, value in json_data.items():
+        if field in DROPPED_FIELDS:
+            continue
+        if field in ("properties", "parameters") and isinstance(value, list):
+            value = _pack_properties(value, plan_terms, seen, node_name)
+        packed[field] = value
+    return packed
+
+def _summarize(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Shrink a row to its name, parameter names and the start of its description."""
+    summary = {"source_table": row.get("source_table"), "name": row.get("name")}
+    descriptions = []
+    for data in (row.get("schema_projection"), row.get("json_data")):
+        descriptions += data if isinstance(data, list) else [data]
+    parameters = []
+    for description in descriptions:
+        if isinstance(description, dict):
+            for prop in (description.get("parameters") or []) + (description.get("properties") or []):
+                if isinstance(prop, dict) and prop.get("name") and prop["name"] not in parameters:
+                    parameters.append(prop["name"])
+    if parameters:
+        summary["parameters"] = parameters
+    if row.get("ts_content"):
+        summary["ts_content"] = row["ts_content"][:SUMMARY_CONTENT_CHARS]
+    summary["truncated"] = True
+    return summary
+
+def pack_context(context: List[Dict[str, Any]], max_tokens: int, plan: Optional[str] = None) -> str:
+    """Pack retrieved context rows into a prompt section of at most max_tokens tokens.
+
+    Args:
+        context: Retrieved rows, best matches first
+        max_tokens: Token budget for the packed context
+        plan: The reasoner's scope, used to select the parameters of the planned operations
+
+    Returns:
+        One JSON object per line, in rank order
+    """
+    plan_terms = set(tokenize(plan))
+    seen: Dict[str, str] = {}
+    lines = []
+    used_tokens = 0
+    omitted = 0
+
+    for row in context:
+        # Definitions only count as shown once the row is included in full
+        row_seen = dict(seen)
+        packed = dict(row)
+        for field in ("schema_projection", "json_data"):
+            if row.get(field) is not None:
+                packed[field] = _pack_json_data(row[field], plan_terms, row_seen, row.get("name") or "")
+        line = json.dumps(packed, ensure_ascii=False, separators=(",", ":"), default=str)
+        tokens = count_tokens(line)
+
+        if used_tokens + tokens <= max_tokens:
+            seen = row_seen
+        else:
+            line = json.dumps(_summarize(row), ensure_ascii=False, separators=(",", ":"), default=str)
+            tokens = count_tokens(line)
+            if used_tokens + tokens > max_tokens:
+                omitted += 1
+                continue
+
+        lines.append(line)
+        used_tokens += tokens
+
+    if omitted:
+        lines.append(f"({omitted} more matching nodes/credentials omitted to fit the context budget)")
+    return "\n".join(lines)
@@ -0,0 +1,101 @@
+"""Text embeddings for semantic retrieval of n8n nodes.
+
+Node descriptions are embedded once, when they are ingested (n8n_ingest.py --embed),
+and search keywords are embedded per query. Query embeddings are kept in an LRU
+cache, so repeated keyword sets cost no API call.
+
+Embeddings come from the OpenAI-compatible client of the model registry and the
+EMBEDDING_MODEL environment variable. With EMBEDDING_PROVIDER=Local, a deterministic
+hashing embedder is used instead. It needs no API or network, which makes the
+hybrid retrieval mode testable offline, but it only captures shared words and word
+parts, not meaning.
+"""
+from typing import List, Optional
+import threading
+import hashlib
+import math
+import sys
+import os
+
+from cachetools import LRUCache
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from utils.utils import get_env_var
+from archon.utils.n8n_catalog import tokenize
+
+# Dimensions of the embedding column (utils/n8n_vector_search.sql)
+DEFAULT_EMBEDDING_DIMENSIONS = 1536
+
+# Query embeddings per (provider, model, text)
+_query_cache = LRUCache(maxsize=int(get_env_var("EMBEDDING_QUERY_CACHE_SIZE") or 1024))
+_query_cache_lock = threading.Lock()
+
+def get_embedding_dimensions() -> int:
+    return int(get_env_var("EMBEDDING_DIMENSIONS") or DEFAULT_EMBEDDING_DIMENSIONS)
+
+def get_embedding_model() -> str:
+    return get_env_var("EMBEDDING_MODEL") or "text-embedding-3-small"
+
+def is_local_provider() -> bool:
+    return (get_env_var("EMBEDDING_PROVIDER") or "").lower() == "local"
+
+class HashingEmbedder:
+    """Offline stand-in for an embedding model.
+
+    Words and their character trigrams are hashed into a fixed number of dimensions
+    (the hashing trick) and the vector is L2-normalized, so cosine similarity grows
+    with the words and word parts two texts share ("mail" and "gmail" share "mai" and
+    "ail").
+    """
+
+    def __init__(self, dimensions: Optional[int] = None):
+        self.dimensions = dimensions or get_embedding_dimensions()
+
+    def _add(self, vector: List[float], feature: str, weight: float):
+        digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        # The lowest bit picks the sign, so unrelated features cancel out on average
+        vector[(value >> 1) % self.dimensions] += weight if value & 1 else -weight
+
+    def embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        for token in tokenize(text):
+            self._add(vector, token, 1.0)
+            padded = f"#{token}#"
+            for i in range(len(padded) - 2):
+                self._add(vector, padded[i:i + 3], 0.5)
+
+        norm = math.sqrt(sum(value * value for value in vector))
+        return [value / norm for value in vector] if norm else vector
+
+async def embed_texts(texts: List[str]) -> List[List[float]]:
+    """Embed texts with the configured provider, in one request.
+
+    Args:
+        texts: The texts to embed
+
+    Returns:
+        One embedding per text, in the same order
+    """
+    if not texts:
+        return []
+    if is_local_provider():
+        embedder = HashingEmbedder()
+        return [embedder.embed(text) for text in texts]
+
+    from archon.model_registry import get_embedding_client
+    response = await get_embedding_client().embeddings.create(model=get_embedding_model(), input=texts)
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+async def embed_query(text: str) -> List[float]:
+    """Embed a search query, reusing the cached embedding of an identical earlier query."""
+    key = (get_env_var("EMBEDDING_PROVIDER") or "OpenAI", get_embedding_model(), " ".join(text.lower().split()))
+    with _query_cache_lock:
+        cached = _query_cache.get(key)
+    if cached is not None:
+        return cached
+
+    embedding = (await embed_texts([key[2]]))[0]
+    with _query_cache_lock:
+        _query_cache[key] = embedding
+    return embedding
@@ -0,0 +1,121 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+import threading
+
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelMessagesTypeAdapter
+)
+
+@dataclass
+class _HistoryEntry:
+    count: int
+    last_row: Optional[bytes]
+    messages: List[ModelMessage]
+
+class MessageHistoryCache:
+    """Per-thread cache of the decoded Pydantic AI message history.
+
+    The graph state stores the conversation as a list of JSON byte blobs that only
+    ever grows. Instead of validating every blob again in each node, the cache keeps
+    the decoded list per thread together with the number of blobs it was built from,
+    and only decodes the blobs appended since then. Nodes of the same superstep see
+    the same message count and therefore get the same list object back.
+
+    The returned lists are shared between nodes and must not be mutated.
+
+    Args:
+        max_threads: Number of threads to keep before evicting the least recently used
+    """
+
+    def __init__(self, max_threads: int = 256):
+        self.max_threads = max_threads
+        self._entries: "OrderedDict[str, _HistoryEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.decoded_rows = 0
+
+    def _decode(self, rows: List[bytes]) -> List[ModelMessage]:
+        messages: List[ModelMessage] = []
+        for row in rows:
+            messages.extend(ModelMessagesTypeAdapter.validate_json(row))
+        self.decoded_rows += len(rows)
+        return messages
+
+    def get(self, thread_key: Optional[str], rows: List[bytes]) -> List[ModelMessage]:
+        """Get the decoded message history for a thread.
+
+        Args:
+            thread_key: The thread to cache under (if None, the history is decoded without caching)
+            rows: The serialized message rows from the graph state
+
+        Returns:
+            The decoded message history
+        """
+        if thread_key is None:
+            return self._decode(rows)
+
+        count = len(rows)
+        last_row = rows[-1] if rows else None
+
+        with self._lock:
+            entry = self._entries.get(thread_key)
+
+            if entry and entry.count == count and (entry.last_row is last_row or entry.last_row == last_row):
+                self.hits += 1
+                self._entries.move_to_end(thread_key)
+                return entry.messages
+
+            self.misses += 1
+
+            # Reuse the decoded prefix if the state only grew since we last saw it
+            if entry and entry.count < count and (
+                entry.count == 0 or rows[entry.count - 1] == entry.last_row
+            ):
+                messages = entry.messages + self._decode(rows[entry.count:])
+            else:
+                messages = self._decode(rows)
+
+            self._entries[thread_key] = _HistoryEntry(count=count, last_row=last_row, messages=messages)
+            self._entries.move_to_end(thread_key)
+            while len(self._entries) > self.max_threads:
+                self._entries.popitem(last=False)
+
+            return messages
+
+    def clear(self, thread_key: Optional[str] = None):
+        """Drop the cached history for one thread, or for all threads if None."""
+        with self._lock:
+            if thread_key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(thread_key, None)
+
+    def stats(self) -> Dict[str, int]:
+        """Return the hit/miss counters and the number of cached threads."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "decoded_rows": self.decoded_rows,
+            "threads": len(self._entries)
+        }
+
+# Shared by every node of the graph
+message_history_cache = MessageHistoryCache()
+
+def get_message_history(state: Dict[str, Any], config: Optional[Dict[str, Any]] = None) -> List[ModelMessage]:
+    """Get the decoded message history for the thread a graph node is running in.
+
+    Args:
+        state: The graph state containing the serialized 'messages'
+        config: The RunnableConfig passed to the node
+
+    Returns:
+        The decoded message history, shared with the other nodes of the thread
+    """
+    thread_id = (config or {}).get("configurable", {}).get("thread_id")
+    thread_key = str(thread_id) if thread_id is not None else None
+
+    return message_history_cache.get(thread_key, state.get('messages', []))
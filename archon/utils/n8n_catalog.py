@@ -0,0 +1,383 @@
+"""Local, offline copy of the n8n node and credential catalog.
+
+The four n8n_* tables only change when n8n releases new nodes, so they can be
+exported once to a compact SQLite file with the sync command:
+
+    python archon/utils/n8n_catalog.py sync [--full]
+
+With N8N_RETRIEVAL_MODE=local, retrieve_n8n_context answers keyword queries from an
+in-memory inverted index built from that file instead of calling Supabase. The index
+picks up rows changed by a later sync incrementally, based on updated_at.
+"""
+from typing import Any, Dict, List, Optional, Set, Tuple
+from collections import defaultdict
+import argparse
+import bisect
+import logging
+import sqlite3
+import threading
+import json
+import time
+import sys
+import os
+import re
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from utils.utils import get_env_var
+from archon.utils.n8n_schema import project_node_schema
+
+logger = logging.getLogger(__name__)
+
+N8N_TABLES = [
+    "n8n_internal_nodes",
+    "n8n_external_nodes",
+    "n8n_internal_credentials",
+    "n8n_external_credentials"
+]
+
+DEFAULT_CATALOG_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "workbench", "n8n_catalog.sqlite"
+)
+
+# Rows fetched from Supabase per request during a sync
+SYNC_PAGE_SIZE = 500
+
+# Field weights in the inverted index, matching the A/B/C weights of the ranked SQL search
+FIELD_WEIGHTS = {"name": 3, "tools": 2, "ts_content": 1}
+
+# Only the start of ts_content (which can hold a node's full source) is indexed
+MAX_INDEXED_CONTENT_CHARS = 20000
+
+RowKey = Tuple[str, int]
+
+def get_catalog_path() -> str:
+    """Get the path of the local catalog file from N8N_CATALOG_PATH, or the workbench default."""
+    return get_env_var("N8N_CATALOG_PATH") or DEFAULT_CATALOG_PATH
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Split text into lowercase alphanumeric tokens, also splitting camelCase words."""
+    if not text:
+        return []
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", text)
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+def _connect(path: str) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS catalog (
+            source_table TEXT NOT NULL,
+            id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            tools TEXT,
+            ts_content TEXT,
+            json_data TEXT,
+            schema_projection TEXT,
+            updated_at TEXT,
+            PRIMARY KEY (source_table, id)
+        ) WITHOUT ROWID
+        """
+    )
+    if "schema_projection" not in [column[1] for column in conn.execute("PRAGMA table_info(catalog)")]:
+        # Catalog files written before projections were stored
+        conn.execute("ALTER TABLE catalog ADD COLUMN schema_projection TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_catalog_updated_at ON catalog (updated_at)")
+    conn.execute("CREATE TABLE IF NOT EXISTS catalog_meta (key TEXT PRIMARY KEY, value TEXT)")
+    return conn
+
+def _get_meta(conn: sqlite3.Connection, key: str) -> Optional[str]:
+    row = conn.execute("SELECT value FROM catalog_meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+def _set_meta(conn: sqlite3.Connection, key: str, value: str):
+    conn.execute("INSERT OR REPLACE INTO catalog_meta (key, value) VALUES (?, ?)", (key, value))
+
+def _to_catalog_row(table: str, row: Dict[str, Any]) -> tuple:
+    """Convert a Supabase row to a catalog row, storing JSON values as compact text."""
+    tools = row.get("tools")
+    if tools is not None and not isinstance(tools, str):
+        tools = json.dumps(tools)
+    return (
+        table,
+        row["id"],
+        row["name"],
+        tools,
+        row.get("ts_content"),
+        json.dumps(row.get("json_data"), separators=(",", ":")),
+        json.dumps(project_node_schema(row.get("json_data")), separators=(",", ":")),
+        row.get("updated_at")
+    )
+
+def sync_catalog(supabase_client, path: Optional[str] = None, full: bool = False) -> Dict[str, int]:
+    """Export the n8n_* tables from Supabase to the local catalog file.
+
+    Only rows updated since the previous sync are fetched, unless full is set. A full
+    sync also removes rows that were deleted in Supabase.
+
+    Args:
+        supabase_client: An initialized (sync) Supabase client
+        path: Catalog file, defaults to get_catalog_path()
+        full: Replace the whole catalog instead of fetching changed rows only
+
+    Returns:
+        Number of rows written per table
+    """
+    from archon.utils.supabase_retriever import N8N_TABLE_COLUMNS
+
+    conn = _connect(path or get_catalog_path())
+    written = {}
+    try:
+        if full:
+            conn.execute("DELETE FROM catalog")
+            conn.execute("DELETE FROM catalog_meta WHERE key LIKE 'synced_updated_at:%'")
+            # Tells loaded indexes to rebuild instead of applying changes incrementally
+            _set_meta(conn, "generation", str(int(_get_meta(conn, "generation") or 0) + 1))
+
+        for table in N8N_TABLES:
+            watermark = _get_meta(conn, f"synced_updated_at:{table}")
+            latest = watermark
+            written[table] = 0
+            start = 0
+            while True:
+                query = supabase_client.table(table).select(N8N_TABLE_COLUMNS[table] + ", json_data, updated_at")
+                if watermark:
+                    query = query.gte("updated_at", watermark)
+                response = query.order("updated_at").order("id").range(start, start + SYNC_PAGE_SIZE - 1).execute()
+                rows = response.data or []
+
+                conn.executemany(
+                    "INSERT OR REPLACE INTO catalog (source_table, id, name, tools, ts_content, json_data, schema_projection, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [_to_catalog_row(table, row) for row in rows]
+                )
+                written[table] += len(rows)
+                if rows and rows[-1].get("updated_at"):
+                    latest = max(latest or "", rows[-1]["updated_at"])
+                if len(rows) < SYNC_PAGE_SIZE:
+                    break
+                start += SYNC_PAGE_SIZE
+
+            if latest:
+                _set_meta(conn, f"synced_updated_at:{table}", latest)
+            conn.commit()
+            logger.info(f"Synced {written[table]} rows from {table}")
+
+        _set_meta(conn, "synced_at", str(time.time()))
+        conn.commit()
+    finally:
+        conn.close()
+    return written
+
+class N8nCatalog:
+    """In-memory inverted index over the local catalog file.
+
+    Tokens of name, tools and ts_content map to the rows containing them, with the
+    weight of the best field they appear in. Keywords match tokens by prefix through a
+    sorted vocabulary, so "sheet" finds "sheets" and "googleSheets".
+    The file is checked on every search: rows with a newer updated_at are re-indexed,
+    and a full sync (new generation) rebuilds the index.
+
+    Args:
+        path: Catalog file, defaults to get_catalog_path()
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or get_catalog_path()
+        self._lock = threading.Lock()
+        self._signature = None
+        self._generation = None
+        self._watermark = ""
+        self._rows: Dict[RowKey, Dict[str, Any]] = {}
+        self._postings: Dict[str, Dict[RowKey, int]] = defaultdict(dict)
+        self._row_tokens: Dict[RowKey, Set[str]] = {}
+        self._vocabulary: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _index_row(self, key: RowKey, row: Dict[str, Any]):
+        self._unindex_row(key)
+        weights: Dict[str, int] = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            text = row.get(field)
+            if field == "ts_content" and text:
+                text = text[:MAX_INDEXED_CONTENT_CHARS]
+            for token in tokenize(text):
+                if weights.get(token, 0) < weight:
+                    weights[token] = weight
+        for token, weight in weights.items():
+            self._postings[token][key] = weight
+        self._row_tokens[key] = set(weights)
+        self._rows[key] = row
+
+    def _unindex_row(self, key: RowKey):
+        for token in self._row_tokens.pop(key, ()):
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.pop(key, None)
+                if not postings:
+                    del self._postings[token]
+        self._rows.pop(key, None)
+
+    def refresh(self) -> bool:
+        """Load rows changed since the last refresh from the catalog file.
+
+        Returns:
+            True if the index changed
+        """
+        with self._lock:
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                return False
+            signature = (st.st_mtime_ns, st.st_size)
+            if signature == self._signature:
+                return False
+
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            try:
+                generation = _get_meta(conn, "generation")
+                if generation != self._generation:
+                    self._rows.clear()
+                    self._postings.clear()
+                    self._row_tokens.clear()
+                    self._watermark = ""
+
+                cursor = conn.execute(
+                    "SELECT source_table, id, name, tools, ts_content, json_data, schema_projection, updated_at FROM catalog WHERE COALESCE(updated_at, '') >= ?",
+                    (self._watermark,)
+                )
+                changed = 0
+                for source_table, row_id, name, tools, ts_content, json_data, schema_projection, updated_at in cursor:
+                    self._index_row((source_table, row_id), {
+                        "source_table": source_table,
+                        "id": row_id,
+                        "name": name,
+                        "tools": tools,
+                        "ts_content": ts_content,
+                        "json_data": json_data,
+                        "schema_projection": schema_projection,
+                        "updated_at": updated_at
+                    })
+                    changed += 1
+                    if updated_at and updated_at > self._watermark:
+                        self._watermark = updated_at
+            finally:
+                conn.close()
+
+            self._vocabulary = sorted(self._postings)
+            self._generation = generation
+            self._signature = signature
+            logger.info(f"Loaded {changed} changed rows into the n8n catalog index ({len(self._rows)} rows)")
+            return True
+
+    def _match_keyword(self, keyword: str) -> Dict[RowKey, int]:
+        """Rows matching every token of a keyword by prefix, with their summed field weights."""
+        matches: Optional[Dict[RowKey, int]] = None
+        for token in tokenize(keyword):
+            token_matches: Dict[RowKey, int] = {}
+            position = bisect.bisect_left(self._vocabulary, token)
+            while position < len(self._vocabulary) and self._vocabulary[position].startswith(token):
+                for key, weight in self._postings[self._vocabulary[position]].items():
+                    if token_matches.get(key, 0) < weight:
+                        token_matches[key] = weight
+                position += 1
+
+            if matches is None:
+                matches = token_matches
+            else:
+                matches = {key: matches[key] + weight for key, weight in token_matches.items() if key in matches}
+            if not matches:
+                return {}
+        return matches or {}
+
+    def search(self, keywords: List[str], limit: int = 10, include_json_data: bool = False) -> List[Dict[str, Any]]:
+        """Find the rows best matching the keywords.
+
+        Args:
+            keywords: Keywords to search for, a row matches if it matches any of them
+            limit: Maximum number of rows to return
+            include_json_data: Also return the full json_data, not only the schema projection
+
+        Returns:
+            Rows in the same shape as the Supabase search, best matches first
+        """
+        self.refresh()
+
+        with self._lock:
+            return self._search(keywords, limit, include_json_data)
+
+    def _search(self, keywords: List[str], limit: int, include_json_data: bool) -> List[Dict[str, Any]]:
+        scores: Dict[RowKey, float] = defaultdict(float)
+        for keyword in keywords:
+            keyword = keyword.strip().lower()
+            for key, weight in self._match_keyword(keyword).items():
+                name = self._rows[key]["name"].lower()
+                # Same exact/prefix name bonus as the name search
+                scores[key] += weight + (3 if name == keyword else 2 if name.startswith(keyword) else 0)
+
+        best = sorted(scores.items(), key=lambda item: (-item[1], len(self._rows[item[0]]["name"]), self._rows[item[0]]["name"]))[:limit]
+
+        results = []
+        for key, score in best:
+            row = self._rows[key]
+            result = {
+                "source_table": row["source_table"],
+                "id": row["id"],
+                "name": row["name"],
+                "tools": row["tools"],
+                "ts_content": row["ts_content"],
+                "schema_projection": json.loads(row["schema_projection"]) if row["schema_projection"] else project_node_schema(row["json_data"]),
+                "score": score
+            }
+            if include_json_data:
+                result["json_data"] = json.loads(row["json_data"]) if row["json_data"] else None
+            results.append(result)
+        return results
+
+_catalog: Optional[N8nCatalog] = None
+_catalog_lock = threading.Lock()
+
+def get_catalog() -> N8nCatalog:
+    """Get the process-wide catalog index, building it on first use."""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None or _catalog.path != get_catalog_path():
+            _catalog = N8nCatalog()
+    return _catalog
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the local n8n node and credential catalog.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    sync_parser = subparsers.add_parser("sync", help="Export the n8n_* tables from Supabase to the catalog file")
+    sync_parser.add_argument("--full", action="store_true", help="Replace the whole catalog, also dropping deleted rows")
+    sync_parser.add_argument("--path", help="Catalog file (default: N8N_CATALOG_PATH or workbench/n8n_catalog.sqlite)")
+
+    search_parser = subparsers.add_parser("search", help="Search the catalog file")
+    search_parser.add_argument("keywords", nargs="+")
+    search_parser.add_argument("--limit", type=int, default=10)
+    search_parser.add_argument("--path", help="Catalog file (default: N8N_CATALOG_PATH or workbench/n8n_catalog.sqlite)")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.command == "sync":
+        from archon.utils.supabase_retriever import get_supabase_client
+        supabase_client = get_supabase_client()
+        if not supabase_client:
+            sys.exit(1)
+        written = sync_catalog(supabase_client, args.path, full=args.full)
+        print(f"Wrote {sum(written.values())} rows to {args.path or get_catalog_path()}")
+    else:
+        catalog = N8nCatalog(args.path)
+        start = time.perf_counter()
+        results = catalog.search(args.keywords, args.limit)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        for row in results:
+            print(f"{row['score']:6.1f}  {row['source_table']:<26} {row['name']}")
+        print(f"{len(results)} results in {elapsed_ms:.2f} ms ({len(catalog)} rows indexed)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+"""Bulk ingestion of n8n node and credential descriptions into the n8n_* tables.
+
+Reads node descriptions from a local directory and upserts them into Supabase:
+
+    python archon/utils/n8n_ingest.py path/to/node_modules [more paths] [--prune]
+
+Supported inputs:
+- n8n node packages (a package.json with an "n8n" section), whose descriptions are
+  read from dist/types/nodes.json and dist/types/credentials.json. n8n-nodes-base and
+  @n8n/* packages go to the internal tables, all other packages to the external ones.
+- Exported description files: a JSON array (parsed element by element), a single
+  JSON object or JSON lines (.jsonl). Their table is chosen with --source.
+
+Descriptions of the same node (one per version) are stored together in one row. Every
+row carries a hash of its content, so re-running the command after an n8n upgrade
+only writes the nodes that changed.
+
+With --embed, node rows also get an embedding for the hybrid retrieval mode
+(utils/n8n_vector_search.sql). Only changed nodes and nodes without an embedding are
+embedded.
+"""
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from datetime import datetime, timezone
+import argparse
+import asyncio
+import hashlib
+import logging
+import json
+import time
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from archon.utils.n8n_schema import project_node_schema
+
+logger = logging.getLogger(__name__)
+
+# Packages maintained by n8n, stored in the internal tables
+INTERNAL_PACKAGE_PREFIXES = ("n8n-nodes-base", "@n8n/")
+
+# Bytes read at a time when streaming a JSON array
+READ_CHUNK_SIZE = 1 << 20
+
+# Texts per embeddings request
+EMBEDDING_BATCH_SIZE = 100
+
+# Characters of a node's text that are embedded
+MAX_EMBEDDING_TEXT_CHARS = 8000
+
+def iter_json_values(path: str) -> Iterator[Any]:
+    """Yield the elements of a top-level JSON array, the object of a JSON file or each JSON line.
+
+    Arrays are decoded one element at a time from fixed-size chunks, so the whole
+    file is never held as a single string.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buffer = f.read(READ_CHUNK_SIZE).lstrip()
+        if not buffer.startswith("["):
+            # A single object, or JSON lines
+            buffer += f.read()
+            position = 0
+            while True:
+                while position < len(buffer) and buffer[position].isspace():
+                    position += 1
+                if position >= len(buffer):
+                    return
+                value, position = decoder.raw_decode(buffer, position)
+                yield value
+
+        position = 1
+        while True:
+            while position < len(buffer) and (buffer[position].isspace() or buffer[position] == ","):
+                position += 1
+            if buffer.startswith("]", position):
+                return
+            try:
+                value, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The element continues in the next chunk, drop what was already decoded
+                chunk = f.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    raise
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            yield value
+
+def _is_node_description(description: Dict[str, Any]) -> bool:
+    """Node descriptions have inputs/group, credential types do not."""
+    return "inputs" in description or "group" in description
+
+def _find_packages(root: str) -> Iterator[Tuple[str, str]]:
+    """Find n8n node packages below root, yielding (package name, package directory)."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        if "package.json" in filenames:
+            try:
+                with open(os.path.join(dirpath, "package.json"), "r", encoding="utf-8") as f:
+                    package = json.load(f)
+            except (OSError, ValueError):
+                package = {}
+            if isinstance(package.get("n8n"), dict):
+                yield package.get("name") or os.path.basename(dirpath), dirpath
+                dirnames[:] = [d for d in dirnames if d == "node_modules"]
+                continue
+        # Do not descend into build output and VCS folders
+        dirnames[:] = [d for d in dirnames if d not in (".git", "src", "test")]
+
+def _read_node_sources(package_dir: str) -> Dict[str, str]:
+    """Map node file names (e.g. "Slack") to their TypeScript sources, when the package ships them."""
+    sources = {}
+    for dirpath, dirnames, filenames in os.walk(package_dir):
+        dirnames[:] = [d for d in dirnames if d not in ("node_modules", ".git")]
+        for filename in filenames:
+            if filename.endswith(".node.ts"):
+                try:
+                    with open(os.path.join(dirpath, filename), "r", encoding="utf-8") as f:
+                        sources[filename[:-len(".node.ts")].lower()] = f.read()
+                except OSError:
+                    pass
+    return sources
+
+def collect_descriptions(paths: List[str], source: str = "auto") -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Read node and credential descriptions, grouped by table and name.
+
+    Args:
+        paths: Package directories, directories containing packages, or description files
+        source: "internal" or "external" for description files; "auto" treats them as internal
+
+    Returns:
+        {table: {name: {"descriptions": [...], "ts_content": str or None}}}
+    """
+    tables: Dict[str, Dict[str, Dict[str, Any]]] = {
+        "n8n_internal_nodes": {},
+        "n8n_external_nodes": {},
+        "n8n_internal_credentials": {},
+        "n8n_external_credentials": {}
+    }
+
+    def add(description: Any, origin: str, sources: Optional[Dict[str, str]] = None):
+        if not isinstance(description, dict) or not description.get("name"):
+            return
+        kind = "nodes" if _is_node_description(description) else "credentials"
+        entry = tables[f"n8n_{origin}_{kind}"].setdefault(description["name"], {"descriptions": [], "ts_content": None})
+        entry["descriptions"].append(description)
+        if sources and entry["ts_content"] is None:
+            short_name = description["name"].split(".")[-1].lower()
+            entry["ts_content"] = sources.get(short_name)
+
+    for path in paths:
+        if os.path.isfile(path):
+            for value in iter_json_values(path):
+                for description in value if isinstance(value, list) else [value]:
+                    add(description, "external" if source == "external" else "internal")
+            continue
+
+        for package_name, package_dir in _find_packages(path):
+            origin = source if source != "auto" else (
+                "internal" if package_name.startswith(INTERNAL_PACKAGE_PREFIXES) else "external"
+            )
+            sources = _read_node_sources(package_dir)
+            for filename in ("nodes.json", "credentials.json"):
+                types_file = os.path.join(package_dir, "dist", "types", filename)
+                if os.path.exists(types_file):
+                    for description in iter_json_values(types_file):
+                        add(description, origin, sources)
+            logger.info(f"Read package {package_name}")
+
+    return tables
+
+def _extract_tools(descriptions: List[Dict[str, Any]]) -> Optional[str]:
+    """List the operations a node offers (e.g. "message: Send"), stored in tools for keyword search."""
+    tools = []
+    for description in descriptions:
+        for prop in description.get("properties") or []:
+            if not isinstance(prop, dict) or prop.get("name") != "operation":
+                continue
+            resources = ((prop.get("displayOptions") or {}).get("show") or {}).get("resource") or [None]
+            for option in prop.get("options") or []:
+                if not isinstance(option, dict):
+                    continue
+                for resource in resources:
+                    tool = f"{resource}: {option.get('name')}" if resource else str(option.get("name"))
+                    if tool not in tools:
+                        tools.append(tool)
+    return ", ".join(tools) or None
+
+def build_row(table: str, name: str, entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the row to upsert for a node or credential, including its content hash."""
+    descriptions = entry["descriptions"]
+    json_data = descriptions[0] if len(descriptions) == 1 else descriptions
+    row = {
+        "name": name,
+        "json_data": json_data,
+        "schema_projection": project_node_schema(json_data),
+        "ts_content": entry["ts_content"]
+    }
+    if table.endswith("_nodes"):
+        row["tools"] = _extract_tools(descriptions)
+
+    canonical = json.dumps([json_data, entry["ts_content"]], sort_keys=True, separators=(",", ":"), default=str)
+    row["content_hash"] = hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+    return row
+
+def build_embedding_text(row: Dict[str, Any]) -> str:
+    """Describe a node for embedding: its names, description, operations and parameter names."""
+    schema = row.get("schema_projection") or {}
+    parts = [schema.get("displayName"), row["name"], schema.get("description"), row.get("tools")]
+    parameters = [param.get("name") for param in schema.get("parameters") or [] if isinstance(param, dict)]
+    if parameters:
+        parts.append("Parameters: " + ", ".join(dict.fromkeys(str(name) for name in parameters)))
+    return "\n".join(str(part) for part in parts if part)[:MAX_EMBEDDING_TEXT_CHARS]
+
+def _fetch_unembedded(supabase_client, table: str, page_size: int = 1000) -> set:
+    """Get the names of the rows of a node table that have no embedding yet."""
+    names = set()
+    start = 0
+    while True:
+        rows = supabase_client.table(table).select("name").is_("embedding", "null").order("name").range(start, start + page_size - 1).execute().data or []
+        names.update(row["name"] for row in rows)
+        if len(rows) < page_size:
+            return names
+        start += page_size
+
+def _fetch_hashes(supabase_client, table: str, page_size: int = 1000) -> Dict[str, Optional[str]]:
+    """Get the content hash of every row in a table, by name."""
+    hashes = {}
+    start = 0
+    while True:
+        rows = supabase_client.table(table).select("name, content_hash").order("name").range(start, start + page_size - 1).execute().data or []
+        hashes.update({row["name"]: row.get("content_hash") for row in rows})
+        if len(rows) < page_size:
+            return hashes
+        start += page_size
+
+async def ingest(
+    supabase_client,
+    paths: List[str],
+    source: str = "auto",
+    batch_size: int = 200,
+    concurrency: int = 4,
+    prune: bool = False,
+    dry_run: bool = False,
+    embed: bool = False
+) -> Dict[str, Dict[str, int]]:
+    """Upsert the node and credential descriptions found in paths into the n8n_* tables.
+
+    Args:
+        supabase_client: An initialized (sync) Supabase client
+        paths: Package directories, directories containing packages, or description files
+        source: "internal", "external" or "auto" (by package name)
+        batch_size: Rows per upsert request
+        concurrency: Maximum number of upsert requests in flight
+        prune: Delete rows whose node is no longer in the input. Only tables the input
+            has descriptions for are pruned, so a file of internal nodes never
+            deletes external nodes or credentials.
+        dry_run: Only report what would change
+        embed: Also store an embedding of each changed or not yet embedded node row
+
+    Returns:
+        {table: {"read", "unchanged", "upserted", "deleted"}} counts
+    """
+    tables = await asyncio.to_thread(collect_descriptions, paths, source)
+    semaphore = asyncio.Semaphore(concurrency)
+    stats = {}
+
+    async def run(query):
+        async with semaphore:
+            return await asyncio.to_thread(query.execute)
+
+    for table, entries in tables.items():
+        # Nothing in the input belongs to this table, so it cannot tell which rows are stale
+        if not entries:
+            continue
+        existing = await asyncio.to_thread(_fetch_hashes, supabase_client, table)
+        embed_table = embed and table.endswith("_nodes")
+        unembedded = await asyncio.to_thread(_fetch_unembedded, supabase_client, table) if embed_table else set()
+
+        now = datetime.now(timezone.utc).isoformat()
+        changed = []
+        for name, entry in entries.items():
+            row = build_row(table, name, entry)
+            if existing.get(name) != row["content_hash"] or name in unembedded:
+                row["updated_at"] = now
+                changed.append(row)
+        stale = sorted(set(existing) - set(entries)) if prune else []
+
+        stats[table] = {
+            "read": len(entries),
+            "unchanged": len(entries) - len(changed),
+            "upserted": len(changed),
+            "deleted": len(stale)
+        }
+        if stale:
+            names = ", ".join(stale[:20]) + (f" and {len(stale) - 20} more" if len(stale) > 20 else "")
+            logger.info(f"{table}: {'would delete' if dry_run else 'deleting'} {len(stale)} rows not in the input: {names}")
+        if dry_run:
+            continue
+
+        if embed_table and changed:
+            from archon.utils.embeddings import embed_texts
+            batches = [changed[i:i + EMBEDDING_BATCH_SIZE] for i in range(0, len(changed), EMBEDDING_BATCH_SIZE)]
+
+            async def embed_batch(batch):
+                async with semaphore:
+                    return await embed_texts([build_embedding_text(row) for row in batch])
+
+            for batch, embeddings in zip(batches, await asyncio.gather(*[embed_batch(batch) for batch in batches])):
+                for row, embedding in zip(batch, embeddings):
+                    row["embedding"] = embedding
+
+        requests = [
+            run(supabase_client.table(table).upsert(changed[i:i + batch_size], on_conflict="name"))
+            for i in range(0, len(changed), batch_size)
+        ]
+        requests += [
+            run(supabase_client.table(table).delete().in_("name", stale[i:i + batch_size]))
+            for i in range(0, len(stale), batch_size)
+        ]
+        await asyncio.gather(*requests)
+        logger.info(f"{table}: {stats[table]}")
+
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Load n8n node and credential descriptions into the n8n_* tables.")
+    parser.add_argument("paths", nargs="+", help="Package directories (e.g. node_modules), or exported description files")
+    parser.add_argument("--source", choices=["auto", "internal", "external"], default="auto", help="Tables for the descriptions (default: by package name)")
+    parser.add_argument("--batch-size", type=int, default=200, help="Rows per upsert request")
+    parser.add_argument("--concurrency", type=int, default=4, help="Upsert requests in flight")
+    parser.add_argument("--prune", action="store_true", help="Delete rows for nodes that are no longer in the input, in the tables the input covers")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would change, including the rows --prune would delete")
+    parser.add_argument("--embed", action="store_true", help="Embed node descriptions for the hybrid retrieval mode (utils/n8n_vector_search.sql)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    from archon.utils.supabase_retriever import get_supabase_client
+    supabase_client = get_supabase_client()
+    if not supabase_client:
+        sys.exit(1)
+
+    start = time.perf_counter()
+    stats = asyncio.run(ingest(
+        supabase_client,
+        args.paths,
+        source=args.source,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        prune=args.prune,
+        dry_run=args.dry_run,
+        embed=args.embed
+    ))
+    for table, counts in stats.items():
+        verb = "would be " if args.dry_run else ""
+        print(f"{table}: {counts['read']} read, {counts['unchanged']} unchanged, {counts['upserted']} {verb}upserted, {counts['deleted']} {verb}deleted")
+    print(f"Done in {time.perf_counter() - start:.1f}s{' (dry run)' if args.dry_run else ''}")
+
+if __name__ == "__main__":
+    main()
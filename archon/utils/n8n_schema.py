@@ -0,0 +1,262 @@
+"""Compact schema projections of n8n node and credential descriptions.
+
+The json_data of an n8n node holds every display option, localized label, hint and
+typeVersion variant of the node. The agents only need the parameter names, types,
+option values, the resource/operation conditions a parameter is shown under and the
+credential types. project_node_schema reduces a description to exactly that. Each
+parameter is listed once, with the typeVersions it applies to when it is not shown
+in all of them.
+
+The projection is stored in the schema_projection column (utils/n8n_schema_projection.sql)
+when rows are ingested. To fill the column for rows loaded without it, run:
+
+    python archon/utils/n8n_schema.py [--all]
+"""
+from typing import Any, Dict, List, Optional
+import argparse
+import logging
+import json
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+logger = logging.getLogger(__name__)
+
+# Parameter types that only show text in the n8n editor
+DISPLAY_ONLY_TYPES = {"notice", "callout"}
+
+# Rows read and written per request by the backfill job
+BATCH_SIZE = 200
+
+def _as_list(value: Any) -> List[Any]:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+def _version_matches(conditions: List[Any], version: float) -> bool:
+    """Check a version against the values of a displayOptions @version condition."""
+    for condition in conditions:
+        if isinstance(condition, (int, float)):
+            if float(condition) == version:
+                return True
+        elif isinstance(condition, dict) and isinstance(condition.get("_cnd"), dict):
+            for op, bound in condition["_cnd"].items():
+                if op == "between" and isinstance(bound, dict):
+                    if bound.get("from", float("-inf")) <= version <= bound.get("to", float("inf")):
+                        return True
+                elif isinstance(bound, (int, float)):
+                    if (op == "eq" and version == bound) or (op == "gte" and version >= bound) or \
+                       (op == "gt" and version > bound) or (op == "lte" and version <= bound) or \
+                       (op == "lt" and version < bound):
+                        return True
+        else:
+            # Unknown condition format, show the parameter rather than lose it
+            return True
+    return False
+
+def _shown_in_version(item: Dict[str, Any], version: float) -> bool:
+    display_options = item.get("displayOptions") or {}
+    show = (display_options.get("show") or {}).get("@version")
+    hide = (display_options.get("hide") or {}).get("@version")
+    if show is not None and not _version_matches(_as_list(show), version):
+        return False
+    if hide is not None and _version_matches(_as_list(hide), version):
+        return False
+    return True
+
+def _project_conditions(item: Dict[str, Any]) -> Dict[str, Any]:
+    show = dict((item.get("displayOptions") or {}).get("show") or {})
+    show.pop("@version", None)
+    return show
+
+def _project_parameter(prop: Dict[str, Any]) -> Dict[str, Any]:
+    """Reduce a parameter definition to its name, type, default, options and conditions."""
+    param_type = prop.get("type")
+    projected = {"name": prop.get("name"), "type": param_type}
+    if prop.get("required"):
+        projected["required"] = True
+    default = prop.get("default")
+    if default not in (None, "", [], {}):
+        projected["default"] = default
+
+    show = _project_conditions(prop)
+    if show:
+        projected["show"] = show
+
+    options = prop.get("options")
+    if isinstance(options, list) and options:
+        if param_type in ("options", "multiOptions"):
+            projected["options"] = [option.get("value") for option in options if isinstance(option, dict)]
+        elif param_type == "collection":
+            projected["options"] = _project_parameters(options)
+        elif param_type == "fixedCollection":
+            projected["options"] = [
+                {"name": option.get("name"), "values": _project_parameters(option.get("values") or [])}
+                for option in options if isinstance(option, dict)
+            ]
+
+    type_options = prop.get("typeOptions") or {}
+    if type_options.get("multipleValues"):
+        projected["multiple"] = True
+    if type_options.get("loadOptionsMethod") or type_options.get("loadOptions"):
+        # Values are loaded from the service at runtime
+        projected["dynamicOptions"] = True
+    return projected
+
+def _project_parameters(properties: List[Any]) -> List[Dict[str, Any]]:
+    return [
+        _project_parameter(prop)
+        for prop in properties
+        if isinstance(prop, dict) and prop.get("name") and prop.get("type") not in DISPLAY_ONLY_TYPES
+    ]
+
+def _project_credential(credential: Dict[str, Any]) -> Dict[str, Any]:
+    projected = {"name": credential.get("name")}
+    if credential.get("required"):
+        projected["required"] = True
+    show = _project_conditions(credential)
+    if show:
+        projected["show"] = show
+    return projected
+
+def _merge_versioned(merged: Dict[str, Dict[str, Any]], item: Dict[str, Any], projected: Dict[str, Any], versions: List[float]):
+    """Add a projected item once, collecting the typeVersions it is shown in."""
+    key = json.dumps(projected, sort_keys=True, default=str)
+    shown_in = [version for version in versions if _shown_in_version(item, version)]
+    if not shown_in and versions:
+        return
+    entry = merged.setdefault(key, {"item": projected, "versions": []})
+    entry["versions"] += [version for version in shown_in if version not in entry["versions"]]
+
+def _format_versions(versions: List[float]) -> List[Any]:
+    return [int(version) if version.is_integer() else version for version in sorted(versions)]
+
+def _finish_merged(merged: Dict[str, Dict[str, Any]], all_versions: List[float]) -> List[Dict[str, Any]]:
+    items = []
+    for entry in merged.values():
+        item = dict(entry["item"])
+        # Only items limited to some typeVersions list them
+        if all_versions and sorted(entry["versions"]) != all_versions:
+            item["typeVersions"] = _format_versions(entry["versions"])
+        items.append(item)
+    return items
+
+def _count_outputs(outputs: Any) -> Optional[Dict[str, int]]:
+    """Count a node's outputs per connection type, None when they depend on its parameters."""
+    if not isinstance(outputs, list):
+        return None
+    counts: Dict[str, int] = {}
+    for output in outputs:
+        output_type = output.get("type") if isinstance(output, dict) else output
+        if not isinstance(output_type, str):
+            return None
+        counts[output_type] = counts.get(output_type, 0) + 1
+    return counts
+
+def project_node_schema(json_data: Any) -> Optional[Dict[str, Any]]:
+    """Compute the compact canonical schema of an n8n node or credential description.
+
+    Args:
+        json_data: The node/credential description, or a list of descriptions (one per
+            node version)
+
+    Returns:
+        {"name", "displayName", "description", "typeVersions", "outputs", "credentials", "parameters"},
+        where a credential or parameter that only applies to some typeVersions lists them
+        in its own typeVersions field. outputs counts the outputs per connection type
+        (e.g. {"main": 2}), it is left out when they depend on the node's parameters.
+        None if json_data is not a description.
+    """
+    if isinstance(json_data, str):
+        try:
+            json_data = json.loads(json_data)
+        except ValueError:
+            return None
+    descriptions = [item for item in _as_list(json_data) if isinstance(item, dict)]
+    if not descriptions:
+        return None
+
+    first = descriptions[0]
+    schema = {"name": first.get("name")}
+    for field in ("displayName", "description"):
+        if first.get(field):
+            schema[field] = first[field]
+
+    all_versions: List[float] = []
+    credentials: Dict[str, Dict[str, Any]] = {}
+    parameters: Dict[str, Dict[str, Any]] = {}
+    outputs: Optional[Dict[str, int]] = {}
+    for description in descriptions:
+        versions = [float(v) for v in _as_list(description.get("version")) if isinstance(v, (int, float))]
+        all_versions += [version for version in versions if version not in all_versions]
+        if "outputs" in description and outputs is not None:
+            counts = _count_outputs(description["outputs"])
+            outputs = None if counts is None else {key: max(outputs.get(key, 0), count) for key, count in {**outputs, **counts}.items()}
+        for credential in _as_list(description.get("credentials")):
+            if isinstance(credential, dict):
+                _merge_versioned(credentials, credential, _project_credential(credential), versions)
+        for prop in _as_list(description.get("properties")):
+            if isinstance(prop, dict) and prop.get("name") and prop.get("type") not in DISPLAY_ONLY_TYPES:
+                _merge_versioned(parameters, prop, _project_parameter(prop), versions)
+
+    all_versions.sort()
+    if all_versions:
+        schema["typeVersions"] = _format_versions(all_versions)
+    if outputs:
+        schema["outputs"] = outputs
+    if credentials:
+        schema["credentials"] = _finish_merged(credentials, all_versions)
+    schema["parameters"] = _finish_merged(parameters, all_versions)
+    return schema
+
+def backfill_projections(supabase_client, recompute_all: bool = False) -> Dict[str, int]:
+    """Compute schema_projection for the rows of the n8n_* tables.
+
+    Args:
+        supabase_client: An initialized (sync) Supabase client
+        recompute_all: Recompute every row instead of only rows without a projection
+
+    Returns:
+        Number of rows updated per table
+    """
+    from archon.utils.n8n_catalog import N8N_TABLES
+
+    updated = {}
+    for table in N8N_TABLES:
+        updated[table] = 0
+        last_id = None
+        while True:
+            query = supabase_client.table(table).select("id, name, json_data")
+            if not recompute_all:
+                query = query.is_("schema_projection", "null")
+            if last_id is not None:
+                query = query.gt("id", last_id)
+            rows = query.order("id").limit(BATCH_SIZE).execute().data or []
+            if not rows:
+                break
+
+            supabase_client.table(table).upsert(
+                [{"id": row["id"], "name": row["name"], "schema_projection": project_node_schema(row.get("json_data"))} for row in rows],
+                on_conflict="id"
+            ).execute()
+            updated[table] += len(rows)
+            last_id = rows[-1]["id"]
+        logger.info(f"Projected {updated[table]} rows of {table}")
+    return updated
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute the compact schema projection of the n8n_* rows.")
+    parser.add_argument("--all", action="store_true", help="Recompute rows that already have a projection")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    from archon.utils.supabase_retriever import get_supabase_client
+    supabase_client = get_supabase_client()
+    if not supabase_client:
+        sys.exit(1)
+    updated = backfill_projections(supabase_client, recompute_all=args.all)
+    print(f"Projected {sum(updated.values())} rows")
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,17 @@
+from __future__ import annotations as _annotations
+
 import logging
-from typing import List, Dict, Any, Optional
-from supabase import Client, create_client
+import asyncio
+from typing import TYPE_CHECKING, List, Dict, Any, Optional
 import sys
 import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.utils import get_env_var # Assuming get_env_var is in utils.utils
+from archon.utils.n8n_schema import project_node_schema
+
+if TYPE_CHECKING:
+    from supabase import Client
 
 # Setup logging
 logger = logging.getLogger(__name__)
@@ -20,113 +26,269 @@ def get_supabase_client() -> Optional[Client]:
         logger.error("Supabase URL or Service Key not configured in environment variables.")
         return None
     try:
+        # Imported here, the supabase package is slow to import and not needed at startup
+        from supabase import create_client
         return create_client(supabase_url, supabase_key)
     except Exception as e:
         logger.error(f"Failed to create Supabase client: {e}")
         return None
 
-async def retrieve_n8n_context(supabase_client: Client, keywords: List[str], limit: int = 10) -> List[Dict[str, Any]]:
+# Columns returned for each n8n table, only what the agents use as context.
+# The compact schema_projection is added, or the full json_data when requested.
+N8N_TABLE_COLUMNS = {
+    "n8n_internal_nodes": "id, name, tools, ts_content",
+    "n8n_external_nodes": "id, name, tools, ts_content",
+    "n8n_internal_credentials": "id, name, ts_content",
+    "n8n_external_credentials": "id, name, ts_content"
+}
+
+# Server-side search functions per retrieval mode, tried in this order:
+# "ranked" uses the full-text/trigram indexes (utils/n8n_search_indexes.sql),
+# "name" only matches on name (utils/n8n_context_search.sql).
+# "hybrid" fuses the "ranked" results with a vector search (utils/n8n_vector_search.sql)
+SEARCH_RPCS = {
+    "ranked": ["rank_n8n_context", "search_n8n_context"],
+    "name": ["search_n8n_context"],
+    "hybrid": ["rank_n8n_context", "search_n8n_context"]
+}
+
+# Vector search function of the hybrid mode
+VECTOR_SEARCH_RPC = "match_n8n_nodes"
+
+# Reciprocal rank fusion constant: a row at rank r of a result list scores 1 / (RRF_K + r)
+RRF_K = 60
+
+# Search functions the database reported as not installed
+_missing_rpcs = set()
+
+# Set once a table query fails because schema_projection has not been added yet
+_projection_column_missing = False
+
+def _clean_keywords(keywords: List[str]) -> List[str]:
+    """Strip, lowercase and deduplicate keywords, preserving their order."""
+    cleaned = []
+    for kw in keywords:
+        kw = kw.strip().lower()
+        if kw and kw not in cleaned:
+            cleaned.append(kw)
+    return cleaned
+
+def _score_match(name: Optional[str], keywords: List[str]) -> float:
+    """Rank a row by how its name matches the keywords, mirroring search_n8n_context."""
+    name = (name or "").lower()
+    score = 0.0
+    for kw in keywords:
+        if name == kw:
+            score += 3
+        elif name.startswith(kw):
+            score += 2
+        elif kw in name:
+            score += 1
+    return score
+
+def _is_missing_function_error(error: Exception) -> bool:
+    """Check whether PostgREST rejected the RPC because the function does not exist."""
+    message = str(error)
+    return "PGRST202" in message or "Could not find the function" in message
+
+def _finish_row(item: Dict[str, Any], include_json_data: bool) -> Dict[str, Any]:
+    """Project rows stored without a schema projection and drop json_data unless requested."""
+    if not item.get('schema_projection') and item.get('json_data'):
+        item['schema_projection'] = project_node_schema(item['json_data'])
+    if not include_json_data:
+        item.pop('json_data', None)
+    return item
+
+async def _search_with_rpc(supabase_client: Client, rpc_name: str, keywords: List[str], limit: int, include_json_data: bool) -> List[Dict[str, Any]]:
+    """Search all n8n tables in one round trip with a server-side search function."""
+    query = supabase_client.rpc(rpc_name, {"keywords": keywords, "match_count": limit, "include_json_data": include_json_data})
+    response = await asyncio.to_thread(query.execute)
+    return [_finish_row(item, include_json_data) for item in response.data or []]
+
+async def _search_table(supabase_client: Client, table: str, keywords: List[str], limit: int, include_json_data: bool) -> List[Dict[str, Any]]:
+    """Search a single n8n table by name, used when the search function is not installed."""
+    global _projection_column_missing
+
+    or_conditions = [f"name.ilike.%{kw}%" for kw in keywords]
+    while True:
+        columns = N8N_TABLE_COLUMNS[table]
+        if not _projection_column_missing:
+            columns += ", schema_projection"
+        if include_json_data or _projection_column_missing:
+            columns += ", json_data"
+
+        query = supabase_client.table(table).select(columns).or_(",".join(or_conditions)).limit(limit)
+        try:
+            response = await asyncio.to_thread(query.execute)
+            break
+        except Exception as e:
+            if "schema_projection" in str(e) and not _projection_column_missing:
+                logger.warning("schema_projection column is missing, computing projections locally. See utils/n8n_schema_projection.sql")
+                _projection_column_missing = True
+                continue
+            logger.error(f"Error querying table {table}: {e}")
+            return []
+
+    results = response.data or []
+    for item in results:
+        item['source_table'] = table
+        _finish_row(item, include_json_data)
+    return results
+
+async def _search_tables(supabase_client: Client, keywords: List[str], limit: int, include_json_data: bool) -> List[Dict[str, Any]]:
+    """Query every n8n table concurrently, then rank, deduplicate and trim the results."""
+    per_table = await asyncio.gather(*[
+        _search_table(supabase_client, table, keywords, limit, include_json_data)
+        for table in N8N_TABLE_COLUMNS
+    ])
+
+    unique_results = []
+    seen = set()
+    for item in (item for results in per_table for item in results):
+        identifier = (item.get('name'), item.get('source_table'))
+        if identifier not in seen:
+            item['score'] = _score_match(item.get('name'), keywords)
+            unique_results.append(item)
+            seen.add(identifier)
+
+    unique_results.sort(key=lambda item: (-item['score'], len(item.get('name') or ""), item.get('name') or ""))
+    return unique_results[:limit]
+
+async def _search_keywords(supabase_client: Client, keywords: List[str], limit: int, mode: str, include_json_data: bool) -> List[Dict[str, Any]]:
+    """Search with the first installed search function of the mode, or per-table name queries."""
+    for rpc_name in SEARCH_RPCS[mode]:
+        if rpc_name in _missing_rpcs:
+            continue
+        try:
+            return await _search_with_rpc(supabase_client, rpc_name, keywords, limit, include_json_data)
+        except Exception as e:
+            if not _is_missing_function_error(e):
+                raise
+            logger.warning(f"{rpc_name} is not installed, falling back. See the SQL files in utils/")
+            _missing_rpcs.add(rpc_name)
+
+    return await _search_tables(supabase_client, keywords, limit, include_json_data)
+
+async def _search_vectors(supabase_client: Client, keywords: List[str], limit: int, include_json_data: bool) -> List[Dict[str, Any]]:
+    """Find the nodes whose embedding is closest to the embedding of the keywords.
+
+    Returns an empty list when the vector search is unavailable, so the hybrid mode
+    degrades to the keyword results.
+    """
+    if VECTOR_SEARCH_RPC in _missing_rpcs:
+        return []
+    from archon.utils.embeddings import embed_query
+
+    try:
+        query_embedding = await embed_query(" ".join(keywords))
+        query = supabase_client.rpc(VECTOR_SEARCH_RPC, {"query_embedding": query_embedding, "match_count": limit, "include_json_data": include_json_data})
+        response = await asyncio.to_thread(query.execute)
+    except Exception as e:
+        if _is_missing_function_error(e):
+            logger.warning(f"{VECTOR_SEARCH_RPC} is not installed, using keyword search only. See utils/n8n_vector_search.sql")
+            _missing_rpcs.add(VECTOR_SEARCH_RPC)
+        else:
+            logger.error(f"Vector search failed, using keyword search only: {e}")
+        return []
+    return [_finish_row(item, include_json_data) for item in response.data or []]
+
+def fuse_rankings(rankings: List[List[Dict[str, Any]]], limit: int) -> List[Dict[str, Any]]:
+    """Merge ranked result lists with reciprocal rank fusion.
+
+    Each row scores the sum of 1 / (RRF_K + rank) over the lists it appears in, so rows
+    ranked well by several searches come first. Only ranks are used, which makes the
+    text rank and cosine similarity scores of the lists comparable.
+
+    Args:
+        rankings: Result lists, best match first. For rows found by several searches
+            the row of the earliest list is kept.
+        limit: The maximum number of results to return
+
+    Returns:
+        The fused rows, with their fused score in "score"
+    """
+    fused: Dict[Any, Dict[str, Any]] = {}
+    for results in rankings:
+        for rank, item in enumerate(results, start=1):
+            key = (item.get('source_table'), item.get('name'))
+            if key not in fused:
+                fused[key] = dict(item, score=0.0)
+            fused[key]['score'] += 1.0 / (RRF_K + rank)
+
+    results = sorted(fused.values(), key=lambda item: -item['score'])
+    return results[:limit]
+
+async def retrieve_n8n_context(
+    supabase_client: Client,
+    keywords: List[str],
+    limit: int = 10,
+    mode: Optional[str] = None,
+    include_json_data: bool = False
+) -> List[Dict[str, Any]]:
     """
     Retrieves n8n node and credential context from Supabase based on keywords.
 
-    Searches relevant tables (nodes, credentials) using ILIKE for partial matching
-    on name and potentially other relevant fields.
+    Searches all node and credential tables in a single round trip with a database
+    function. In "ranked" mode, rows are ranked by full-text rank and trigram similarity
+    on name, tools and ts_content (rank_n8n_context). In "name" mode, only names are
+    matched (search_n8n_context). Missing functions fall back to the next option, and
+    finally to concurrent per-table name queries ranked in Python. In "hybrid" mode, the
+    "ranked" search and a vector search of the node embeddings run concurrently and
+    their results are merged with reciprocal rank fusion, so nodes described with
+    different words than the keywords are found too. In "local" mode, the
+    query is answered from the in-memory index of the local catalog (see n8n_catalog.py)
+    without calling Supabase.
 
     Args:
-        supabase_client: An initialized Supabase client.
+        supabase_client: An initialized Supabase client, may be None in "local" mode.
         keywords: A list of keywords to search for.
         limit: The maximum number of results to return.
+        mode: "ranked", "name", "hybrid" or "local", defaults to the N8N_RETRIEVAL_MODE environment variable or "ranked".
+        include_json_data: Also return the full json_data. By default only the compact
+            schema_projection (see n8n_schema.py) is returned.
 
     Returns:
-        A list of dictionaries, each representing a relevant n8n node or credential.
-        Returns an empty list if no context is found or an error occurs.
+        A list of dictionaries (source_table, id, name, tools, ts_content, schema_projection,
+        score), each representing a relevant n8n node or credential, best matches first. Returns an empty list if no context is found or an error occurs.
     """
-    if not supabase_client:
-        logger.error("Supabase client is not initialized.")
-        return []
     if not keywords:
         logger.warning("No keywords provided for context retrieval.")
         return []
 
-    # Prepare keywords for ILIKE ANY query (e.g., ['%keyword1%', '%keyword2%'])
-    like_patterns = [f"%{kw.strip()}%" for kw in keywords if kw.strip()]
-    if not like_patterns:
+    cleaned_keywords = _clean_keywords(keywords)
+    if not cleaned_keywords:
         logger.warning("Keywords list resulted in empty search patterns.")
         return []
 
-    # Define a mapping for table names and relevant columns to select
-    # Adjust columns as needed based on your actual table schemas
-    table_columns = {
-        "n8n_internal_nodes": "id, name, tools, json_data, ts_content, created_at, updated_at",
-        "n8n_external_nodes": "id, name, tools, json_data, ts_content, created_at, updated_at",
-        "n8n_internal_credentials": "id, name, json_data, ts_content, created_at, updated_at", # Example columns
-        "n8n_external_credentials": "id, name, json_data, ts_content, created_at, updated_at"  # Example columns
-    }
-
-    # Build parts of the SQL query dynamically
-    select_parts = []
-    for table, columns in table_columns.items():
-        # Basic search on 'name' column for all tables
-        select_parts.append(
-            f"""
-            SELECT '{table}' AS source_table, {columns}
-            FROM {table}
-            WHERE name ILIKE ANY (ARRAY[{', '.join(f"'{p}'" for p in like_patterns)}])
-            """
-            # Potential extension: Add search on other relevant text columns (e.g., description, tools)
-            # Example: OR description ILIKE ANY (ARRAY[...])
-        )
-
-    # Combine parts with UNION ALL
-    full_query = " UNION ALL ".join(select_parts)
-    full_query += f" LIMIT {limit};"
+    mode = mode or get_env_var("N8N_RETRIEVAL_MODE") or "ranked"
+    if mode == "local":
+        from archon.utils.n8n_catalog import get_catalog
+        catalog = get_catalog()
+        results = await asyncio.to_thread(catalog.search, cleaned_keywords, limit, include_json_data)
+        if len(catalog):
+            logger.info(f"Retrieved {len(results)} context items from the local catalog for keywords: {keywords}")
+            return results
+        logger.warning(f"Local n8n catalog {catalog.path} is empty, run: python archon/utils/n8n_catalog.py sync")
+        mode = "ranked"
+    elif mode not in SEARCH_RPCS:
+        logger.warning(f"Unknown retrieval mode '{mode}', using 'ranked'.")
+        mode = "ranked"
+
+    if not supabase_client:
+        logger.error("Supabase client is not initialized.")
+        return []
 
     try:
-        logger.debug(f"Executing Supabase query: {full_query}")
-        # Use rpc for executing raw SQL. Adjust if direct table access methods are preferred/possible.
-        # Note: Executing raw SQL via rpc might require specific function setup or permissions in Supabase.
-        # A more common approach might be separate `.select().ilike()` calls per table if raw SQL is problematic.
-        # Let's assume raw SQL execution via a hypothetical `execute_sql` function or similar capability.
-        # If using the standard client, you might need separate queries:
-        # response_internal = await supabase_client.table("n8n_internal_nodes").select(table_columns["n8n_internal_nodes"]).ilike("name", f"%{keywords[0]}%").limit(limit).execute() # Simplified example
-
-        # Using supabase-py's ability to execute arbitrary functions (requires function in Supabase)
-        # As a fallback, we perform separate queries and combine results if raw SQL isn't directly supported easily via RPC.
-        all_results = []
-        for table, columns in table_columns.items():
-            try:
-                # Perform ILIKE ANY using Supabase filter syntax
-                query = supabase_client.table(table).select(columns)
-                # Build the 'or' condition for ILIKE ANY equivalent
-                or_conditions = [f"name.ilike.{pattern}" for pattern in like_patterns]
-                query = query.or_(",".join(or_conditions))
-
-                response = await query.limit(limit).execute() # Use await for async
-                if response.data:
-                    # Add source table info for context
-                    for item in response.data:
-                        item['source_table'] = table
-                    all_results.extend(response.data)
-                # Log errors per table if needed
-                # elif response.error: logger.error(f"Error querying {table}: {response.error}")
-
-            except Exception as table_e:
-                logger.error(f"Error querying table {table}: {table_e}")
-
-        # Simple deduplication based on name and source_table (adjust if needed)
-        unique_results = []
-        seen = set()
-        for item in all_results:
-            identifier = (item.get('name'), item.get('source_table'))
-            if identifier not in seen:
-                unique_results.append(item)
-                seen.add(identifier)
-
-        # Apply overall limit after combining and deduplicating
-        final_results = unique_results[:limit]
-
-        logger.info(f"Retrieved {len(final_results)} context items for keywords: {keywords}")
-        return final_results
+        if mode == "hybrid":
+            keyword_results, vector_results = await asyncio.gather(
+                _search_keywords(supabase_client, cleaned_keywords, limit, mode, include_json_data),
+                _search_vectors(supabase_client, cleaned_keywords, limit, include_json_data)
+            )
+            results = fuse_rankings([keyword_results, vector_results], limit)
+        else:
+            results = await _search_keywords(supabase_client, cleaned_keywords, limit, mode, include_json_data)
+        logger.info(f"Retrieved {len(results)} context items for keywords: {keywords}")
+        return results
 
     except Exception as e:
         logger.error(f"Failed to retrieve n8n context from Supabase: {e}", exc_info=True)
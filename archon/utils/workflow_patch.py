@@ -0,0 +1,302 @@
+"""Compact canonical workflow form and JSON Patch refinements.
+
+A generated n8n workflow carries fields that no refinement needs to see or repeat:
+node ids, canvas positions, webhook ids, meta.instanceId and pinData. to_compact
+drops them and keys the nodes by name, which is also how connections refer to them:
+
+    {"nodes": {"Webhook": {"type": ..., "typeVersion": ..., "parameters": {...}}},
+     "connections": {...}, "settings": {...}}
+
+Refiners receive this form as canonical JSON (sorted keys, no whitespace) and answer
+with a JSON Patch (RFC 6902) against it, e.g.
+
+    [{"op": "replace", "path": "/nodes/Send Email/parameters/subject", "value": "Hi"}]
+
+instead of the whole workflow. apply_workflow_patch applies the patch locally (moving
+a node also renames it in the connections), and from_compact restores the dropped
+fields from the previous version, also for renamed nodes, placing new nodes next to
+the node feeding them. make_patch computes the structural diff between two versions,
+so a refiner that returns a whole workflow anyway is turned into a patch as well.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+import copy
+import json
+import uuid
+import re
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from archon.utils.workflow_validator import parse_workflow
+
+# Node fields n8n assigns itself, restored from the previous version by node name
+GENERATED_NODE_FIELDS = ("id", "position", "webhookId")
+
+# Top-level fields that refinements never change
+GENERATED_WORKFLOW_FIELDS = ("id", "meta", "pinData", "versionId", "staticData")
+
+# Canvas spacing for nodes added by a patch
+NODE_SPACING = (220, 200)
+
+_FENCED = re.compile(r"```(?:json)?[ \t]*\n(.*?)```", re.DOTALL)
+_LINE_START_ARRAY = re.compile(r"^[ \t]*\[", re.MULTILINE)
+
+class PatchError(ValueError):
+    """A patch that is not a JSON Patch or does not apply to the document."""
+
+def canonical_json(document: Any) -> str:
+    """Serialize with sorted keys and no whitespace, the same document always gives the same text."""
+    return json.dumps(document, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+def to_compact(workflow: Dict[str, Any]) -> Dict[str, Any]:
+    """Reduce a workflow to its compact form, keeping the node order."""
+    nodes = {}
+    for node in workflow.get("nodes") or []:
+        if isinstance(node, dict) and isinstance(node.get("name"), str):
+            nodes[node["name"]] = {key: value for key, value in node.items() if key != "name" and key not in GENERATED_NODE_FIELDS}
+    compact = {"nodes": nodes, "connections": copy.deepcopy(workflow.get("connections") or {})}
+    for key, value in workflow.items():
+        if key not in ("nodes", "connections") and key not in GENERATED_WORKFLOW_FIELDS:
+            compact[key] = copy.deepcopy(value)
+    return compact
+
+def _new_position(name: str, compact: Dict[str, Any], positions: Dict[str, List[float]]) -> List[float]:
+    """Place a new node right of the first placed node connected to it, or right of all nodes."""
+    for source, outputs in compact.get("connections", {}).items():
+        for slots in (outputs or {}).values():
+            for targets in slots or []:
+                for target in targets or []:
+                    if isinstance(target, dict) and target.get("node") == name and source in positions:
+                        x, y = positions[source]
+                        return [x + NODE_SPACING[0], y]
+    if not positions:
+        return [0, 0]
+    x = max(position[0] for position in positions.values())
+    y = min(position[1] for position in positions.values())
+    return [x + NODE_SPACING[0], y + NODE_SPACING[1]]
+
+def from_compact(compact: Dict[str, Any], previous: Optional[Dict[str, Any]] = None, renames: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """Expand a compact workflow back to n8n's format.
+
+    Args:
+        compact: The compact workflow, e.g. after a patch was applied
+        previous: The workflow the compact form was made from. Node ids, positions and
+            the top-level fields dropped by to_compact are taken from it, by node name.
+        renames: Old to new names of renamed nodes (see node_renames), which keep
+            their id and position
+
+    Returns:
+        The full workflow, new nodes get a fresh id and a position next to their source
+    """
+    previous = previous or {}
+    previous_nodes = {node["name"]: node for node in previous.get("nodes") or [] if isinstance(node, dict) and "name" in node}
+    for old, new in (renames or {}).items():
+        if old in previous_nodes and new not in previous_nodes:
+            previous_nodes[new] = previous_nodes[old]
+
+    workflow: Dict[str, Any] = {key: copy.deepcopy(previous[key]) for key in GENERATED_WORKFLOW_FIELDS if key in previous}
+    nodes = []
+    positions = {name: node["position"] for name, node in previous_nodes.items() if name in compact["nodes"] and node.get("position")}
+    for name, fields in compact["nodes"].items():
+        old = previous_nodes.get(name, {})
+        node = {"id": old.get("id") or str(uuid.uuid4()), "name": name}
+        node.update(copy.deepcopy(fields))
+        if "webhookId" in old:
+            node["webhookId"] = old["webhookId"]
+        if name not in positions:
+            positions[name] = _new_position(name, compact, positions)
+        node["position"] = positions[name]
+        nodes.append(node)
+
+    workflow["nodes"] = nodes
+    for key, value in compact.items():
+        if key != "nodes":
+            workflow[key] = copy.deepcopy(value)
+    return workflow
+
+def _split_pointer(path: str) -> List[str]:
+    if path == "":
+        return []
+    if not path.startswith("/"):
+        raise PatchError(f"'{path}' is not a JSON pointer, it must start with '/'")
+    return [part.replace("~1", "/").replace("~0", "~") for part in path[1:].split("/")]
+
+def _escape(part: str) -> str:
+    return str(part).replace("~", "~0").replace("/", "~1")
+
+def _resolve(document: Any, parts: List[str], path: str) -> Tuple[Any, str]:
+    """The container holding the last part of a path, and that part."""
+    if not parts:
+        raise PatchError("The whole document cannot be changed by a patch operation")
+    parent = document
+    for part in parts[:-1]:
+        if isinstance(parent, dict) and part in parent:
+            parent = parent[part]
+        elif isinstance(parent, list) and part.isdigit() and int(part) < len(parent):
+            parent = parent[int(part)]
+        else:
+            raise PatchError(f"'{path}' does not exist")
+    return parent, parts[-1]
+
+def _get(document: Any, path: str) -> Any:
+    parent, key = _resolve(document, _split_pointer(path), path)
+    if isinstance(parent, dict) and key in parent:
+        return parent[key]
+    if isinstance(parent, list) and key.isdigit() and int(key) < len(parent):
+        return parent[int(key)]
+    raise PatchError(f"'{path}' does not exist")
+
+def _add(document: Any, path: str, value: Any):
+    parent, key = _resolve(document, _split_pointer(path), path)
+    if isinstance(parent, dict):
+        parent[key] = value
+    elif isinstance(parent, list) and (key == "-" or (key.isdigit() and int(key) <= len(parent))):
+        parent.insert(len(parent) if key == "-" else int(key), value)
+    else:
+        raise PatchError(f"Cannot add at '{path}'")
+
+def _remove(document: Any, path: str) -> Any:
+    _get(document, path)
+    parent, key = _resolve(document, _split_pointer(path), path)
+    return parent.pop(key if isinstance(parent, dict) else int(key))
+
+def apply_patch(document: Any, patch: List[Dict[str, Any]]) -> Any:
+    """Apply a JSON Patch (add, remove, replace, move, copy, test) to a copy of document.
+
+    Raises:
+        PatchError: When an operation is malformed or does not apply. The document is
+            left unchanged, a patch applies completely or not at all.
+    """
+    if not isinstance(patch, list):
+        raise PatchError("A JSON Patch must be a list of operations")
+    document = copy.deepcopy(document)
+    for index, operation in enumerate(patch):
+        if not isinstance(operation, dict) or not isinstance(operation.get("path"), str):
+            raise PatchError(f"Operation {index} needs an op and a path")
+        op, path = operation.get("op"), operation["path"]
+        if op in ("add", "replace", "test") and "value" not in operation:
+            raise PatchError(f"Operation {index} ({op} {path}) needs a value")
+        if op in ("move", "copy") and not isinstance(operation.get("from"), str):
+            raise PatchError(f"Operation {index} ({op} {path}) needs a from path")
+
+        if op == "add":
+            _add(document, path, copy.deepcopy(operation["value"]))
+        elif op == "remove":
+            _remove(document, path)
+        elif op == "replace":
+            _remove(document, path)
+            _add(document, path, copy.deepcopy(operation["value"]))
+        elif op == "move":
+            if path.startswith(operation["from"] + "/"):
+                raise PatchError(f"Operation {index} moves '{operation['from']}' into itself")
+            _add(document, path, _remove(document, operation["from"]))
+        elif op == "copy":
+            _add(document, path, copy.deepcopy(_get(document, operation["from"])))
+        elif op == "test":
+            if _get(document, path) != operation["value"]:
+                raise PatchError(f"Operation {index}: '{path}' does not have the expected value")
+        else:
+            raise PatchError(f"Operation {index} has an unknown op '{op}'")
+    return document
+
+def _rename_in_connections(compact: Dict[str, Any], old: str, new: str):
+    connections = compact.get("connections")
+    if not isinstance(connections, dict):
+        return
+    if old in connections:
+        compact["connections"] = connections = {new if source == old else source: outputs for source, outputs in connections.items()}
+    for outputs in connections.values():
+        for slots in (outputs or {}).values() if isinstance(outputs, dict) else []:
+            for targets in slots or []:
+                for target in targets or []:
+                    if isinstance(target, dict) and target.get("node") == old:
+                        target["node"] = new
+
+def node_renames(patch: List[Dict[str, Any]]) -> Dict[str, str]:
+    """Old to new names of the nodes a patch renames (moves within /nodes), in order."""
+    renames = {}
+    for operation in patch:
+        if isinstance(operation, dict) and operation.get("op") == "move":
+            source, target = _split_pointer(operation["from"]), _split_pointer(operation["path"])
+            if len(source) == 2 and len(target) == 2 and source[0] == target[0] == "nodes":
+                renames[source[1]] = target[1]
+    return renames
+
+def apply_workflow_patch(compact: Dict[str, Any], patch: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Apply a patch to a compact workflow, renaming moved nodes in the connections."""
+    result = apply_patch(compact, patch)
+    for old, new in node_renames(patch).items():
+        _rename_in_connections(result, old, new)
+    return result
+
+def make_patch(old: Any, new: Any, path: str = "") -> List[Dict[str, Any]]:
+    """Compute a JSON Patch turning old into new.
+
+    Objects are compared key by key and lists of the same length item by item, any
+    other difference replaces the value.
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        patch = []
+        for key in old:
+            if key not in new:
+                patch.append({"op": "remove", "path": f"{path}/{_escape(key)}"})
+        for key, value in new.items():
+            if key not in old:
+                patch.append({"op": "add", "path": f"{path}/{_escape(key)}", "value": value})
+            else:
+                patch += make_patch(old[key], value, f"{path}/{_escape(key)}")
+        return patch
+    if isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        patch = []
+        for index, (old_item, new_item) in enumerate(zip(old, new)):
+            patch += make_patch(old_item, new_item, f"{path}/{index}")
+        return patch
+    if old == new and type(old) == type(new):
+        return []
+    if not path:
+        raise PatchError("The documents differ at the top level")
+    return [{"op": "replace", "path": path, "value": new}]
+
+def parse_refinement(text: str, compact: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Read a refiner's answer as a JSON Patch against compact.
+
+    The answer should be a patch, a whole workflow (compact or full) is diffed
+    against compact instead. The patch may be fenced or follow some prose.
+
+    Raises:
+        PatchError: When the answer is neither
+    """
+    text = (text or "").strip()
+    candidates = [text] + [match.group(1) for match in _FENCED.finditer(text)]
+    candidates += [text[match.start():] for match in _LINE_START_ARRAY.finditer(text)]
+    for candidate in candidates:
+        try:
+            # Text after the patch is tolerated
+            answer, _ = json.JSONDecoder().raw_decode(candidate.strip())
+        except ValueError:
+            continue
+        # A list of operations, not e.g. a "[1]" in prose
+        if isinstance(answer, list) and all(isinstance(operation, dict) and "op" in operation for operation in answer):
+            return answer
+
+    answer, _ = parse_workflow(text)
+    if isinstance(answer, dict) and isinstance(answer.get("nodes"), (dict, list)):
+        new = answer if isinstance(answer["nodes"], dict) else to_compact(answer)
+        return make_patch(compact, new)
+    raise PatchError("The answer is neither a JSON Patch nor a workflow")
+
+def apply_refinement(workflow: Dict[str, Any], answers: List[str]) -> Dict[str, Any]:
+    """Apply the refiners' patches (against the same compact form) one after another.
+
+    Raises:
+        PatchError: When an answer is not a patch or does not apply
+    """
+    compact = to_compact(workflow)
+    refined = compact
+    renames: Dict[str, str] = {}
+    for answer in answers:
+        if answer and answer.strip():
+            patch = parse_refinement(answer, compact)
+            refined = apply_workflow_patch(refined, patch)
+            renames.update(node_renames(patch))
+    return from_compact(refined, workflow, renames)
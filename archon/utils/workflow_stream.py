@@ -0,0 +1,238 @@
+"""Incremental parsing of workflow JSON while the coder streams it.
+
+The coder outputs one raw workflow JSON object. The object starts at a "{" at the
+start of the output, of a line or right after a ```json fence, so prose before it
+(which may contain n8n expressions like {{ $json.x }}) is skipped. Until an object
+has a top-level "nodes" key it is only a candidate: when it turns out not to be JSON
+(e.g. { "email": {{ $json.email }} }) or closes without "nodes" (an example object),
+scanning continues after it. WorkflowStreamParser is fed the text
+deltas as they arrive and tracks the JSON nesting (objects, arrays, strings and
+keys), so it knows when an element of the top-level "nodes" array or an entry of the
+top-level "connections" object has closed. Each one is parsed on its own and
+returned as an event right away:
+
+    {"event": "workflow_node", "index": 0, "node": {...}}
+    {"event": "workflow_connection", "source": "Webhook", "outputs": {"main": [...]}}
+    {"event": "workflow_error", "error": {...}}
+
+Nodes are validated as they close (see workflow_validator.validate_node), together
+with the ids and names seen so far. Errors that mean the JSON or the workflow
+structure is already broken (bad syntax, a duplicate name or id) set broken, so the
+caller can stop the generation instead of paying for the rest of an unusable
+workflow. Other problems, like a node without parameters, are left to the repair step.
+"""
+from typing import Any, Dict, List, Optional
+import json
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from archon.utils.workflow_validator import WorkflowError, validate_node
+
+# Errors after which the rest of the workflow cannot be used as generated
+FATAL_ERROR_CODES = {"invalid_json", "invalid_structure", "duplicate_name", "duplicate_id"}
+
+# Characters allowed outside strings, besides brackets, commas and colons
+_VALUE_CHARS = set(" \t\r\n0123456789+-.eE") | set("truefalsn")
+
+class _Frame:
+    """An open object or array: its bracket, where it starts and its current key."""
+    __slots__ = ("kind", "start", "key", "expect_key")
+
+    def __init__(self, kind: str, start: int):
+        self.kind = kind
+        self.start = start
+        self.key: Optional[str] = None
+        self.expect_key = kind == "{"
+
+class WorkflowStreamParser:
+    """Parse the nodes and connections of a workflow JSON object as it streams in.
+
+    Args:
+        node_specs: Schema projections by node type (see workflow_validator.build_node_specs)
+            to validate node types, parameters and credentials against. Without them
+            only the structure of each node is checked.
+    """
+
+    def __init__(self, node_specs: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.node_specs = node_specs
+        self.nodes: List[Dict[str, Any]] = []
+        self.connections: Dict[str, Any] = {}
+        self.errors: List[WorkflowError] = []
+        self.broken = False
+        self.complete = False
+
+        # Text not yet dropped, starting at absolute position _offset. Only the element
+        # being parsed is kept, so the buffer stays about one node long.
+        self._buffer = ""
+        self._offset = 0
+        self._frames: List[_Frame] = []
+        # Whether the open object has a top-level "nodes" key, i.e. is the workflow
+        self._is_workflow = False
+        # Text of the current line before the workflow object, to tell where it may start
+        self._line = ""
+        self._string_start: Optional[int] = None
+        self._escaped = False
+        self._names = set()
+        self._ids = set()
+        self._nodes_closed = False
+
+    def _fail(self, error: WorkflowError, events: List[Dict[str, Any]]):
+        if error.code == "invalid_json" and not self._is_workflow:
+            self._skip_candidate()
+            return
+        self.errors.append(error)
+        events.append({"event": "workflow_error", "error": error.to_dict()})
+        if error.severity == "error" and error.code in FATAL_ERROR_CODES:
+            self.broken = True
+
+    def _skip_candidate(self):
+        """Treat the open object as prose, it is not the workflow."""
+        self._frames = []
+        self._string_start = None
+        self._escaped = False
+        self.connections = {}
+        # The rest of the line is prose too
+        self._line = "{"
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Consume the next text delta.
+
+        Returns:
+            Events for the nodes, connection entries and errors completed by this chunk
+        """
+        events: List[Dict[str, Any]] = []
+        if not chunk or self.complete or self.broken:
+            return events
+        start = len(self._buffer)
+        self._buffer += chunk
+
+        for position in range(start, len(self._buffer)):
+            if self.complete or self.broken:
+                break
+            char = self._buffer[position]
+            absolute = self._offset + position
+
+            if self._string_start is not None:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._string_end(absolute, events)
+            elif not self._frames:
+                # Text before the workflow object, e.g. prose or a ```json fence
+                if char == "{" and self._line.strip() in ("", "```", "```json"):
+                    self._frames.append(_Frame("{", absolute))
+                self._line = "" if char == "\n" else self._line + char
+            elif char == '"':
+                self._string_start = absolute
+            elif char in "{[":
+                self._frames.append(_Frame(char, absolute))
+            elif char in "}]":
+                self._close(absolute, char, events)
+            elif char == ",":
+                frame = self._frames[-1]
+                frame.expect_key = frame.kind == "{"
+            elif char != ":" and char not in _VALUE_CHARS:
+                self._fail(WorkflowError("invalid_json", f"Unexpected character {char!r} at position {absolute}."), events)
+
+        # Drop the text before the node, connection entry or key still open
+        keep = [frame.start for frame in self._frames[2:3]]
+        if self._string_start is not None:
+            keep.append(self._string_start)
+        drop = (min(keep) if keep else self._offset + len(self._buffer)) - self._offset
+        if drop > 0:
+            self._buffer = self._buffer[drop:]
+            self._offset += drop
+        return events
+
+    def _slice(self, start: int, end: int) -> str:
+        """Text between two absolute positions, end included."""
+        return self._buffer[start - self._offset:end - self._offset + 1]
+
+    def _string_end(self, position: int, events: List[Dict[str, Any]]):
+        start, self._string_start = self._string_start, None
+        frame = self._frames[-1]
+        if frame.kind == "{" and frame.expect_key:
+            try:
+                frame.key = json.loads(self._slice(start, position))
+            except ValueError as e:
+                self._fail(WorkflowError("invalid_json", f"Invalid key at position {start}: {e}"), events)
+            frame.expect_key = False
+            if len(self._frames) == 1 and frame.key == "nodes":
+                self._is_workflow = True
+
+    def _close(self, position: int, char: str, events: List[Dict[str, Any]]):
+        frame = self._frames.pop()
+        if (frame.kind == "{") != (char == "}"):
+            self._fail(WorkflowError("invalid_json", f"Unexpected {char!r} at position {position}, {frame.kind!r} is still open."), events)
+            return
+
+        if not self._frames:
+            if self._is_workflow:
+                self.complete = True
+            else:
+                # An object without nodes, e.g. an example before the workflow
+                self._skip_candidate()
+            return
+        root = self._frames[0]
+        depth = len(self._frames)
+        if depth == 1 and root.key == "nodes":
+            self._nodes_closed = True
+        elif depth == 2 and frame.kind == "{" and root.key == "nodes" and self._frames[1].kind == "[":
+            self._node_closed(self._slice(frame.start, position), events)
+        elif depth == 2 and root.key == "connections" and self._frames[1].kind == "{":
+            self._connection_closed(self._frames[1].key, self._slice(frame.start, position), events)
+
+    def _node_closed(self, text: str, events: List[Dict[str, Any]]):
+        index = len(self.nodes)
+        try:
+            node = json.loads(text)
+        except ValueError as e:
+            self._fail(WorkflowError("invalid_json", f"The node is not valid JSON: {e}", f"nodes[{index}]"), events)
+            return
+        self.nodes.append(node)
+        events.append({"event": "workflow_node", "index": index, "node": node})
+
+        for error in validate_node(node, index, self.node_specs):
+            self._fail(error, events)
+        name, node_id = node.get("name"), node.get("id")
+        if node_id is not None:
+            if node_id in self._ids:
+                self._fail(WorkflowError("duplicate_id", f"Another node already has the id '{node_id}'.", f"nodes[{index}].id", name), events)
+            self._ids.add(node_id)
+        if isinstance(name, str):
+            if name in self._names:
+                self._fail(WorkflowError("duplicate_name", f"Another node is already named '{name}', connections refer to nodes by name.", f"nodes[{index}].name", name), events)
+            self._names.add(name)
+
+    def _connection_closed(self, source: Optional[str], text: str, events: List[Dict[str, Any]]):
+        try:
+            outputs = json.loads(text)
+        except ValueError as e:
+            self._fail(WorkflowError("invalid_json", f"The connections of '{source}' are not valid JSON: {e}", f"connections.{source}"), events)
+            return
+        self.connections[source] = outputs
+        events.append({"event": "workflow_connection", "source": source, "outputs": outputs})
+
+        # Once all nodes are known, references to other names are mistakes
+        if not self._nodes_closed:
+            return
+        if source not in self._names:
+            self._fail(WorkflowError("unknown_connection_source", f"'{source}' is not the name of a node.", f"connections.{source}"), events)
+        for output_type, slots in outputs.items() if isinstance(outputs, dict) else []:
+            for slot_index, targets in enumerate(slots if isinstance(slots, list) else []):
+                for target_index, target in enumerate(targets if isinstance(targets, list) else []):
+                    if isinstance(target, dict) and target.get("node") not in self._names:
+                        self._fail(WorkflowError(
+                            "unknown_connection_target", f"'{target.get('node')}' is not the name of a node.",
+                            f"connections.{source}.{output_type}[{slot_index}][{target_index}].node", source
+                        ), events)
+
+    def close(self) -> List[Dict[str, Any]]:
+        """Signal the end of the stream, reporting a workflow object that never closed."""
+        events: List[Dict[str, Any]] = []
+        if self._frames and self._is_workflow and not self.complete and not self.broken:
+            self._fail(WorkflowError("invalid_json", "The workflow JSON ends before its closing brace."), events)
+        return events
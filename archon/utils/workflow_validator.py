@@ -0,0 +1,420 @@
+"""Deterministic validation of generated n8n workflow JSON.
+
+The coder's output is checked in plain Python instead of asking an LLM whether it is
+correct:
+
+- the output parses as a workflow object with a nodes list and a connections map,
+- node ids and names are unique,
+- connections only reference existing nodes, with outputs the source node has,
+- node types and typeVersions exist in the n8n catalog,
+- required parameters without a default are set, for the resource/operation the
+  node is configured with,
+- credential types are ones the node accepts.
+
+Node types are checked against schema projections (see n8n_schema.py), e.g. from the
+retrieved context rows. Problems are returned as structured WorkflowErrors, so the
+graph only runs a repair step when there are errors and only passes it the list.
+
+    python archon/utils/workflow_validator.py workflow.json
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from dataclasses import dataclass, asdict
+import argparse
+import json
+import sys
+import os
+import re
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from archon.utils.n8n_schema import project_node_schema
+
+# Context rows of these tables describe nodes, the others credentials
+NODE_TABLES = {"n8n_internal_nodes", "n8n_external_nodes"}
+
+# Parameter types n8n sets itself, never required from the workflow author
+IMPLICIT_PARAMETER_TYPES = {"hidden", "notice", "callout"}
+
+# With this authentication the node takes any credential type (e.g. HTTP Request)
+ANY_CREDENTIAL_AUTHENTICATION = {"predefinedCredentialType"}
+
+_FENCED_JSON = re.compile(r"```(?:json)?\s*(\{.*\})\s*```", re.DOTALL)
+_LINE_START_OBJECT = re.compile(r"^[ \t]*(\{)\s*\"", re.MULTILINE)
+
+@dataclass
+class WorkflowError:
+    """A problem found in a workflow.
+
+    Args:
+        code: Machine-readable kind of problem, e.g. "duplicate_name" or "unknown_node_type"
+        message: What is wrong, written for the model that fixes it
+        path: Location in the workflow JSON, e.g. "nodes[2].typeVersion"
+        node: Name of the node the problem belongs to
+        severity: "error" for workflows n8n would reject or fail to run, "warning" for
+            likely problems that still import (e.g. credentials left to the user)
+    """
+    code: str
+    message: str
+    path: Optional[str] = None
+    node: Optional[str] = None
+    severity: str = "error"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: value for key, value in asdict(self).items() if value is not None}
+
+def has_errors(errors: Iterable[Any]) -> bool:
+    """Check whether any WorkflowError (or its dict form) is an error, not a warning."""
+    return any((error.severity if isinstance(error, WorkflowError) else error.get("severity", "error")) == "error" for error in errors)
+
+def format_errors(errors: Iterable[Any]) -> str:
+    """Format WorkflowErrors (or their dict form) one per line for a prompt or log."""
+    lines = []
+    for error in errors:
+        error = error.to_dict() if isinstance(error, WorkflowError) else error
+        location = f" {error['path']}:" if error.get("path") else ""
+        lines.append(f"- [{error.get('severity', 'error')}] {error['code']}{location} {error['message']}")
+    return "\n".join(lines)
+
+def parse_workflow(text: str) -> Tuple[Optional[Dict[str, Any]], Optional[WorkflowError]]:
+    """Parse the workflow object out of the coder's output.
+
+    The output should be the raw JSON, but a markdown fence or text around the object
+    is tolerated.
+
+    Returns:
+        (workflow, None) when the output holds a JSON object with a "nodes" key, (None,
+        error) when it tries to but does not parse, and (None, None) when it holds no
+        workflow at all (e.g. the coder answered a question, maybe quoting an n8n
+        expression like {{ $json.x }})
+    """
+    text = (text or "").strip()
+    if '"nodes"' not in text:
+        return None, None
+
+    candidates = [text]
+    fenced = _FENCED_JSON.search(text)
+    if fenced:
+        candidates.append(fenced.group(1))
+    candidates.append(text[text.find("{"):text.rfind("}") + 1])
+    # Prose before the object may contain braces and example objects too, the
+    # workflow starts on its own line
+    candidates += [text[match.start(1):] for match in _LINE_START_OBJECT.finditer(text)]
+
+    error = None
+    for candidate in candidates:
+        try:
+            # Text after the object is tolerated too
+            workflow, _ = json.JSONDecoder().raw_decode(candidate)
+        except ValueError as e:
+            error = error or e
+            continue
+        if isinstance(workflow, dict) and "nodes" in workflow:
+            return workflow, None
+    if error is None:
+        # Only JSON that is not a workflow, e.g. an example parameter value
+        return None, None
+    return None, WorkflowError("invalid_json", f"The output is not a valid JSON object: {error}")
+
+def _short_type(node_type: str) -> str:
+    """The node name without its package, e.g. "gmail" for "n8n-nodes-base.gmail"."""
+    return node_type.rsplit(".", 1)[-1]
+
+def build_node_specs(context: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Index the schema projections of retrieved node rows by node type.
+
+    Args:
+        context: Context rows with source_table and schema_projection (or json_data)
+
+    Returns:
+        Schema projections keyed by their full name and by the name without package
+    """
+    specs: Dict[str, Dict[str, Any]] = {}
+    for row in context:
+        if row.get("source_table") not in NODE_TABLES:
+            continue
+        schema = row.get("schema_projection") or project_node_schema(row.get("json_data"))
+        if isinstance(schema, str):
+            schema = json.loads(schema)
+        if not isinstance(schema, dict) or not schema.get("name"):
+            continue
+        specs[schema["name"]] = schema
+        specs.setdefault(_short_type(schema["name"]), schema)
+    return specs
+
+def find_node_spec(node_type: Any, node_specs: Dict[str, Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if not isinstance(node_type, str):
+        return None
+    return node_specs.get(node_type) or node_specs.get(_short_type(node_type))
+
+def missing_node_types(workflow: Dict[str, Any], node_specs: Dict[str, Dict[str, Any]]) -> List[str]:
+    """Node types used in the workflow that have no schema in node_specs."""
+    missing = []
+    for node in workflow.get("nodes") or []:
+        node_type = node.get("type") if isinstance(node, dict) else None
+        if isinstance(node_type, str) and not find_node_spec(node_type, node_specs) and node_type not in missing:
+            missing.append(node_type)
+    return missing
+
+def _applies_to_version(item: Dict[str, Any], version: float) -> bool:
+    versions = item.get("typeVersions")
+    return not versions or version in [float(v) for v in versions]
+
+def _condition_value(key: str, parameters: Dict[str, Any], spec_parameters: List[Dict[str, Any]]) -> Tuple[bool, Any]:
+    """Value a displayOptions condition refers to: set in the node, or the parameter's default.
+
+    Returns:
+        (known, value), known is False when the value cannot be determined statically
+    """
+    key = key.lstrip("/")
+    if key in parameters:
+        value = parameters[key]
+        return not (isinstance(value, str) and value.startswith("=")), value
+    defaults = {json.dumps(prop.get("default"), sort_keys=True) for prop in spec_parameters if prop.get("name") == key}
+    if len(defaults) != 1:
+        return False, None
+    return True, json.loads(defaults.pop())
+
+def _is_shown(item: Dict[str, Any], parameters: Dict[str, Any], spec_parameters: List[Dict[str, Any]]) -> Optional[bool]:
+    """Whether a parameter or credential applies to the node's configuration, None if unknown."""
+    for key, allowed in (item.get("show") or {}).items():
+        allowed = allowed if isinstance(allowed, list) else [allowed]
+        if any(isinstance(value, (dict, list)) for value in allowed):
+            return None
+        known, value = _condition_value(key, parameters, spec_parameters)
+        if not known:
+            return None
+        if value not in allowed:
+            return False
+    return True
+
+def validate_node(
+    node: Any,
+    index: int,
+    node_specs: Optional[Dict[str, Dict[str, Any]]] = None,
+    unverified_types: Iterable[str] = ()
+) -> List[WorkflowError]:
+    """Check one node's fields, type, typeVersion, parameters and credentials.
+
+    Args:
+        node: The node object
+        index: Position of the node in the nodes list, for error paths
+        node_specs: Schema projections by node type (see build_node_specs). Without
+            them only the node's structure is checked.
+        unverified_types: Types missing from node_specs that may still exist, e.g. when
+            the catalog could not be searched. They are reported as warnings.
+    """
+    path = f"nodes[{index}]"
+    if not isinstance(node, dict):
+        return [WorkflowError("invalid_node", "A node must be a JSON object.", path)]
+
+    errors = []
+    name = node.get("name") if isinstance(node.get("name"), str) else None
+    if not name:
+        errors.append(WorkflowError("missing_field", "The node has no name.", f"{path}.name"))
+    node_type = node.get("type")
+    if not isinstance(node_type, str) or not node_type:
+        errors.append(WorkflowError("missing_field", "The node has no type.", f"{path}.type", name))
+    type_version = node.get("typeVersion")
+    if isinstance(type_version, bool) or not isinstance(type_version, (int, float)):
+        errors.append(WorkflowError("invalid_type_version", "typeVersion must be a number.", f"{path}.typeVersion", name))
+        type_version = None
+    parameters = node.get("parameters")
+    if not isinstance(parameters, dict):
+        errors.append(WorkflowError("missing_field", "parameters must be an object (use {} for none).", f"{path}.parameters", name))
+        parameters = {}
+    position = node.get("position")
+    if not (isinstance(position, list) and len(position) == 2 and all(isinstance(value, (int, float)) for value in position)):
+        errors.append(WorkflowError("invalid_position", "position should be [x, y].", f"{path}.position", name, "warning"))
+
+    if node_specs is None or not isinstance(node_type, str) or not node_type:
+        return errors
+    spec = find_node_spec(node_type, node_specs)
+    if spec is None:
+        if node_type in unverified_types:
+            errors.append(WorkflowError("unknown_node_type", f"'{node_type}' could not be found in the n8n catalog, check that it exists.", f"{path}.type", name, "warning"))
+        else:
+            errors.append(WorkflowError("unknown_node_type", f"'{node_type}' is not a node type in the n8n catalog.", f"{path}.type", name))
+        return errors
+
+    versions = [float(v) for v in spec.get("typeVersions") or []]
+    if type_version is not None and versions and float(type_version) not in versions:
+        errors.append(WorkflowError(
+            "invalid_type_version",
+            f"{node_type} has no typeVersion {type_version}, valid versions: {', '.join(str(v) for v in spec['typeVersions'])}.",
+            f"{path}.typeVersion", name
+        ))
+        return errors
+    version = float(type_version) if type_version is not None else (versions[-1] if versions else 0.0)
+
+    spec_parameters = [prop for prop in spec.get("parameters") or [] if _applies_to_version(prop, version)]
+    reported = set()
+    for prop in spec_parameters:
+        prop_name = prop.get("name")
+        if not prop.get("required") or "default" in prop or prop.get("type") in IMPLICIT_PARAMETER_TYPES:
+            continue
+        if prop_name in reported or parameters.get(prop_name) not in (None, "", [], {}):
+            continue
+        if _is_shown(prop, parameters, spec_parameters):
+            reported.add(prop_name)
+            errors.append(WorkflowError(
+                "missing_parameter", f"Required parameter '{prop_name}' is not set.", f"{path}.parameters.{prop_name}", name
+            ))
+
+    spec_credentials = [credential for credential in spec.get("credentials") or [] if _applies_to_version(credential, version)]
+    node_credentials = node.get("credentials")
+    if node_credentials is not None and not isinstance(node_credentials, dict):
+        errors.append(WorkflowError("invalid_credentials", "credentials must map credential types to {id, name}.", f"{path}.credentials", name))
+        node_credentials = {}
+    node_credentials = node_credentials or {}
+    if parameters.get("authentication") not in ANY_CREDENTIAL_AUTHENTICATION:
+        accepted = {credential.get("name") for credential in spec_credentials}
+        for credential_type in node_credentials:
+            if credential_type not in accepted:
+                expected = f", expected one of: {', '.join(sorted(filter(None, accepted)))}" if accepted else ", it takes no credentials"
+                errors.append(WorkflowError(
+                    "unknown_credential_type", f"{node_type} does not accept '{credential_type}' credentials{expected}.",
+                    f"{path}.credentials.{credential_type}", name
+                ))
+    for credential in spec_credentials:
+        if credential.get("required") and credential.get("name") not in node_credentials and _is_shown(credential, parameters, spec_parameters):
+            errors.append(WorkflowError(
+                "missing_credential", f"Needs '{credential.get('name')}' credentials, to be selected in n8n.",
+                f"{path}.credentials", name, "warning"
+            ))
+    return errors
+
+def _validate_connections(connections: Dict[str, Any], nodes_by_name: Dict[str, Dict[str, Any]], node_specs: Optional[Dict[str, Dict[str, Any]]]) -> List[WorkflowError]:
+    errors = []
+    for source, outputs in connections.items():
+        path = f"connections.{source}"
+        if source not in nodes_by_name:
+            errors.append(WorkflowError("unknown_connection_source", f"'{source}' is not the name of a node.", path))
+            continue
+        if not isinstance(outputs, dict):
+            errors.append(WorkflowError("invalid_connection", "Must map output types (e.g. \"main\") to lists of outputs.", path, source))
+            continue
+
+        spec = find_node_spec(nodes_by_name[source].get("type"), node_specs) if node_specs else None
+        output_counts = (spec or {}).get("outputs")
+        for output_type, slots in outputs.items():
+            output_path = f"{path}.{output_type}"
+            if not isinstance(slots, list):
+                errors.append(WorkflowError("invalid_connection", "Must be a list with one list of targets per output.", output_path, source))
+                continue
+            if output_counts is not None and output_type not in output_counts and any(slots):
+                errors.append(WorkflowError(
+                    "invalid_output_type", f"The node has no '{output_type}' output, it has: {', '.join(output_counts) or 'none'}.", output_path, source
+                ))
+                continue
+            for slot_index, targets in enumerate(slots):
+                slot_path = f"{output_path}[{slot_index}]"
+                if targets is None:
+                    continue
+                if not isinstance(targets, list):
+                    errors.append(WorkflowError("invalid_connection", "Each output must be a list of targets.", slot_path, source))
+                    continue
+                if targets and output_counts is not None and slot_index >= output_counts.get(output_type, 0):
+                    errors.append(WorkflowError(
+                        "invalid_output_index",
+                        f"The node has {output_counts.get(output_type, 0)} '{output_type}' output(s), there is no output {slot_index}.",
+                        slot_path, source
+                    ))
+                for target_index, target in enumerate(targets):
+                    target_path = f"{slot_path}[{target_index}]"
+                    if not isinstance(target, dict):
+                        errors.append(WorkflowError("invalid_connection", "A target must be an object {node, type, index}.", target_path, source))
+                        continue
+                    if target.get("node") not in nodes_by_name:
+                        errors.append(WorkflowError("unknown_connection_target", f"'{target.get('node')}' is not the name of a node.", f"{target_path}.node", source))
+                    if target.get("type") != output_type:
+                        errors.append(WorkflowError("invalid_connection", f"The target type must be '{output_type}', like the output.", f"{target_path}.type", source))
+                    target_input = target.get("index")
+                    if isinstance(target_input, bool) or not isinstance(target_input, int) or target_input < 0:
+                        errors.append(WorkflowError("invalid_connection", "The target index must be an input number (0 for the first input).", f"{target_path}.index", source))
+    return errors
+
+def validate_workflow(
+    workflow: Any,
+    node_specs: Optional[Dict[str, Dict[str, Any]]] = None,
+    unverified_types: Iterable[str] = ()
+) -> List[WorkflowError]:
+    """Validate a parsed workflow.
+
+    Args:
+        workflow: The workflow object
+        node_specs: Schema projections by node type (see build_node_specs). Without
+            them, types, parameters and credentials are not checked.
+        unverified_types: Node types to only warn about when node_specs lacks them,
+            see validate_node
+
+    Returns:
+        The errors and warnings found, empty for a valid workflow
+    """
+    if not isinstance(workflow, dict):
+        return [WorkflowError("invalid_structure", "The workflow must be a JSON object.")]
+    nodes = workflow.get("nodes")
+    if not isinstance(nodes, list) or not nodes:
+        return [WorkflowError("invalid_structure", "The workflow needs a non-empty \"nodes\" list.", "nodes")]
+
+    errors = []
+    nodes_by_name: Dict[str, Dict[str, Any]] = {}
+    seen_ids = set()
+    for index, node in enumerate(nodes):
+        errors += validate_node(node, index, node_specs, unverified_types)
+        if not isinstance(node, dict):
+            continue
+        node_id, name = node.get("id"), node.get("name")
+        if node_id is not None:
+            if node_id in seen_ids:
+                errors.append(WorkflowError("duplicate_id", f"Another node already has the id '{node_id}'.", f"nodes[{index}].id", name))
+            seen_ids.add(node_id)
+        if isinstance(name, str) and name:
+            if name in nodes_by_name:
+                errors.append(WorkflowError("duplicate_name", f"Another node is already named '{name}', connections refer to nodes by name.", f"nodes[{index}].name", name))
+            else:
+                nodes_by_name[name] = node
+
+    connections = workflow.get("connections", {})
+    if not isinstance(connections, dict):
+        errors.append(WorkflowError("invalid_structure", "\"connections\" must be an object keyed by source node name.", "connections"))
+    else:
+        errors += _validate_connections(connections, nodes_by_name, node_specs)
+    return errors
+
+def validate_workflow_text(
+    text: str,
+    node_specs: Optional[Dict[str, Dict[str, Any]]] = None,
+    unverified_types: Iterable[str] = ()
+) -> Tuple[Optional[Dict[str, Any]], List[WorkflowError]]:
+    """Parse and validate the coder's output, see parse_workflow and validate_workflow."""
+    workflow, error = parse_workflow(text)
+    if error:
+        return None, [error]
+    if workflow is None:
+        return None, []
+    return workflow, validate_workflow(workflow, node_specs, unverified_types)
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate an n8n workflow JSON file.")
+    parser.add_argument("path", help="Workflow JSON file")
+    parser.add_argument("--catalog", action="store_true", help="Check node types against the local n8n catalog (n8n_catalog.py sync)")
+    args = parser.parse_args()
+
+    with open(args.path, encoding="utf-8") as f:
+        text = f.read()
+
+    node_specs = None
+    if args.catalog:
+        from archon.utils.n8n_catalog import get_catalog
+        workflow, _ = parse_workflow(text)
+        short_types = [_short_type(node["type"]) for node in (workflow or {}).get("nodes") or [] if isinstance(node, dict) and isinstance(node.get("type"), str)]
+        node_specs = build_node_specs(get_catalog().search(short_types, limit=10 * len(short_types) or 10))
+
+    workflow, errors = validate_workflow_text(text, node_specs)
+    if workflow is None and not errors:
+        print("The file does not contain a workflow object.")
+        sys.exit(1)
+    print(format_errors(errors) or "The workflow is valid.")
+    sys.exit(1 if has_errors(errors) else 0)
+
+if __name__ == "__main__":
+    main()
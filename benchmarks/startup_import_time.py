@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+"""
+Measure the cold-start import time of the Archon services with `python -X importtime`.
+
+Each target is imported in a fresh interpreter several times and the median total
+import time is reported, together with the slowest top-level packages, so that
+regressions in the startup path (graph_service in the Docker image started by
+run_docker.py, and the MCP server) are easy to spot.
+
+Usage:
+    python benchmarks/startup_import_time.py
+    python benchmarks/startup_import_time.py --target graph_service --runs 5 --budget-ms 3000
+    python benchmarks/startup_import_time.py --json
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# Module to import and the directory to import it from (the MCP server runs from mcp/)
+DEFAULT_TARGETS = {
+    "graph_service": BASE_DIR,
+    "mcp_server": BASE_DIR / "mcp",
+}
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int, int]]:
+    """Parse `-X importtime` output into (module, depth, self_us, cumulative_us) rows."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        try:
+            _, timings = line.split(":", 1)
+            self_us, cumulative_us, name = timings.split("|", 2)
+        except ValueError:
+            continue
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return rows
+
+def measure(module: str, cwd: Path) -> Tuple[float, Dict[str, int]]:
+    """Import the module once in a fresh interpreter.
+
+    Returns:
+        The total import time in ms and the cumulative time in us of each top-level package
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=cwd,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        last_lines = "\n".join(result.stderr.strip().splitlines()[-5:])
+        raise RuntimeError(f"Importing {module} failed:\n{last_lines}")
+
+    rows = parse_importtime(result.stderr)
+    # Top-level imports have the smallest indentation, their cumulative times add up to the total
+    min_depth = min((depth for _, depth, _, _ in rows), default=0)
+    top_level = {}
+    for name, depth, _, cumulative_us in rows:
+        if depth == min_depth:
+            package = name.split(".")[0]
+            top_level[package] = top_level.get(package, 0) + cumulative_us
+
+    return sum(top_level.values()) / 1000, top_level
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", action="append", choices=sorted(DEFAULT_TARGETS), help="Module to measure (default: all)")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters per target (default: 3)")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest packages to show (default: 10)")
+    parser.add_argument("--budget-ms", type=float, help="Exit with status 1 if a target's median exceeds this")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    results = {}
+    over_budget = False
+    for target in args.target or list(DEFAULT_TARGETS):
+        totals = []
+        packages: Dict[str, List[int]] = {}
+        for _ in range(args.runs):
+            total_ms, top_level = measure(target, DEFAULT_TARGETS[target])
+            totals.append(total_ms)
+            for package, cumulative_us in top_level.items():
+                packages.setdefault(package, []).append(cumulative_us)
+
+        median_ms = statistics.median(totals)
+        slowest = sorted(
+            ((package, statistics.median(times) / 1000) for package, times in packages.items()),
+            key=lambda item: item[1],
+            reverse=True
+        )[:args.top]
+        results[target] = {"median_ms": round(median_ms, 1), "runs_ms": [round(t, 1) for t in totals], "slowest": slowest}
+        if args.budget_ms is not None and median_ms > args.budget_ms:
+            over_budget = True
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for target, result in results.items():
+            print(f"\n=== {target}: {result['median_ms']:.1f} ms median over {len(result['runs_ms'])} runs ===")
+            for package, ms in result["slowest"]:
+                print(f"  {ms:9.1f} ms  {package}")
+        if args.budget_ms is not None:
+            print(f"\nBudget: {args.budget_ms:.0f} ms -> {'EXCEEDED' if over_budget else 'ok'}")
+
+    return 1 if over_budget else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
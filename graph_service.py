@@ -1,30 +1,115 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, AsyncIterator
 from archon.archon_graph import agentic_flow
+from archon.utils.message_history import message_history_cache
 from langgraph.types import Command
-from utils.utils import write_to_log
+from utils.utils import get_env_var, write_to_log
+import asyncio
+import json
+import time
     
 app = FastAPI()
 
+@app.on_event("startup")
+async def load_n8n_catalog():
+    """Build the in-memory n8n catalog index before the first request when retrieval runs locally"""
+    if get_env_var("N8N_RETRIEVAL_MODE") == "local":
+        from archon.utils.n8n_catalog import get_catalog
+        await asyncio.to_thread(get_catalog().refresh)
+
 class InvokeRequest(BaseModel):
     message: str
     thread_id: str
     is_first_message: bool = False
     config: Optional[Dict[str, Any]] = None
 
+def _build_config(request: InvokeRequest) -> Dict[str, Any]:
+    """Return the LangGraph config for the request, defaulting to its thread ID."""
+    return request.config or {
+        "configurable": {
+            "thread_id": request.thread_id
+        }
+    }
+
+def _build_graph_input(request: InvokeRequest):
+    """Start a new run for the first message, otherwise resume the interrupted one."""
+    if request.is_first_message:
+        write_to_log(f"Processing first message for thread {request.thread_id}")
+        return {"latest_user_message": request.message}
+
+    write_to_log(f"Processing continuation for thread {request.thread_id}")
+    return Command(resume=request.message)
+
+async def _stream_events(request: InvokeRequest) -> AsyncIterator[Dict[str, Any]]:
+    """Run the agentic flow and yield progress and output events as they happen.
+
+    Custom stream chunks (the coder and finish_conversation output) become "chunk"
+    events. The workflow_node, workflow_connection and workflow_error events parsed
+    from the coder's output (see archon/utils/workflow_stream.py) are passed on as
+    they are. The debug stream is reduced to "node_start"/"node_end" events so
+    clients can show which node of the graph is currently running.
+
+    Args:
+        request: The InvokeRequest containing message and thread info
+
+    Yields:
+        dict: One event per chunk or node transition
+    """
+    node_started_at: Dict[str, float] = {}
+    async for mode, payload in agentic_flow.astream(
+        _build_graph_input(request),
+        _build_config(request),
+        stream_mode=["custom", "debug"]
+    ):
+        if mode == "custom":
+            # Workflow nodes, connections and errors parsed from the coder's stream
+            if isinstance(payload, dict) and "event" in payload:
+                yield payload
+            else:
+                yield {"event": "chunk", "data": payload}
+        elif payload.get("type") == "task":
+            node = payload["payload"]["name"]
+            node_started_at[node] = time.perf_counter()
+            yield {"event": "node_start", "node": node}
+        elif payload.get("type") == "task_result":
+            node = payload["payload"]["name"]
+            event = {"event": "node_end", "node": node}
+            if payload["payload"].get("error"):
+                event["error"] = str(payload["payload"]["error"])
+            if node in node_started_at:
+                latency_ms = round((time.perf_counter() - node_started_at.pop(node)) * 1000, 1)
+                write_to_log(f"Completed node {node}", thread_id=request.thread_id, node=node, latency_ms=latency_ms)
+            yield event
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {"status": "ok"}    
 
+@app.get("/stats")
+async def stats():
+    """Cache statistics for monitoring"""
+    return {"message_history": message_history_cache.stats()}
+
+@app.get("/threads/{thread_id}")
+async def get_thread(thread_id: str):
+    """Report whether the checkpointer holds state for a thread"""
+    snapshot = await agentic_flow.aget_state({"configurable": {"thread_id": thread_id}})
+    return {
+        "thread_id": thread_id,
+        "exists": bool(snapshot.values),
+        "next": list(snapshot.next)
+    }
+
 @app.post("/invoke")
 async def invoke_agent(request: InvokeRequest):
     """Process a message through the agentic flow and return the complete response.
 
     The agent streams the response but this API endpoint waits for the full output
     before returning so it's a synchronous operation for MCP.
-    Another endpoint will be made later to fully stream the response from the API.
+    Use /invoke/stream to receive the output as it is generated.
     
     Args:
         request: The InvokeRequest containing message and thread info
@@ -33,31 +118,24 @@ async def invoke_agent(request: InvokeRequest):
         dict: Contains the complete response from the agent
     """
     try:
-        config = request.config or {
-            "configurable": {
-                "thread_id": request.thread_id
-            }
-        }
+        start = time.perf_counter()
+        chunks = []
+        async for msg in agentic_flow.astream(
+            _build_graph_input(request),
+            _build_config(request),
+            stream_mode="custom"
+        ):
+            if isinstance(msg, dict) and "event" in msg:
+                continue
+            chunks.append(str(msg))
+        response = "".join(chunks)
 
-        response = ""
-        if request.is_first_message:
-            write_to_log(f"Processing first message for thread {request.thread_id}")
-            async for msg in agentic_flow.astream(
-                {"latest_user_message": request.message}, 
-                config,
-                stream_mode="custom"
-            ):
-                response += str(msg)
-        else:
-            write_to_log(f"Processing continuation for thread {request.thread_id}")
-            async for msg in agentic_flow.astream(
-                Command(resume=request.message),
-                config,
-                stream_mode="custom"
-            ):
-                response += str(msg)
-
-        write_to_log(f"Final response for thread {request.thread_id}: {response}")
+        latency_ms = round((time.perf_counter() - start) * 1000, 1)
+        write_to_log(
+            f"Final response for thread {request.thread_id} ({len(response)} chars)",
+            thread_id=request.thread_id,
+            latency_ms=latency_ms
+        )
         return {"response": response}
         
     except Exception as e:
@@ -65,6 +143,38 @@ async def invoke_agent(request: InvokeRequest):
         write_to_log(f"Error processing message for thread {request.thread_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/invoke/stream")
+async def invoke_agent_stream(request: InvokeRequest):
+    """Process a message through the agentic flow and stream the response as NDJSON.
+
+    Each line of the response body is a JSON object with an "event" field:
+    "node_start"/"node_end" when a graph node starts or finishes, "chunk" for every
+    piece of output from the coder or finish_conversation nodes, "error" if the run
+    fails part way through and "done" once the run has finished or been interrupted
+    to wait for the next user message.
+
+    Args:
+        request: The InvokeRequest containing message and thread info
+
+    Returns:
+        StreamingResponse: The newline-delimited JSON event stream
+    """
+    async def event_lines():
+        try:
+            async for event in _stream_events(request):
+                yield json.dumps(event, default=str) + "\n"
+            yield json.dumps({"event": "done"}) + "\n"
+        except Exception as e:
+            print(f"Exception streaming Archon for thread {request.thread_id}: {str(e)}")
+            write_to_log(f"Error streaming message for thread {request.thread_id}: {str(e)}")
+            yield json.dumps({"event": "error", "detail": str(e)}) + "\n"
+
+    return StreamingResponse(
+        event_lines(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8100)
@@ -0,0 +1,292 @@
+"""Staged crawl pipeline with bounded queues.
+
+Pages flow through four stages, each with its own pool of workers:
+
+    fetch -> chunk -> enrich (title, summary and embedding per chunk) -> store
+
+The stages are connected by bounded asyncio queues. When a stage falls behind, its
+input queue fills up and the stage before it waits (backpressure). A large page
+therefore never starts more enrich calls than there are enrich workers, and the LLM
+and embedding calls run at a steady rate instead of in bursts. The store stage
+writes chunks in batches.
+
+A page only succeeds when all of its chunks were enriched and stored. Its first chunk
+is written last, once the others are stored: it holds the page metadata (content hash,
+lastmod) an incremental crawl compares against, so a page with a failed chunk keeps
+its old metadata and is processed again by the next crawl.
+
+The crawler supplies the work done by each stage (see crawl_pydantic_ai_docs.py), and
+the pipeline reports per-stage throughput and queue depth to the CrawlProgressTracker.
+"""
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+from dataclasses import dataclass, field
+import asyncio
+import time
+
+@dataclass
+class Page:
+    """A fetched page waiting to be chunked, enriched and stored."""
+    url: str
+    markdown: str
+    page_metadata: Dict[str, Any] = field(default_factory=dict)
+    replace_existing: bool = False
+
+@dataclass
+class _ChunkJob:
+    page: Page
+    chunk_number: int
+    content: str
+
+class StageStats:
+    """Items processed by a stage and the depth of its input queue."""
+
+    def __init__(self, name: str, workers: int, queue: asyncio.Queue):
+        self.name = name
+        self.workers = workers
+        self.queue = queue
+        self.processed = 0
+        self.busy = 0
+        self.started_at = time.monotonic()
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = max(time.monotonic() - self.started_at, 1e-9)
+        return {
+            "workers": self.workers,
+            "busy": self.busy,
+            "processed": self.processed,
+            "per_second": round(self.processed / elapsed, 2),
+            "queue_depth": self.queue.qsize(),
+            "queue_size": self.queue.maxsize
+        }
+
+class CrawlPipeline:
+    """Run URLs through the fetch, chunk, enrich and store stages.
+
+    Args:
+        fetch: Fetch a URL. Returns the Page, or None when the page needs no processing
+            (e.g. unchanged in an incremental crawl). Exceptions count the URL as failed.
+        chunk: Split a page's markdown into chunks. It may be a generator, chunks are
+            queued for enrichment as they are produced.
+        enrich: Build the stored chunk (title, summary, embedding) from
+            (content, chunk_number, url, page_metadata)
+        store: Store a batch of enriched chunks
+        finish_page: Called with the page and its chunk count once all of its chunks are
+            stored. Not called for a page with a chunk that failed to enrich or store.
+        tracker: The CrawlProgressTracker to report progress to
+        fetch_workers / chunk_workers / enrich_workers / store_workers: Workers per stage
+        queue_size: Capacity of each queue between stages
+        store_batch_size: Maximum chunks per store call
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[str], Awaitable[Optional[Page]]],
+        chunk: Callable[[str], Iterable[str]],
+        enrich: Callable[[str, int, str, Dict[str, Any]], Awaitable[Any]],
+        store: Callable[[List[Any]], Awaitable[Any]],
+        finish_page: Optional[Callable[[Page, int], Awaitable[Any]]] = None,
+        tracker=None,
+        fetch_workers: int = 5,
+        chunk_workers: int = 2,
+        enrich_workers: int = 8,
+        store_workers: int = 2,
+        queue_size: int = 64,
+        store_batch_size: int = 50
+    ):
+        self.fetch = fetch
+        self.chunk = chunk
+        self.enrich = enrich
+        self.store = store
+        self.finish_page = finish_page
+        self.tracker = tracker
+        self.store_batch_size = store_batch_size
+
+        self.url_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.page_queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, queue_size // 8))
+        self.chunk_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.store_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.stages = {
+            "fetch": StageStats("fetch", fetch_workers, self.url_queue),
+            "chunk": StageStats("chunk", chunk_workers, self.page_queue),
+            "enrich": StageStats("enrich", enrich_workers, self.chunk_queue),
+            "store": StageStats("store", store_workers, self.store_queue)
+        }
+        self.chunk_counts: Dict[str, int] = {}
+        self.remaining_chunks: Dict[str, int] = {}
+        # Chunk 0 of each page, held back until the page's other chunks are stored
+        self.first_chunks: Dict[str, Any] = {}
+        # The first error of each page with a chunk that failed to enrich or store
+        self.page_errors: Dict[str, Exception] = {}
+
+    def _report(self):
+        if self.tracker:
+            self.tracker.update_stages({name: stage.to_dict() for name, stage in self.stages.items()})
+
+    def _page_done(self, succeeded: bool):
+        if self.tracker:
+            if succeeded:
+                self.tracker.urls_succeeded += 1
+            self.tracker.urls_processed += 1
+        self._report()
+
+    def _page_failed(self, url: str, error: Exception):
+        if self.tracker:
+            self.tracker.urls_failed += 1
+            self.tracker.log(f"Error processing {url}: {str(error)}")
+        else:
+            print(f"Error processing {url}: {str(error)}")
+        self._page_done(False)
+
+    async def _fetch_worker(self):
+        stage = self.stages["fetch"]
+        while True:
+            url = await self.url_queue.get()
+            stage.busy += 1
+            try:
+                page = await self.fetch(url)
+                if page is None:
+                    self._page_done(False)
+                else:
+                    await self.page_queue.put(page)
+            except Exception as e:
+                self._page_failed(url, e)
+            finally:
+                stage.busy -= 1
+                stage.processed += 1
+                self.url_queue.task_done()
+
+    async def _chunk_worker(self):
+        stage = self.stages["chunk"]
+        while True:
+            page = await self.page_queue.get()
+            stage.busy += 1
+            # Counts one extra until all chunks are queued, so the page cannot finish early
+            self.chunk_counts[page.url] = 0
+            self.remaining_chunks[page.url] = 1
+            try:
+                for i, content in enumerate(self.chunk(page.markdown)):
+                    self.chunk_counts[page.url] += 1
+                    self.remaining_chunks[page.url] += 1
+                    await self.chunk_queue.put(_ChunkJob(page, i, content))
+                if self.tracker:
+                    self.tracker.log(f"Split document into {self.chunk_counts[page.url]} chunks for {page.url}")
+                await self._chunk_stored(page)
+            except Exception as e:
+                self._forget(page)
+                self._page_failed(page.url, e)
+            finally:
+                stage.busy -= 1
+                stage.processed += 1
+                self.page_queue.task_done()
+
+    async def _enrich_worker(self):
+        stage = self.stages["enrich"]
+        while True:
+            job = await self.chunk_queue.get()
+            stage.busy += 1
+            try:
+                processed = await self.enrich(job.content, job.chunk_number, job.page.url, job.page.page_metadata)
+                if job.chunk_number == 0:
+                    if job.page.url in self.remaining_chunks:
+                        self.first_chunks[job.page.url] = processed
+                    await self._chunk_stored(job.page)
+                else:
+                    await self.store_queue.put((job.page, processed))
+            except Exception as e:
+                # Count the chunk as done so the page completes, as failed
+                print(f"Error enriching chunk {job.chunk_number} of {job.page.url}: {e}")
+                await self._chunk_stored(job.page, e)
+            finally:
+                stage.busy -= 1
+                stage.processed += 1
+                self.chunk_queue.task_done()
+                self._report()
+
+    async def _store_worker(self):
+        stage = self.stages["store"]
+        while True:
+            batch = [await self.store_queue.get()]
+            # Take whatever else is waiting, up to a full batch
+            while len(batch) < self.store_batch_size and not self.store_queue.empty():
+                batch.append(self.store_queue.get_nowait())
+            stage.busy += 1
+            try:
+                await self.store([processed for _, processed in batch])
+                if self.tracker:
+                    self.tracker.chunks_stored += len(batch)
+                for page, _ in batch:
+                    await self._chunk_stored(page)
+            except Exception as e:
+                print(f"Error storing {len(batch)} chunks: {e}")
+                for page, _ in batch:
+                    await self._chunk_stored(page, e)
+            finally:
+                stage.busy -= 1
+                stage.processed += len(batch)
+                for _ in batch:
+                    self.store_queue.task_done()
+                self._report()
+
+    async def _chunk_stored(self, page: Page, error: Optional[Exception] = None):
+        """Count one of the page's chunks as done, failed when error is given."""
+        if page.url not in self.remaining_chunks:
+            # The page already failed
+            return
+        if error is not None:
+            self.page_errors.setdefault(page.url, error)
+        self.remaining_chunks[page.url] -= 1
+        if self.remaining_chunks[page.url] == 0:
+            await self._finish(page)
+
+    def _forget(self, page: Page):
+        self.chunk_counts.pop(page.url, None)
+        self.remaining_chunks.pop(page.url, None)
+        self.first_chunks.pop(page.url, None)
+        self.page_errors.pop(page.url, None)
+
+    async def _finish(self, page: Page):
+        count = self.chunk_counts[page.url]
+        first_chunk = self.first_chunks.get(page.url)
+        error = self.page_errors.get(page.url)
+        self._forget(page)
+        if error is not None:
+            # Leave the stale chunks and the old metadata in place, the page is retried
+            self._page_failed(page.url, error)
+            return
+        try:
+            if self.finish_page:
+                await self.finish_page(page, count)
+            if first_chunk is not None:
+                await self.store([first_chunk])
+                if self.tracker:
+                    self.tracker.chunks_stored += 1
+            if self.tracker:
+                self.tracker.log(f"Stored {count} chunks for {page.url}")
+            self._page_done(True)
+        except Exception as e:
+            self._page_failed(page.url, e)
+
+    async def run(self, urls: List[str]):
+        """Process all URLs and return once every stage has drained."""
+        for stage in self.stages.values():
+            stage.started_at = time.monotonic()
+        workers = []
+        for name, worker in (
+            ("fetch", self._fetch_worker),
+            ("chunk", self._chunk_worker),
+            ("enrich", self._enrich_worker),
+            ("store", self._store_worker)
+        ):
+            workers += [asyncio.create_task(worker()) for _ in range(self.stages[name].workers)]
+
+        try:
+            for url in dict.fromkeys(urls):
+                await self.url_queue.put(url)
+            # Each stage only drains once the stage before it stopped producing
+            for queue in (self.url_queue, self.page_queue, self.chunk_queue, self.store_queue):
+                await queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            self._report()
@@ -4,13 +4,15 @@ import asyncio
 import threading
 import subprocess
 import requests
+import hashlib
+import httpx
 import json
-import time
-from typing import List, Dict, Any, Optional, Callable
+from typing import List, Dict, Any, Optional, Callable, Tuple, Awaitable
 from xml.etree import ElementTree
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from urllib.parse import urlparse
+from collections import defaultdict
 from dotenv import load_dotenv
 from openai import AsyncOpenAI
 import re
@@ -19,6 +21,9 @@ import html2text
 # Add the parent directory to sys.path to allow importing from the parent directory
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.utils import get_env_var, get_clients
+from archon.embedding_service import get_embedding_service
+from archon.crawl_pipeline import CrawlPipeline, Page
+from archon.markdown_chunker import chunk_markdown
 
 from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig, CacheMode
 
@@ -51,6 +56,20 @@ html_converter.ignore_images = False
 html_converter.ignore_tables = False
 html_converter.body_width = 0  # No wrapping
 
+SITEMAP_URL = "https://ai.pydantic.dev/sitemap.xml"
+SITEMAP_NAMESPACE = {'ns': 'http://www.sitemaps.org/schemas/sitemap/0.9'}
+REQUEST_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+# Token budget of a chunk and the tokens repeated from the end of the previous chunk
+CHUNK_MAX_TOKENS = 1200
+CHUNK_OVERLAP_TOKENS = 100
+
+# Concurrency limits of the incremental crawl
+MAX_CONCURRENT_REQUESTS = 20
+MAX_REQUESTS_PER_HOST = 4
+
 @dataclass
 class ProcessedChunk:
     url: str
@@ -77,6 +96,10 @@ class CrawlProgressTracker:
         self.urls_succeeded = 0
         self.urls_failed = 0
         self.chunks_stored = 0
+        self.urls_unchanged = 0
+        self.urls_removed = 0
+        self.bytes_downloaded = 0
+        self.stages = {}
         self.logs = []
         self.is_running = False
         self.start_time = None
@@ -115,6 +138,14 @@ class CrawlProgressTracker:
         if self.progress_callback:
             self.progress_callback(self.get_status())
     
+    def update_stages(self, stages: Dict[str, Dict[str, Any]]):
+        """Record the throughput and queue depth of each pipeline stage."""
+        self.stages = stages
+        
+        # Call the progress callback if provided
+        if self.progress_callback:
+            self.progress_callback(self.get_status())
+    
     def get_status(self) -> Dict[str, Any]:
         """Get the current status of the crawling process."""
         return {
@@ -124,6 +155,10 @@ class CrawlProgressTracker:
             "urls_succeeded": self.urls_succeeded,
             "urls_failed": self.urls_failed,
             "chunks_stored": self.chunks_stored,
+            "urls_unchanged": self.urls_unchanged,
+            "urls_removed": self.urls_removed,
+            "bytes_downloaded": self.bytes_downloaded,
+            "stages": self.stages,
             "progress_percentage": (self.urls_processed / self.urls_found * 100) if self.urls_found > 0 else 0,
             "logs": self.logs,
             "start_time": self.start_time,
@@ -194,33 +229,44 @@ async def get_title_and_summary(chunk: str, url: str) -> Dict[str, str]:
     Keep both title and summary concise but informative."""
     
     try:
-        response = await llm_client.chat.completions.create(
-            model=get_env_var("PRIMARY_MODEL") or "gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"URL: {url}\n\nContent:\n{chunk[:1000]}..."}  # Send first 1000 chars for context
-            ],
-            response_format={ "type": "json_object" }
-        )
+        for attempt in range(5):
+            try:
+                response = await llm_client.chat.completions.create(
+                    model=get_env_var("PRIMARY_MODEL") or "gpt-4o-mini",
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": f"URL: {url}\n\nContent:\n{chunk[:1000]}..."}  # Send first 1000 chars for context
+                    ],
+                    response_format={ "type": "json_object" }
+                )
+                break
+            except Exception as e:
+                # Wait and retry when rate limited, the pipeline keeps other chunks queued meanwhile
+                if getattr(e, "status_code", None) != 429 or attempt == 4:
+                    raise
+                await asyncio.sleep(2 ** attempt)
         return json.loads(response.choices[0].message.content)
     except Exception as e:
         print(f"Error getting title and summary: {e}")
         return {"title": "Error processing title", "summary": "Error processing summary"}
 
 async def get_embedding(text: str) -> List[float]:
-    """Get embedding vector from OpenAI."""
+    """Get embedding vector from OpenAI.
+
+    Requests go through the embedding service, which batches concurrent requests into
+    one API call, reuses vectors cached for unchanged text and respects rate limits.
+    """
     try:
-        response = await embedding_client.embeddings.create(
-            model=embedding_model,
-            input=text
-        )
-        return response.data[0].embedding
+        return await get_embedding_service(embedding_client).embed(text)
     except Exception as e:
         print(f"Error getting embedding: {e}")
         return [0] * 1536  # Return zero vector on error
 
-async def process_chunk(chunk: str, chunk_number: int, url: str) -> ProcessedChunk:
-    """Process a single chunk of text."""
+async def process_chunk(chunk: str, chunk_number: int, url: str, page_metadata: Optional[Dict[str, Any]] = None) -> ProcessedChunk:
+    """Process a single chunk of text.
+
+    page_metadata (the page's HTTP validators and content hash) is added to the chunk metadata.
+    """
     # Get title and summary
     extracted = await get_title_and_summary(chunk, url)
     
@@ -232,7 +278,8 @@ async def process_chunk(chunk: str, chunk_number: int, url: str) -> ProcessedChu
         "source": "pydantic_ai_docs",
         "chunk_size": len(chunk),
         "crawled_at": datetime.now(timezone.utc).isoformat(),
-        "url_path": urlparse(url).path
+        "url_path": urlparse(url).path,
+        **(page_metadata or {})
     }
     
     return ProcessedChunk(
@@ -245,181 +292,265 @@ async def process_chunk(chunk: str, chunk_number: int, url: str) -> ProcessedChu
         embedding=embedding
     )
 
-async def insert_chunk(chunk: ProcessedChunk):
-    """Insert a processed chunk into Supabase."""
-    try:
-        data = {
-            "url": chunk.url,
-            "chunk_number": chunk.chunk_number,
-            "title": chunk.title,
-            "summary": chunk.summary,
-            "content": chunk.content,
-            "metadata": chunk.metadata,
-            "embedding": chunk.embedding
-        }
-        
-        result = supabase.table("site_pages").insert(data).execute()
-        print(f"Inserted chunk {chunk.chunk_number} for {chunk.url}")
-        return result
-    except Exception as e:
-        print(f"Error inserting chunk: {e}")
-        return None
-
-async def process_and_store_document(url: str, markdown: str, tracker: Optional[CrawlProgressTracker] = None):
-    """Process a document and store its chunks in parallel."""
-    # Split into chunks
-    chunks = chunk_text(markdown)
-    
-    if tracker:
-        tracker.log(f"Split document into {len(chunks)} chunks for {url}")
-        # Ensure UI gets updated
-        if tracker.progress_callback:
-            tracker.progress_callback(tracker.get_status())
-    else:
-        print(f"Split document into {len(chunks)} chunks for {url}")
-    
-    # Process chunks in parallel
-    tasks = [
-        process_chunk(chunk, i, url) 
-        for i, chunk in enumerate(chunks)
-    ]
-    processed_chunks = await asyncio.gather(*tasks)
-    
-    if tracker:
-        tracker.log(f"Processed {len(processed_chunks)} chunks for {url}")
-        # Ensure UI gets updated
-        if tracker.progress_callback:
-            tracker.progress_callback(tracker.get_status())
-    else:
-        print(f"Processed {len(processed_chunks)} chunks for {url}")
+def html_to_markdown(html: str) -> str:
+    """Convert a page's HTML to markdown."""
+    markdown = html_converter.handle(html)
     
-    # Store chunks in parallel
-    insert_tasks = [
-        insert_chunk(chunk) 
-        for chunk in processed_chunks
-    ]
-    await asyncio.gather(*insert_tasks)
-    
-    if tracker:
-        tracker.chunks_stored += len(processed_chunks)
-        tracker.log(f"Stored {len(processed_chunks)} chunks for {url}")
-        # Ensure UI gets updated
-        if tracker.progress_callback:
-            tracker.progress_callback(tracker.get_status())
-    else:
-        print(f"Stored {len(processed_chunks)} chunks for {url}")
+    # Clean up the markdown
+    return re.sub(r'\n{3,}', '\n\n', markdown)  # Remove excessive newlines
 
 def fetch_url_content(url: str) -> str:
     """Fetch content from a URL using requests and convert to markdown."""
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
-    
     try:
-        response = requests.get(url, headers=headers, timeout=30)
+        response = requests.get(url, headers=REQUEST_HEADERS, timeout=30)
         response.raise_for_status()
         
         # Convert HTML to Markdown
-        markdown = html_converter.handle(response.text)
-        
-        # Clean up the markdown
-        markdown = re.sub(r'\n{3,}', '\n\n', markdown)  # Remove excessive newlines
-        
-        return markdown
+        return html_to_markdown(response.text)
     except Exception as e:
         raise Exception(f"Error fetching {url}: {str(e)}")
 
+async def store_chunks(chunks: List[ProcessedChunk]):
+    """Upsert a batch of processed chunks into Supabase in one request."""
+    data = [
+        {
+            "url": chunk.url,
+            "chunk_number": chunk.chunk_number,
+            "title": chunk.title,
+            "summary": chunk.summary,
+            "content": chunk.content,
+            "metadata": chunk.metadata,
+            "embedding": chunk.embedding
+        }
+        for chunk in chunks
+    ]
+    query = supabase.table("site_pages").upsert(data, on_conflict="url,chunk_number")
+    await asyncio.to_thread(query.execute)
+    print(f"Stored {len(chunks)} chunks")
+
+async def finish_page(page: Page, chunk_count: int):
+    """Delete chunks left over from a longer version of a re-crawled page."""
+    if page.replace_existing:
+        query = supabase.table("site_pages").delete().eq("url", page.url).gte("chunk_number", chunk_count)
+        await asyncio.to_thread(query.execute)
+
+def create_pipeline(fetch: Callable[[str], Awaitable[Optional[Page]]], tracker: Optional[CrawlProgressTracker] = None, fetch_workers: int = 5) -> CrawlPipeline:
+    """Build the crawl pipeline, with as many enrich workers as CRAWL_ENRICH_WORKERS (default 8).
+
+    Each enrich worker makes one title/summary LLM call at a time, so the worker count
+    bounds the LLM concurrency. Embeddings are batched by the embedding service.
+    """
+    return CrawlPipeline(
+        fetch=fetch,
+        chunk=lambda markdown: chunk_markdown(markdown, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS),
+        enrich=process_chunk,
+        store=store_chunks,
+        finish_page=finish_page,
+        tracker=tracker,
+        fetch_workers=fetch_workers,
+        enrich_workers=int(get_env_var("CRAWL_ENRICH_WORKERS") or 8)
+    )
+
 async def crawl_parallel_with_requests(urls: List[str], tracker: Optional[CrawlProgressTracker] = None, max_concurrent: int = 5):
-    """Crawl multiple URLs in parallel with a concurrency limit using direct HTTP requests."""
-    # Create a semaphore to limit concurrency
-    semaphore = asyncio.Semaphore(max_concurrent)
-    
-    async def process_url(url: str):
-        async with semaphore:
+    """Crawl multiple URLs through the fetch, chunk, enrich and store pipeline.
+
+    max_concurrent is the number of fetch workers, and at most MAX_REQUESTS_PER_HOST
+    requests go to the same host at once.
+    """
+    host_limits = defaultdict(lambda: asyncio.Semaphore(MAX_REQUESTS_PER_HOST))
+
+    async with httpx.AsyncClient(
+        follow_redirects=True,
+        timeout=30,
+        limits=httpx.Limits(max_connections=max_concurrent)
+    ) as client:
+        async def fetch(url: str) -> Page:
+            log_progress(tracker, f"Crawling: {url}")
+            async with host_limits[urlparse(url).netloc]:
+                response = await client.get(url, headers=REQUEST_HEADERS)
+            response.raise_for_status()
             if tracker:
-                tracker.log(f"Crawling: {url}")
-                # Ensure UI gets updated
-                if tracker.progress_callback:
-                    tracker.progress_callback(tracker.get_status())
-            else:
-                print(f"Crawling: {url}")
-            
-            try:
-                # Use a thread pool to run the blocking HTTP request
-                loop = asyncio.get_running_loop()
-                if tracker:
-                    tracker.log(f"Fetching content from: {url}")
-                else:
-                    print(f"Fetching content from: {url}")
-                markdown = await loop.run_in_executor(None, fetch_url_content, url)
-                
-                if markdown:
-                    if tracker:
-                        tracker.urls_succeeded += 1
-                        tracker.log(f"Successfully crawled: {url}")
-                        # Ensure UI gets updated
-                        if tracker.progress_callback:
-                            tracker.progress_callback(tracker.get_status())
-                    else:
-                        print(f"Successfully crawled: {url}")
-                    
-                    await process_and_store_document(url, markdown, tracker)
-                else:
-                    if tracker:
-                        tracker.urls_failed += 1
-                        tracker.log(f"Failed: {url} - No content retrieved")
-                        # Ensure UI gets updated
-                        if tracker.progress_callback:
-                            tracker.progress_callback(tracker.get_status())
-                    else:
-                        print(f"Failed: {url} - No content retrieved")
-            except Exception as e:
-                if tracker:
-                    tracker.urls_failed += 1
-                    tracker.log(f"Error processing {url}: {str(e)}")
-                    # Ensure UI gets updated
-                    if tracker.progress_callback:
-                        tracker.progress_callback(tracker.get_status())
-                else:
-                    print(f"Error processing {url}: {str(e)}")
-            finally:
-                if tracker:
-                    tracker.urls_processed += 1
-                    # Ensure UI gets updated
-                    if tracker.progress_callback:
-                        tracker.progress_callback(tracker.get_status())
+                tracker.bytes_downloaded += len(response.content)
+            markdown = html_to_markdown(response.text)
+            if not markdown.strip():
+                raise Exception("No content retrieved")
+            return Page(url, markdown)
 
-        time.sleep(2)
-    
-    # Process all URLs in parallel with limited concurrency
-    if tracker:
-        tracker.log(f"Processing {len(urls)} URLs with concurrency {max_concurrent}")
-        # Ensure UI gets updated
-        if tracker.progress_callback:
-            tracker.progress_callback(tracker.get_status())
-    else:
-        print(f"Processing {len(urls)} URLs with concurrency {max_concurrent}")
-    await asyncio.gather(*[process_url(url) for url in urls])
+        log_progress(tracker, f"Processing {len(urls)} URLs with concurrency {max_concurrent}")
+        await create_pipeline(fetch, tracker, fetch_workers=max_concurrent).run(urls)
 
 def get_pydantic_ai_docs_urls() -> List[str]:
     """Get URLs from Pydantic AI docs sitemap."""
-    sitemap_url = "https://ai.pydantic.dev/sitemap.xml"
     try:
-        response = requests.get(sitemap_url)
+        response = requests.get(SITEMAP_URL)
         response.raise_for_status()
         
         # Parse the XML
         root = ElementTree.fromstring(response.content)
         
         # Extract all URLs from the sitemap
-        namespace = {'ns': 'http://www.sitemaps.org/schemas/sitemap/0.9'}
-        urls = [loc.text for loc in root.findall('.//ns:loc', namespace)]
+        urls = [loc.text for loc in root.findall('.//ns:loc', SITEMAP_NAMESPACE)]
         
         return urls
     except Exception as e:
         print(f"Error fetching sitemap: {e}")
         return []
 
+def parse_sitemap(xml: bytes) -> Dict[str, Optional[str]]:
+    """Map each URL of a sitemap to its lastmod value (None when the sitemap has none)."""
+    root = ElementTree.fromstring(xml)
+    entries = {}
+    for entry in root.findall('.//ns:url', SITEMAP_NAMESPACE):
+        loc = entry.findtext('ns:loc', namespaces=SITEMAP_NAMESPACE)
+        if loc:
+            lastmod = entry.findtext('ns:lastmod', namespaces=SITEMAP_NAMESPACE)
+            entries[loc.strip()] = lastmod.strip() if lastmod else None
+    return entries
+
+def get_crawl_state(page_size: int = 1000) -> Dict[str, Dict[str, Any]]:
+    """Get the metadata stored with the first chunk of each crawled page, by URL.
+
+    It holds the page's sitemap lastmod, ETag, Last-Modified and content hash from the
+    previous crawl, so the crawl state always matches what is in site_pages.
+    """
+    state = {}
+    start = 0
+    while True:
+        rows = supabase.table("site_pages").select("url, metadata") \
+            .eq("metadata->>source", "pydantic_ai_docs").eq("chunk_number", 0) \
+            .order("id").range(start, start + page_size - 1).execute().data or []
+        state.update({row["url"]: row["metadata"] or {} for row in rows})
+        if len(rows) < page_size:
+            return state
+        start += page_size
+
+def log_progress(tracker: Optional[CrawlProgressTracker], message: str):
+    """Log to the tracker (which updates the UI), or print without one."""
+    if tracker:
+        tracker.log(message)
+    else:
+        print(message)
+
+async def fetch_if_changed(
+    client: httpx.AsyncClient,
+    url: str,
+    previous: Dict[str, Any],
+    host_limits: Dict[str, asyncio.Semaphore],
+    tracker: Optional[CrawlProgressTracker] = None
+) -> Tuple[Optional[str], Dict[str, Any]]:
+    """Fetch a page with a conditional request.
+
+    Returns:
+        (markdown or None if the server answered 304 Not Modified, the page's new validators)
+    """
+    headers = dict(REQUEST_HEADERS)
+    if previous.get("etag"):
+        headers["If-None-Match"] = previous["etag"]
+    if previous.get("last_modified"):
+        headers["If-Modified-Since"] = previous["last_modified"]
+
+    async with host_limits[urlparse(url).netloc]:
+        response = await client.get(url, headers=headers)
+    if tracker:
+        tracker.bytes_downloaded += len(response.content)
+
+    validators = {
+        "etag": response.headers.get("etag") or previous.get("etag"),
+        "last_modified": response.headers.get("last-modified") or previous.get("last_modified")
+    }
+    if response.status_code == 304:
+        return None, validators
+    response.raise_for_status()
+    return html_to_markdown(response.text), validators
+
+async def crawl_incremental(
+    sitemap: Dict[str, Optional[str]],
+    state: Dict[str, Dict[str, Any]],
+    tracker: Optional[CrawlProgressTracker] = None,
+    max_concurrent: int = MAX_CONCURRENT_REQUESTS,
+    max_per_host: int = MAX_REQUESTS_PER_HOST
+):
+    """Re-process only the sitemap pages that changed since the previous crawl.
+
+    A page is skipped without a request when its sitemap lastmod is unchanged. Other
+    pages are fetched with If-None-Match/If-Modified-Since, and only pages whose
+    markdown actually changed go on to the chunk, enrich and store stages.
+    """
+    host_limits = defaultdict(lambda: asyncio.Semaphore(max_per_host))
+
+    async with httpx.AsyncClient(
+        follow_redirects=True,
+        timeout=30,
+        limits=httpx.Limits(max_connections=max_concurrent)
+    ) as client:
+        async def fetch(url: str) -> Optional[Page]:
+            previous = state.get(url, {})
+            lastmod = sitemap[url]
+            if lastmod and previous.get("lastmod") == lastmod:
+                if tracker:
+                    tracker.urls_unchanged += 1
+                return None
+
+            markdown, validators = await fetch_if_changed(client, url, previous, host_limits, tracker)
+            page_metadata = {"lastmod": lastmod, **validators}
+            content_hash = hashlib.sha256(markdown.encode("utf-8")).hexdigest() if markdown is not None else None
+
+            if markdown is None or content_hash == previous.get("content_hash"):
+                # Unchanged content: only store the new validators so the next crawl can skip it
+                if any(previous.get(key) != value for key, value in page_metadata.items()):
+                    query = supabase.table("site_pages").update({"metadata": {**previous, **page_metadata}}) \
+                        .eq("url", url).eq("chunk_number", 0)
+                    await asyncio.to_thread(query.execute)
+                if tracker:
+                    tracker.urls_unchanged += 1
+                return None
+
+            log_progress(tracker, f"Changed: {url}")
+            page_metadata["content_hash"] = content_hash
+            return Page(url, markdown, page_metadata, replace_existing=True)
+
+        await create_pipeline(fetch, tracker, fetch_workers=max_concurrent).run(list(sitemap))
+
+def delete_pages(urls: List[str], batch_size: int = 100):
+    """Delete the stored chunks of pages that are no longer in the sitemap."""
+    for i in range(0, len(urls), batch_size):
+        supabase.table("site_pages").delete().eq("metadata->>source", "pydantic_ai_docs").in_("url", urls[i:i + batch_size]).execute()
+
+async def main_incremental(tracker: Optional[CrawlProgressTracker] = None):
+    """Bring the stored docs up to date, processing only new, changed and removed pages."""
+    try:
+        if tracker:
+            tracker.start()
+        log_progress(tracker, "Fetching URLs from Pydantic AI sitemap...")
+        async with httpx.AsyncClient(follow_redirects=True, timeout=30) as client:
+            response = await client.get(SITEMAP_URL, headers=REQUEST_HEADERS)
+            response.raise_for_status()
+        if tracker:
+            tracker.bytes_downloaded += len(response.content)
+        sitemap = parse_sitemap(response.content)
+
+        state = get_crawl_state()
+        removed = sorted(set(state) - set(sitemap))
+        if removed:
+            delete_pages(removed)
+            if tracker:
+                tracker.urls_removed = len(removed)
+            log_progress(tracker, f"Removed {len(removed)} pages that are no longer in the sitemap")
+
+        if tracker:
+            tracker.urls_found = len(sitemap)
+        log_progress(tracker, f"Found {len(sitemap)} URLs, {len(state)} crawled before")
+        await crawl_incremental(sitemap, state, tracker)
+
+        summary = f"{tracker.urls_succeeded} updated, {tracker.urls_unchanged} unchanged, {tracker.bytes_downloaded / 1024:.1f} KB downloaded" if tracker else "done"
+        log_progress(tracker, f"Incremental crawl finished: {summary}")
+        if tracker:
+            tracker.complete()
+    except Exception as e:
+        log_progress(tracker, f"Error in crawling process: {str(e)}")
+        if tracker:
+            tracker.complete()
+
 def clear_existing_records():
     """Clear all existing records with source='pydantic_ai_docs' from the site_pages table."""
     try:
@@ -506,8 +637,29 @@ def start_crawl_with_requests(progress_callback: Optional[Callable[[Dict[str, An
     
     return tracker
 
+def start_incremental_crawl(progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None) -> CrawlProgressTracker:
+    """Start an incremental crawl in a separate thread and return the tracker."""
+    tracker = CrawlProgressTracker(progress_callback)
+    
+    def run_crawl():
+        try:
+            asyncio.run(main_incremental(tracker))
+        except Exception as e:
+            print(f"Error in crawl thread: {e}")
+            tracker.log(f"Thread error: {str(e)}")
+            tracker.complete()
+    
+    thread = threading.Thread(target=run_crawl)
+    thread.daemon = True
+    thread.start()
+    
+    return tracker
+
 if __name__ == "__main__":    
-    # Run the main function directly
+    # Run the main function directly, --incremental only updates changed pages
     print("Starting crawler...")
-    asyncio.run(main_with_requests())
+    if "--incremental" in sys.argv:
+        asyncio.run(main_incremental(CrawlProgressTracker()))
+    else:
+        asyncio.run(main_with_requests())
     print("Crawler finished.")
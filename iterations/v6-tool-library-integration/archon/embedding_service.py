@@ -0,0 +1,304 @@
+"""Batched, cached and rate limited embeddings for the documentation crawler.
+
+The crawler asks for one embedding per chunk. EmbeddingService collects the requests
+made at about the same time and sends them as one embeddings call (up to the
+provider's maximum number of inputs and tokens per call), keeps every vector in a
+SQLite cache on disk keyed by a hash of the model and text, so re-crawling unchanged
+pages costs no API calls, and paces the calls with an adaptive rate limiter that
+stays within the requests-per-minute and tokens-per-minute budgets and slows down
+when the provider still answers with 429.
+
+Settings (environment or workbench/env_vars.json):
+    EMBEDDING_MAX_BATCH_SIZE   inputs per call (default 2048, the OpenAI maximum)
+    EMBEDDING_MAX_BATCH_TOKENS tokens per call (default 250000, OpenAI allows 300000)
+    EMBEDDING_RPM              requests per minute (default 3000)
+    EMBEDDING_TPM              tokens per minute (default 1000000)
+    EMBEDDING_CACHE_PATH       cache file (default workbench/embedding_cache.sqlite)
+"""
+from typing import Dict, List, Optional, Tuple
+from array import array
+from collections import deque
+import threading
+import weakref
+import hashlib
+import sqlite3
+import asyncio
+import random
+import time
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.utils import get_env_var, get_clients, workbench_dir, write_to_log
+
+# Time to wait for more requests before sending a partial batch
+BATCH_WINDOW_SECONDS = 0.05
+
+# Attempts per batch before its requests fail
+MAX_ATTEMPTS = 6
+
+_encoding = None
+
+def count_tokens(text: str) -> int:
+    """Count tokens with tiktoken, estimating 4 characters per token without it."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+    if _encoding is False:
+        return len(text) // 4 + 1
+    return len(_encoding.encode_ordinary(text))
+
+class RateLimiter:
+    """Sliding one-minute window over requests and tokens, with an adaptive rate.
+
+    The rate starts at the configured limits. A 429 from the provider halves it and
+    pauses all calls for the retry-after time; every successful call then raises it
+    again by 5%, back up to the configured limits.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int, min_scale: float = 0.05):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.min_scale = min_scale
+        self.scale = 1.0
+        self.paused_until = 0.0
+        self.window: deque = deque()  # (timestamp, tokens)
+        self.window_tokens = 0
+        self.lock = asyncio.Lock()
+
+    def _expire(self, now: float):
+        while self.window and now - self.window[0][0] >= 60:
+            self.window_tokens -= self.window.popleft()[1]
+
+    def _wait_time(self, tokens: int, now: float) -> float:
+        """Seconds until a call with this many tokens fits in the window."""
+        max_requests = max(1, int(self.requests_per_minute * self.scale))
+        # A single call larger than the scaled budget only has to wait for an empty window
+        max_tokens = max(tokens, int(self.tokens_per_minute * self.scale))
+        wait = max(0.0, self.paused_until - now)
+
+        if len(self.window) >= max_requests:
+            wait = max(wait, self.window[len(self.window) - max_requests][0] + 60 - now)
+        excess = self.window_tokens + tokens - max_tokens
+        if excess > 0:
+            freed = 0
+            for timestamp, entry_tokens in self.window:
+                freed += entry_tokens
+                if freed >= excess:
+                    wait = max(wait, timestamp + 60 - now)
+                    break
+        return wait
+
+    async def acquire(self, tokens: int):
+        """Wait until a call with this many tokens is within the limits, then record it."""
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self._expire(now)
+                wait = self._wait_time(tokens, now)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            self.window.append((now, tokens))
+            self.window_tokens += tokens
+
+    def on_success(self):
+        self.scale = min(1.0, self.scale * 1.05)
+
+    def on_rate_limited(self, retry_after: Optional[float] = None):
+        self.scale = max(self.min_scale, self.scale / 2)
+        self.paused_until = max(self.paused_until, time.monotonic() + (retry_after or 1.0))
+
+class EmbeddingCache:
+    """Persistent map of sha256(model, text) to embedding, stored as float32 blobs in SQLite."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        # The connection is shared by the crawl threads
+        self.lock = threading.Lock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self.conn.commit()
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        # Stay below SQLite's limit on query parameters
+        for i in range(0, len(keys), 500):
+            batch = keys[i:i + 500]
+            with self.lock:
+                rows = self.conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+            for key, blob in rows:
+                found[key] = array("f", blob).tolist()
+        return found
+
+    def put_many(self, items: List[Tuple[str, List[float]]]):
+        rows = [(key, array("f", vector).tobytes()) for key, vector in items]
+        with self.lock:
+            self.conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+            self.conn.commit()
+
+class EmbeddingService:
+    """Embed texts through batched, cached and rate limited calls to an OpenAI-compatible API."""
+
+    def __init__(
+        self,
+        client,
+        model: str,
+        cache: Optional[EmbeddingCache] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        max_batch_size: int = 2048,
+        max_batch_tokens: int = 250000
+    ):
+        self.client = client
+        self.model = model
+        self.cache = cache
+        self.rate_limiter = rate_limiter or RateLimiter(3000, 1000000)
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.pending: Dict[str, Tuple[str, int, asyncio.Future]] = {}  # key -> (text, tokens, future)
+        self.flush_task: Optional[asyncio.Task] = None
+        self.in_flight: Dict[str, asyncio.Future] = {}  # Requests sent, waiting for the API
+        self.send_tasks = set()  # Keeps running batches referenced until they finish
+        self.stats = {"requested": 0, "cache_hits": 0, "api_calls": 0, "api_inputs": 0, "rate_limited": 0}
+
+    async def embed(self, text: str) -> List[float]:
+        """Embed one text. Concurrent calls are sent to the API together."""
+        return (await self.embed_many([text]))[0]
+
+    async def embed_many(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts, taking cached vectors from disk and batching the rest with other pending requests."""
+        keys = [EmbeddingCache.key(self.model, text) for text in texts]
+        self.stats["requested"] += len(texts)
+        cached = await asyncio.to_thread(self.cache.get_many, list(set(keys))) if self.cache else {}
+        self.stats["cache_hits"] += sum(1 for key in keys if key in cached)
+
+        loop = asyncio.get_running_loop()
+        futures = {}
+        for key, text in zip(keys, texts):
+            if key in cached or key in futures:
+                continue
+            if key in self.in_flight:
+                futures[key] = self.in_flight[key]
+                continue
+            if key not in self.pending:
+                # Identical texts share one pending request
+                self.pending[key] = (text, count_tokens(text), loop.create_future())
+            futures[key] = self.pending[key][2]
+
+        if futures:
+            if sum(tokens for _, tokens, _ in self.pending.values()) >= self.max_batch_tokens or len(self.pending) >= self.max_batch_size:
+                self._flush()
+            elif self.flush_task is None or self.flush_task.done():
+                self.flush_task = asyncio.create_task(self._flush_after_window())
+            results = dict(zip(futures, await asyncio.gather(*futures.values())))
+        else:
+            results = {}
+
+        return [cached[key] if key in cached else results[key] for key in keys]
+
+    async def _flush_after_window(self):
+        await asyncio.sleep(BATCH_WINDOW_SECONDS)
+        self._flush()
+
+    def _flush(self):
+        """Split the pending requests into batches within the input and token limits and send them."""
+        batch: List[Tuple[str, str, int, asyncio.Future]] = []
+        batch_tokens = 0
+        for key, (text, tokens, future) in self.pending.items():
+            if batch and (len(batch) >= self.max_batch_size or batch_tokens + tokens > self.max_batch_tokens):
+                self._start_send(batch)
+                batch, batch_tokens = [], 0
+            batch.append((key, text, tokens, future))
+            batch_tokens += tokens
+        if batch:
+            self._start_send(batch)
+        self.pending = {}
+
+    def _start_send(self, batch: List[Tuple[str, str, int, asyncio.Future]]):
+        for key, _, _, future in batch:
+            self.in_flight[key] = future
+        task = asyncio.create_task(self._send(batch))
+        self.send_tasks.add(task)
+
+        def done(task):
+            self.send_tasks.discard(task)
+            for item in batch:
+                self.in_flight.pop(item[0], None)
+        task.add_done_callback(done)
+
+    async def _send(self, batch: List[Tuple[str, str, int, asyncio.Future]]):
+        tokens = sum(item[2] for item in batch)
+        for attempt in range(MAX_ATTEMPTS):
+            await self.rate_limiter.acquire(tokens)
+            try:
+                response = await self.client.embeddings.create(model=self.model, input=[item[1] for item in batch])
+                break
+            except Exception as e:
+                if attempt == MAX_ATTEMPTS - 1:
+                    for *_, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    return
+                if getattr(e, "status_code", None) == 429:
+                    self.stats["rate_limited"] += 1
+                    retry_after = None
+                    try:
+                        retry_after = float(e.response.headers.get("retry-after"))
+                    except (AttributeError, TypeError, ValueError):
+                        pass
+                    self.rate_limiter.on_rate_limited(retry_after)
+                    write_to_log(f"Embeddings rate limited, rate scaled to {self.rate_limiter.scale:.2f}")
+                else:
+                    # Network or server error, back off exponentially with jitter
+                    await asyncio.sleep(min(30, 2 ** attempt) * (0.5 + random.random()))
+
+        self.rate_limiter.on_success()
+        self.stats["api_calls"] += 1
+        self.stats["api_inputs"] += len(batch)
+        vectors = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        if self.cache:
+            await asyncio.to_thread(self.cache.put_many, [(item[0], vector) for item, vector in zip(batch, vectors)])
+        for (*_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+# One service per event loop, since the crawler runs each crawl with asyncio.run in its own thread
+_services: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, EmbeddingService]" = weakref.WeakKeyDictionary()
+_cache: Optional[EmbeddingCache] = None
+
+def get_embedding_service(embedding_client=None) -> EmbeddingService:
+    """Get the embedding service of the running event loop, configured from the environment.
+
+    Args:
+        embedding_client: The AsyncOpenAI client to use, by default the one from get_clients()
+    """
+    global _cache
+    loop = asyncio.get_running_loop()
+    if loop not in _services:
+        if _cache is None:
+            _cache = EmbeddingCache(get_env_var("EMBEDDING_CACHE_PATH") or os.path.join(workbench_dir, "embedding_cache.sqlite"))
+        if embedding_client is None:
+            embedding_client, _ = get_clients()
+        _services[loop] = EmbeddingService(
+            embedding_client,
+            get_env_var("EMBEDDING_MODEL") or "text-embedding-3-small",
+            cache=_cache,
+            rate_limiter=RateLimiter(
+                int(get_env_var("EMBEDDING_RPM") or 3000),
+                int(get_env_var("EMBEDDING_TPM") or 1000000)
+            ),
+            max_batch_size=int(get_env_var("EMBEDDING_MAX_BATCH_SIZE") or 2048),
+            max_batch_tokens=int(get_env_var("EMBEDDING_MAX_BATCH_TOKENS") or 250000)
+        )
+    return _services[loop]
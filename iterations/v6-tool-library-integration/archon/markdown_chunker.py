@@ -0,0 +1,181 @@
+"""Structure-aware markdown chunking with a token budget.
+
+chunk_markdown scans the document once with a regular expression, splitting it into blocks
+(headings, fenced code blocks and paragraphs). It then packs whole blocks greedily
+into chunks of at most max_tokens tokens. A chunk therefore never ends in the middle
+of a paragraph or code block, unless that block alone is larger than the budget, and
+never ends with a heading, which moves to the chunk with its section. An oversized
+paragraph is split between lines and sentences, and an oversized code block between
+lines, with its fence repeated around each piece.
+
+Chunks are yielded one at a time as slices of the original text, so large pages are
+not copied as a whole.
+"""
+from typing import Callable, Iterator, List, Optional, Tuple
+import re
+
+# (kind, start, end) of a block in the document: kind is "heading", "code" or "paragraph"
+Block = Tuple[str, int, int]
+
+_FENCE = re.compile(r"\s{0,3}(`{3,}|~{3,})")
+
+# One scan finds every block: a fenced code block up to its closing fence (or the end
+# of the text), a heading line, or a paragraph of consecutive lines that are not blank
+# and do not start a heading or fence.
+_BLOCK = re.compile(
+    r"(?P<code>^[ ]{0,3}(?P<fence>`{3,}|~{3,})[^\n]*(?:\n.*?^[ ]{0,3}(?P=fence)[`~]*[ \t]*$|.*\Z))"
+    r"|(?P<heading>^[ ]{0,3}\#[^\n]*)"
+    r"|(?P<paragraph>^(?![ ]{0,3}(?:`{3}|~{3}|\#))[^\n]*\S[^\n]*"
+    r"(?:\n(?![ ]{0,3}(?:`{3}|~{3}|\#)|[ \t]*(?:\n|\Z))[^\n]*)*)",
+    re.MULTILINE | re.DOTALL
+)
+# Zero-width split points after each line and sentence, so the pieces join back to the original text
+_SPLIT_POINTS = re.compile(r"(?<=\n)|(?<=[.!?] )")
+
+_encoding = None
+
+def count_tokens(text: str) -> int:
+    """Count tokens with tiktoken, estimating 4 characters per token without it."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+    if _encoding is False:
+        return (len(text) + 3) // 4
+    return len(_encoding.encode_ordinary(text))
+
+def iter_blocks(text: str) -> Iterator[Block]:
+    """Split markdown into headings, fenced code blocks and paragraphs in a single regex scan."""
+    for match in _BLOCK.finditer(text):
+        yield match.lastgroup, match.start(), match.end()
+
+def _split_block(text: str, kind: str, max_tokens: int, count: Callable[[str], int]) -> Iterator[str]:
+    """Split a block larger than the budget: code between lines, paragraphs between sentences."""
+    if kind == "code":
+        lines = text.splitlines(keepends=True)
+        opening = lines[0]
+        closing = lines[-1] if len(lines) > 1 and _FENCE.match(lines[-1]) else ""
+        body = lines[1:-1] if closing else lines[1:]
+        fence = _FENCE.match(opening).group(1)
+        pieces = body
+        closing = closing or fence + "\n"
+        wrap = lambda piece: opening + piece + closing
+        budget = max(1, max_tokens - count(opening) - count(closing))
+    else:
+        pieces = [piece for piece in _SPLIT_POINTS.split(text) if piece]
+        wrap = lambda piece: piece
+        budget = max_tokens
+
+    current: List[str] = []
+    current_tokens = 0
+    for piece in pieces:
+        piece_tokens = count(piece)
+        if piece_tokens > budget:
+            # A single line or sentence over the budget, cut it at about 4 characters per
+            # token, shorter where that is still too many tokens
+            if current:
+                yield wrap("".join(current))
+                current, current_tokens = [], 0
+            i = 0
+            while i < len(piece):
+                end = i + budget * 4
+                while end - i > 1 and count(piece[i:end]) > budget:
+                    end -= max(1, (end - i) // 8)
+                yield wrap(piece[i:end])
+                i = end
+            continue
+        if current and current_tokens + piece_tokens > budget:
+            yield wrap("".join(current))
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += piece_tokens
+    if current:
+        yield wrap("".join(current))
+
+def chunk_markdown(
+    text: str,
+    max_tokens: int = 1200,
+    overlap_tokens: int = 0,
+    count: Callable[[str], int] = count_tokens
+) -> Iterator[str]:
+    """Yield chunks of at most max_tokens tokens made of whole markdown blocks.
+
+    Blocks are counted with the whitespace before them, and headings carried to the
+    next chunk count against its budget. The limit holds for counters where joining
+    two texts never adds tokens, like tiktoken's and the 4 characters estimate.
+
+    Args:
+        text: The markdown document
+        max_tokens: Token budget per chunk
+        overlap_tokens: Repeat up to this many tokens of trailing blocks at the start of
+            the next chunk, so context is not lost at chunk boundaries
+        count: Token counter, tiktoken's cl100k_base by default
+
+    Yields:
+        The chunks, stripped of surrounding whitespace
+    """
+    # Blocks of the current chunk: (kind, start, end, tokens)
+    current: List[Tuple[str, int, int, int]] = []
+
+    def take_chunk() -> Tuple[Optional[str], List[Tuple[str, int, int, int]]]:
+        """Cut the current blocks into a chunk, returning the trailing headings that belong to the next one."""
+        headings = []
+        while current and current[-1][0] == "heading":
+            headings.insert(0, current.pop())
+        if not current:
+            return None, headings
+        chunk = text[current[0][1]:current[-1][2]].strip()
+        return chunk or None, headings
+
+    previous_end = 0
+    for kind, start, end in iter_blocks(text):
+        # With the blank lines before it, as the block appears in a chunk
+        tokens = count(text[previous_end:end])
+        previous_end = end
+        current_tokens = sum(block[3] for block in current)
+
+        if current and current_tokens + tokens > max_tokens:
+            chunk, headings = take_chunk()
+            if chunk:
+                yield chunk
+            # Repeat trailing blocks as overlap, after them come the carried headings
+            overlap: List[Tuple[str, int, int, int]] = []
+            overlap_total = sum(block[3] for block in headings)
+            if not headings:
+                for block in reversed(current):
+                    if overlap_total + block[3] > overlap_tokens or overlap_total + block[3] + tokens > max_tokens:
+                        break
+                    overlap.insert(0, block)
+                    overlap_total += block[3]
+            current = overlap + headings
+            current_tokens = overlap_total
+
+        if current_tokens + tokens > max_tokens:
+            # Too large for a chunk of its own, even without overlap. current only holds
+            # the headings right before the block, they open its first piece.
+            prefix = text[current[0][1]:start] if current else ""
+            budget = max_tokens - count(prefix)
+            if prefix and budget < max_tokens // 2:
+                # Headings that would leave little room for the block get a chunk of their own
+                yield prefix.strip()
+                prefix, budget = "", max_tokens
+            first = True
+            for piece in _split_block(text[start:end], kind, budget, count):
+                piece = (prefix + piece if first else piece).strip()
+                first = False
+                if piece:
+                    yield piece
+            current = []
+            continue
+
+        current.append((kind, start, end, tokens))
+
+    chunk, headings = take_chunk()
+    if chunk:
+        yield chunk
+    if headings:
+        # A document ending in headings
+        yield text[headings[0][1]:headings[-1][2]].strip()
@@ -45,7 +45,7 @@ def show_manual_sql_instructions(sql, vector_dim, recreate=False):
     
     if recreate:
         st.markdown("**Step 3:** Copy and execute the following SQL:")
-        drop_sql = f"DROP FUNCTION IF EXISTS match_site_pages(vector({vector_dim}), int, jsonb);\nDROP TABLE IF EXISTS site_pages CASCADE;"
+        drop_sql = f"DROP FUNCTION IF EXISTS match_site_pages(vector({vector_dim}), int, jsonb);\nDROP FUNCTION IF EXISTS match_site_pages(vector({vector_dim}), int, jsonb, int);\nDROP TABLE IF EXISTS site_pages CASCADE;"
         st.code(drop_sql, language="sql")
         
         st.markdown("**Step 4:** Then copy and execute this SQL:")
@@ -4,7 +4,7 @@ import sys
 import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from archon.crawl_pydantic_ai_docs import start_crawl_with_requests, clear_existing_records
+from archon.crawl_pydantic_ai_docs import start_crawl_with_requests, start_incremental_crawl, clear_existing_records
 from utils.utils import get_env_var, create_new_tab_button
 
 def documentation_tab(supabase_client):
@@ -27,6 +27,9 @@ def documentation_tab(supabase_client):
         5. Store the chunks in the Supabase database
         
         This process may take several minutes depending on the number of pages.
+        
+        Once the docs are indexed, use **Update Pydantic AI Docs** to process only the pages
+        that were added, changed or removed since the last crawl.
         """)
         
         # Check if the database is configured
@@ -48,7 +51,7 @@ def documentation_tab(supabase_client):
                 st.session_state.last_update_time = time.time()
             
             # Create columns for the buttons
-            col1, col2 = st.columns(2)
+            col1, col2, col3 = st.columns(3)
             
             with col1:
                 # Button to start crawling
@@ -68,6 +71,19 @@ def documentation_tab(supabase_client):
                         st.error(f"❌ Error starting crawl: {str(e)}")
             
             with col2:
+                # Button to update only the changed pages
+                if st.button("Update Pydantic AI Docs", key="update_pydantic") and not (st.session_state.crawl_tracker and st.session_state.crawl_tracker.is_running):
+                    try:
+                        def update_progress(status):
+                            st.session_state.crawl_status = status
+                        
+                        st.session_state.crawl_tracker = start_incremental_crawl(update_progress)
+                        st.session_state.crawl_status = st.session_state.crawl_tracker.get_status()
+                        st.rerun()
+                    except Exception as e:
+                        st.error(f"❌ Error starting update: {str(e)}")
+            
+            with col3:
                 # Button to clear existing Pydantic AI docs
                 if st.button("Clear Pydantic AI Docs", key="clear_pydantic"):
                     with st.spinner("Clearing existing Pydantic AI docs..."):
@@ -102,17 +118,29 @@ def documentation_tab(supabase_client):
                         st.progress(progress)
                     
                     # Display status metrics
-                    col1, col2, col3, col4 = st.columns(4)
+                    col1, col2, col3, col4, col5 = st.columns(5)
                     if status:
                         col1.metric("URLs Found", status["urls_found"])
                         col2.metric("URLs Processed", status["urls_processed"])
                         col3.metric("Successful", status["urls_succeeded"])
-                        col4.metric("Failed", status["urls_failed"])
+                        col4.metric("Unchanged", status["urls_unchanged"])
+                        col5.metric("Failed", status["urls_failed"])
                     else:
                         col1.metric("URLs Found", 0)
                         col2.metric("URLs Processed", 0)
                         col3.metric("Successful", 0)
-                        col4.metric("Failed", 0)
+                        col4.metric("Unchanged", 0)
+                        col5.metric("Failed", 0)
+                    
+                    # Display the throughput and queue depth of each pipeline stage
+                    if status and status.get("stages"):
+                        st.table({
+                            "Stage": list(status["stages"]),
+                            "Processed": [stage["processed"] for stage in status["stages"].values()],
+                            "Per second": [stage["per_second"] for stage in status["stages"].values()],
+                            "Busy workers": [f"{stage['busy']}/{stage['workers']}" for stage in status["stages"].values()],
+                            "Queued": [f"{stage['queue_depth']}/{stage['queue_size']}" for stage in status["stages"].values()]
+                        })
                     
                     # Display logs in an expander
                     with st.expander("Crawling Logs", expanded=True):
@@ -0,0 +1,77 @@
+"""Micro-benchmark of chunk_markdown against the character-based chunk_text.
+
+Generates documentation-like markdown (headings, paragraphs, lists and fenced code
+blocks), chunks it with both functions and reports the time per document, the number
+of chunks, their token sizes and how many chunks cut a code block in half.
+
+    python utils/benchmark_chunking.py [--size-kb 200] [--repeat 20]
+"""
+from typing import Callable, Iterable, List
+import argparse
+import random
+import time
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from archon.markdown_chunker import chunk_markdown, count_tokens
+
+WORDS = "agent model tool result context dependency prompt run stream message validator retry schema field".split()
+
+def make_document(size: int, seed: int) -> str:
+    """Generate markdown of about size characters."""
+    rng = random.Random(seed)
+    sentence = lambda: " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 20))).capitalize() + ". "
+    parts: List[str] = []
+    length = 0
+    while length < size:
+        roll = rng.random()
+        if roll < 0.1:
+            part = f"{'#' * rng.randint(1, 3)} {sentence().strip('. ')}\n\n"
+        elif roll < 0.35:
+            lines = [f"    result = agent.run_sync('{rng.choice(WORDS)}', deps={rng.randint(1, 99)})" for _ in range(rng.randint(3, 60))]
+            part = "```python\n" + "\n".join(lines) + "\n```\n\n"
+        elif roll < 0.45:
+            part = "".join(f"- {sentence()}\n" for _ in range(rng.randint(2, 8))) + "\n"
+        else:
+            part = "".join(sentence() for _ in range(rng.randint(2, 12))) + "\n\n"
+        parts.append(part)
+        length += len(part)
+    return "".join(parts)
+
+def broken_code_blocks(chunks: List[str]) -> int:
+    """Chunks with an odd number of fences, i.e. starting or ending inside a code block."""
+    return sum(1 for chunk in chunks if chunk.count("```") % 2)
+
+def measure(name: str, chunker: Callable[[str], Iterable[str]], document: str, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks = list(chunker(document))
+        timings.append(time.perf_counter() - start)
+    tokens = sorted(count_tokens(chunk) for chunk in chunks)
+    print(
+        f"{name:<24} {min(timings) * 1000:8.2f} ms  {len(chunks):4d} chunks  "
+        f"tokens min/median/max {tokens[0]}/{tokens[len(tokens) // 2]}/{tokens[-1]}  "
+        f"split code blocks {broken_code_blocks(chunks)}"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare chunk_markdown with chunk_text on synthetic markdown.")
+    parser.add_argument("--size-kb", type=int, default=200, help="Size of the generated document")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per chunker, the fastest is reported")
+    parser.add_argument("--max-tokens", type=int, default=1200, help="Token budget of chunk_markdown")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    # The crawler module sets up its API clients on import, so only load it here
+    from archon.crawl_pydantic_ai_docs import chunk_text
+
+    document = make_document(args.size_kb * 1024, args.seed)
+    print(f"Document: {len(document) / 1024:.0f} KB, {count_tokens(document)} tokens\n")
+    measure("chunk_text (5000 chars)", chunk_text, document, args.repeat)
+    measure(f"chunk_markdown ({args.max_tokens} tok)", lambda text: chunk_markdown(text, args.max_tokens), document, args.repeat)
+    measure("  with 100 tok overlap", lambda text: chunk_markdown(text, args.max_tokens, 100), document, args.repeat)
+
+if __name__ == "__main__":
+    main()
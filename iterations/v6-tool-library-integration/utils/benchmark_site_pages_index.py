@@ -0,0 +1,147 @@
+"""Benchmark the HNSW index of site_pages against exact search on a synthetic corpus.
+
+Loads random clustered embeddings into a temporary table with the same layout as
+site_pages, builds an HNSW index with the given m/ef_construction and runs the same
+queries with each ef_search value, unfiltered and with a metadata filter. Recall@k
+is measured against the exact nearest neighbours (computed with numpy), latency per
+query against a sequential scan of the same table.
+
+    python utils/benchmark_site_pages_index.py --dsn postgresql://postgres:<password>@<host>:5432/postgres
+
+The DSN defaults to the DATABASE_URL environment variable (the Supabase connection
+string). Needs the vector extension (pgvector 0.5+, 0.8+ for iterative filtered scans)
+and psycopg. Only a temporary table is created, so nothing is left behind.
+"""
+from typing import Dict, List, Optional
+import argparse
+import json
+import time
+import sys
+import os
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.utils import get_env_var
+
+def make_corpus(rows: int, queries: int, dim: int, clusters: int, seed: int):
+    """Generate unit vectors grouped around random centers, like embeddings of related documents."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+
+    def sample(n):
+        points = centers[rng.integers(0, clusters, n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+        return points / np.linalg.norm(points, axis=1, keepdims=True)
+
+    return sample(rows), sample(queries)
+
+def exact_neighbours(corpus: np.ndarray, queries: np.ndarray, k: int, mask: Optional[np.ndarray] = None) -> List[set]:
+    """Ids of the k nearest rows by cosine distance for each query."""
+    ids = np.arange(len(corpus))
+    if mask is not None:
+        corpus, ids = corpus[mask], ids[mask]
+    if len(ids) <= k:
+        return [set(ids.tolist()) for _ in queries]
+    similarities = queries @ corpus.T
+    top = np.argpartition(-similarities, k, axis=1)[:, :k]
+    return [set(ids[row].tolist()) for row in top]
+
+def to_vector_literal(vector: np.ndarray) -> str:
+    return "[" + ",".join(f"{value:.6f}" for value in vector.tolist()) + "]"
+
+def percentile(latencies: List[float], p: float) -> float:
+    return float(np.percentile(latencies, p)) * 1000
+
+def run_queries(cur, query_literals: List[str], truth: List[set], k: int, metadata_filter: Optional[Dict] = None) -> Dict[str, float]:
+    """Run every query, returning recall@k and latency percentiles in ms."""
+    where = "where metadata @> %s::jsonb" if metadata_filter else ""
+    sql = f"select id from bench_site_pages {where} order by embedding <=> %s::vector limit {k}"
+    latencies, recalls = [], []
+    for literal, expected in zip(query_literals, truth):
+        params = (json.dumps(metadata_filter), literal) if metadata_filter else (literal,)
+        start = time.perf_counter()
+        cur.execute(sql, params)
+        found = {row[0] for row in cur.fetchall()}
+        latencies.append(time.perf_counter() - start)
+        recalls.append(len(found & expected) / k)
+    return {"recall": float(np.mean(recalls)), "p50": percentile(latencies, 50), "p99": percentile(latencies, 99)}
+
+def print_result(label: str, result: Dict[str, float]):
+    print(f"{label:<34} recall@k {result['recall']:.3f}   p50 {result['p50']:7.2f} ms   p99 {result['p99']:7.2f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure recall@k and latency of the site_pages HNSW index against exact search.")
+    parser.add_argument("--dsn", default=get_env_var("DATABASE_URL"), help="Postgres connection string (default: DATABASE_URL)")
+    parser.add_argument("--rows", type=int, default=10000, help="Synthetic chunks to load")
+    parser.add_argument("--dim", type=int, default=1536, help="Embedding dimensions")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per configuration")
+    parser.add_argument("--clusters", type=int, default=50, help="Topics in the synthetic corpus")
+    parser.add_argument("--k", type=int, default=10, help="Results per query (match_count)")
+    parser.add_argument("--m", type=int, default=16, help="HNSW m")
+    parser.add_argument("--ef-construction", type=int, default=64, help="HNSW ef_construction")
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[10, 20, 40, 100, 200], help="ef_search values to compare")
+    parser.add_argument("--filter-fraction", type=float, default=0.05, help="Share of rows matching the metadata filter")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if not args.dsn:
+        sys.exit("Pass --dsn or set DATABASE_URL")
+    try:
+        import psycopg
+    except ImportError:
+        sys.exit("The benchmark needs psycopg: pip install psycopg[binary]")
+
+    print(f"Generating {args.rows} vectors of {args.dim} dimensions...")
+    corpus, queries = make_corpus(args.rows, args.queries, args.dim, args.clusters, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    filtered = rng.random(args.rows) < args.filter_fraction
+    metadata_filter = {"source": "filtered_docs"}
+
+    truth = exact_neighbours(corpus, queries, args.k)
+    filtered_truth = exact_neighbours(corpus, queries, args.k, filtered)
+    query_literals = [to_vector_literal(query) for query in queries]
+
+    with psycopg.connect(args.dsn, autocommit=True) as conn, conn.cursor() as cur:
+        cur.execute(f"""
+            create temporary table bench_site_pages (
+                id bigint primary key,
+                metadata jsonb not null,
+                embedding vector({args.dim})
+            )
+        """)
+        start = time.perf_counter()
+        with cur.copy("copy bench_site_pages (id, metadata, embedding) from stdin") as copy:
+            for i, vector in enumerate(corpus):
+                source = metadata_filter["source"] if filtered[i] else "pydantic_ai_docs"
+                copy.write_row((i, json.dumps({"source": source}), to_vector_literal(vector)))
+        cur.execute("create index on bench_site_pages using gin (metadata)")
+        cur.execute("analyze bench_site_pages")
+        print(f"Loaded in {time.perf_counter() - start:.1f}s")
+
+        # Exact search: a sequential scan before the vector index exists
+        print_result("exact (sequential scan)", run_queries(cur, query_literals, truth, args.k))
+        print_result("exact, filtered", run_queries(cur, query_literals, filtered_truth, args.k, metadata_filter))
+
+        start = time.perf_counter()
+        cur.execute("set maintenance_work_mem = '256MB'")
+        cur.execute(
+            f"create index on bench_site_pages using hnsw (embedding vector_cosine_ops) "
+            f"with (m = {args.m}, ef_construction = {args.ef_construction})"
+        )
+        print(f"\nHNSW m={args.m} ef_construction={args.ef_construction} built in {time.perf_counter() - start:.1f}s")
+
+        iterative = True
+        try:
+            cur.execute("set hnsw.iterative_scan = relaxed_order")
+        except psycopg.Error:
+            # pgvector before 0.8
+            iterative = False
+
+        for ef_search in args.ef_search:
+            cur.execute(f"set hnsw.ef_search = {max(ef_search, args.k)}")
+            print_result(f"hnsw ef_search={ef_search}", run_queries(cur, query_literals, truth, args.k))
+            label = f"hnsw ef_search={ef_search}, filtered{'' if iterative else ' (no iterative scan)'}"
+            print_result(label, run_queries(cur, query_literals, filtered_truth, args.k, metadata_filter))
+
+if __name__ == "__main__":
+    main()
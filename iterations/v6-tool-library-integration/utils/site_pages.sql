@@ -17,8 +17,11 @@ create table site_pages (
     unique(url, chunk_number)
 );
 
--- Create an index for better vector similarity search performance
-create index on site_pages using ivfflat (embedding vector_cosine_ops);
+-- Create an HNSW index for better vector similarity search performance.
+-- Unlike ivfflat, HNSW needs no training data, so it can be created on the empty table.
+-- See site_pages_hnsw.sql for tuning m, ef_construction and ef_search.
+create index idx_site_pages_embedding_hnsw on site_pages
+  using hnsw (embedding vector_cosine_ops) with (m = 16, ef_construction = 64);
 
 -- Create an index on metadata for faster filtering
 create index idx_site_pages_metadata on site_pages using gin (metadata);
@@ -27,7 +30,8 @@ create index idx_site_pages_metadata on site_pages using gin (metadata);
 create function match_site_pages (
   query_embedding vector(1536),
   match_count int default 10,
-  filter jsonb DEFAULT '{}'::jsonb
+  filter jsonb default '{}'::jsonb,
+  ef_search int default 40
 ) returns table (
   id bigint,
   url varchar,
@@ -42,20 +46,46 @@ language plpgsql
 as $$
 #variable_conflict use_column
 begin
+  -- Transaction-local settings for this query only. The candidate list must be at
+  -- least match_count long to return match_count rows.
+  perform set_config('hnsw.ef_search', greatest(ef_search, match_count)::text, true);
+  -- The index returns its nearest candidates before the filter is applied, so a
+  -- selective filter could leave fewer than match_count rows. Iterative scans
+  -- (pgvector 0.8+) fetch more candidates until enough rows pass the filter.
+  -- Older versions reserve the hnsw. prefix without defining the setting, so
+  -- setting it would raise "invalid configuration parameter": only set it when
+  -- it exists.
+  if current_setting('hnsw.iterative_scan', true) is not null then
+    perform set_config('hnsw.iterative_scan', 'relaxed_order', true);
+  end if;
+
   return query
   select
-    id,
-    url,
-    chunk_number,
-    title,
-    summary,
-    content,
-    metadata,
-    1 - (site_pages.embedding <=> query_embedding) as similarity
-  from site_pages
-  where metadata @> filter
-  order by site_pages.embedding <=> query_embedding
-  limit match_count;
+    m.id,
+    m.url,
+    m.chunk_number,
+    m.title,
+    m.summary,
+    m.content,
+    m.metadata,
+    1 - m.distance as similarity
+  from (
+    select
+      s.id,
+      s.url,
+      s.chunk_number,
+      s.title,
+      s.summary,
+      s.content,
+      s.metadata,
+      s.embedding <=> query_embedding as distance
+    from site_pages s
+    where filter = '{}'::jsonb or s.metadata @> filter
+    order by s.embedding <=> query_embedding
+    limit match_count
+  ) m
+  -- Iterative scans may return rows slightly out of order
+  order by m.distance;
 end;
 $$;
 
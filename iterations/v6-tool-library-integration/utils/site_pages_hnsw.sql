@@ -0,0 +1,94 @@
+-- Migrate the site_pages vector index from ivfflat to HNSW
+--
+-- site_pages.sql used to create an ivfflat index right after creating the table.
+-- ivfflat computes its list centroids from the rows present when the index is built,
+-- so an index built on an empty table has useless centroids and poor recall. HNSW
+-- needs no training data and stays accurate as chunks are added.
+--
+-- Build parameters (change them below before running, then rebuild to apply):
+--   m                number of links per node (default 16). Higher improves recall on
+--                    large or high-dimensional corpora, at the cost of build time and size.
+--   ef_construction  candidate list size while building (default 64, at least 2 * m).
+-- Query parameter:
+--   ef_search        candidate list size per query, an argument of match_site_pages
+--                    (default 40). Higher improves recall, lower is faster.
+-- Measure the trade-off for your data with: python utils/benchmark_site_pages_index.py
+--
+-- Requires pgvector 0.5 or newer for HNSW. With pgvector 0.8 or newer, filtered
+-- searches keep scanning the index until match_count rows pass the filter; older
+-- versions skip that setting.
+-- Run once on databases created with the old site_pages.sql. New databases get the
+-- same index and function from site_pages.sql.
+
+drop index if exists site_pages_embedding_idx;
+
+-- Building a large HNSW index is faster with more memory for the build
+set maintenance_work_mem = '256MB';
+
+create index if not exists idx_site_pages_embedding_hnsw on site_pages
+  using hnsw (embedding vector_cosine_ops) with (m = 16, ef_construction = 64);
+
+-- The function gained the ef_search argument, so drop the old signature
+drop function if exists match_site_pages(vector, int, jsonb);
+
+create or replace function match_site_pages (
+  query_embedding vector(1536),
+  match_count int default 10,
+  filter jsonb default '{}'::jsonb,
+  ef_search int default 40
+) returns table (
+  id bigint,
+  url varchar,
+  chunk_number integer,
+  title varchar,
+  summary varchar,
+  content text,
+  metadata jsonb,
+  similarity float
+)
+language plpgsql
+as $$
+#variable_conflict use_column
+begin
+  -- Transaction-local settings for this query only. The candidate list must be at
+  -- least match_count long to return match_count rows.
+  perform set_config('hnsw.ef_search', greatest(ef_search, match_count)::text, true);
+  -- The index returns its nearest candidates before the filter is applied, so a
+  -- selective filter could leave fewer than match_count rows. Iterative scans
+  -- (pgvector 0.8+) fetch more candidates until enough rows pass the filter.
+  -- Older versions reserve the hnsw. prefix without defining the setting, so
+  -- setting it would raise "invalid configuration parameter": only set it when
+  -- it exists.
+  if current_setting('hnsw.iterative_scan', true) is not null then
+    perform set_config('hnsw.iterative_scan', 'relaxed_order', true);
+  end if;
+
+  return query
+  select
+    m.id,
+    m.url,
+    m.chunk_number,
+    m.title,
+    m.summary,
+    m.content,
+    m.metadata,
+    1 - m.distance as similarity
+  from (
+    select
+      s.id,
+      s.url,
+      s.chunk_number,
+      s.title,
+      s.summary,
+      s.content,
+      s.metadata,
+      s.embedding <=> query_embedding as distance
+    from site_pages s
+    where filter = '{}'::jsonb or s.metadata @> filter
+    order by s.embedding <=> query_embedding
+    limit match_count
+  ) m
+  -- Iterative scans may return rows slightly out of order
+  order by m.distance;
+end;
+$$;
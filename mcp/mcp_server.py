@@ -1,44 +1,61 @@
-from mcp.server.fastmcp import FastMCP
-from datetime import datetime
+from mcp.server.fastmcp import FastMCP, Context
 from dotenv import load_dotenv
-from typing import Dict, List
-import threading
-import requests
+from typing import List, Optional
 import asyncio
+import httpx
+import json
 import uuid
 import sys
 import os
 
+from thread_registry import ThreadRegistry
+
+# The shared log formatting of utils/log_writer.py (copied next to this file in the container)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.log_writer import create_file_logger
+
 # Load environment variables from .env file
 load_dotenv()
 
 # Initialize FastMCP server with ERROR logging level
 mcp = FastMCP("archon", log_level="ERROR")
 
-# Store active threads
-active_threads: Dict[str, List[str]] = {}
-
 # FastAPI service URL
 GRAPH_SERVICE_URL = os.getenv("GRAPH_SERVICE_URL", "http://localhost:8100")
 
-def write_to_log(message: str):
+# Seconds to wait for the next streamed event from the graph service
+GRAPH_SERVICE_TIMEOUT = float(os.getenv("GRAPH_SERVICE_TIMEOUT", "300"))
+
+# Maximum number of agent runs forwarded to the graph service at the same time
+MAX_CONCURRENT_RUNS = int(os.getenv("MCP_MAX_CONCURRENT_RUNS", "8"))
+
+# Partial output is sent to the MCP client in batches of roughly this many characters
+PARTIAL_OUTPUT_CHARS = int(os.getenv("MCP_PARTIAL_OUTPUT_CHARS", "500"))
+
+_http_client: Optional[httpx.AsyncClient] = None
+_run_semaphore: Optional[asyncio.Semaphore] = None
+
+# Persistent registry of created threads (counters only), kept in the workbench directory
+thread_registry = ThreadRegistry(
+    os.getenv("MCP_THREAD_DB") or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "workbench", "mcp_threads.sqlite"),
+    ttl_seconds=float(os.getenv("MCP_THREAD_TTL_HOURS", "168")) * 3600,
+    max_threads=int(os.getenv("MCP_MAX_THREADS", "10000"))
+)
+
+# Writes workbench/logs.txt from a background thread, in the LOG_FORMAT of the main app
+file_logger = create_file_logger(
+    "archon.mcp",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "workbench", "logs.txt")
+)
+
+def write_to_log(message: str, **fields):
     """Write a message to the logs.txt file in the workbench directory.
     
     Args:
         message: The message to log
+        **fields: Optional structured fields (e.g. thread_id)
     """
-    # Get the directory one level up from the current file
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    parent_dir = os.path.dirname(current_dir)
-    workbench_dir = os.path.join(parent_dir, "workbench")
-    log_path = os.path.join(workbench_dir, "logs.txt")
-    os.makedirs(workbench_dir, exist_ok=True)
-
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_entry = f"[{timestamp}] {message}\n"
-
-    with open(log_path, "a", encoding="utf-8") as f:
-        f.write(log_entry)
+    file_logger.info(message, extra={"fields": fields})
 
 @mcp.tool()
 async def create_thread() -> str:
@@ -50,36 +67,102 @@ async def create_thread() -> str:
         str: A unique thread ID for the conversation
     """
     thread_id = str(uuid.uuid4())
-    active_threads[thread_id] = []
-    write_to_log(f"Created new thread: {thread_id}")
+    thread_registry.create(thread_id)
+    write_to_log(f"Created new thread: {thread_id}", thread_id=thread_id)
     return thread_id
 
 
-def _make_request(thread_id: str, user_input: str, config: dict) -> str:
-    """Make synchronous request to graph service"""
+def get_http_client() -> httpx.AsyncClient:
+    """Get the shared, connection-pooled HTTP client for the graph service."""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            base_url=GRAPH_SERVICE_URL,
+            # The read timeout applies between streamed events, not to the whole run
+            timeout=httpx.Timeout(GRAPH_SERVICE_TIMEOUT, connect=10),
+            limits=httpx.Limits(
+                max_connections=MAX_CONCURRENT_RUNS * 2,
+                max_keepalive_connections=MAX_CONCURRENT_RUNS
+            )
+        )
+    return _http_client
+
+def get_run_semaphore() -> asyncio.Semaphore:
+    """Get the semaphore limiting how many agent runs are in flight at once."""
+    global _run_semaphore
+    if _run_semaphore is None:
+        _run_semaphore = asyncio.Semaphore(MAX_CONCURRENT_RUNS)
+    return _run_semaphore
+
+async def _thread_has_checkpoint(thread_id: str) -> bool:
+    """Ask the graph service whether it has saved state for the thread."""
     try:
-        response = requests.post(
-            f"{GRAPH_SERVICE_URL}/invoke",
+        response = await get_http_client().get(f"/threads/{thread_id}")
+        response.raise_for_status()
+        return bool(response.json().get("exists"))
+    except httpx.HTTPError as e:
+        write_to_log(f"Checkpoint lookup failed for thread {thread_id}: {str(e)}", thread_id=thread_id)
+        return False
+
+async def _stream_request(thread_id: str, user_input: str, is_first_message: bool, config: dict, ctx: Optional[Context] = None) -> str:
+    """Stream a run from the graph service and return the complete response.
+
+    Progress (the graph node being run) and partial output are forwarded to the MCP
+    client while the run is in progress. If the MCP request is cancelled, leaving the
+    stream closes the connection, which also stops the run in the graph service.
+    """
+    chunks: List[str] = []
+    pending_output: List[str] = []
+    completed_nodes = 0
+
+    async def flush_output():
+        if ctx is not None and pending_output:
+            await ctx.info("".join(pending_output))
+        pending_output.clear()
+
+    try:
+        async with get_http_client().stream(
+            "POST",
+            "/invoke/stream",
             json={
                 "message": user_input,
                 "thread_id": thread_id,
-                "is_first_message": not active_threads[thread_id],
+                "is_first_message": is_first_message,
                 "config": config
-            },
-            timeout=300  # 5 minute timeout for long-running operations
-        )
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.Timeout:
-        write_to_log(f"Request timed out for thread {thread_id}")
+            }
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+
+                if event["event"] == "chunk":
+                    chunks.append(str(event["data"]))
+                    pending_output.append(str(event["data"]))
+                    if sum(len(chunk) for chunk in pending_output) >= PARTIAL_OUTPUT_CHARS:
+                        await flush_output()
+                elif event["event"] == "node_start" and ctx is not None:
+                    await ctx.report_progress(completed_nodes)
+                    await ctx.info(f"Running {event['node']}")
+                elif event["event"] == "node_end":
+                    completed_nodes += 1
+                    await flush_output()
+                elif event["event"] == "error":
+                    raise RuntimeError(f"Graph service error: {event['detail']}")
+
+        await flush_output()
+        return "".join(chunks)
+    except httpx.TimeoutException:
+        write_to_log(f"Request timed out for thread {thread_id}", thread_id=thread_id)
         raise TimeoutError("Request to graph service timed out. The operation took longer than expected.")
-    except requests.exceptions.RequestException as e:
-        write_to_log(f"Request failed for thread {thread_id}: {str(e)}")
+    except httpx.HTTPError as e:
+        write_to_log(f"Request failed for thread {thread_id}: {str(e)}", thread_id=thread_id)
         raise
 
 
 @mcp.tool()
-async def run_agent(thread_id: str, user_input: str) -> str:
+async def run_agent(thread_id: str, user_input: str, ctx: Context) -> str:
     """Run the Archon agent with user input.
     Only use this tool after you have called create_thread in this conversation to get a unique thread ID.
     If you already created a thread ID in this conversation, do not create another one. Reuse the same ID.
@@ -97,11 +180,17 @@ async def run_agent(thread_id: str, user_input: str) -> str:
     Returns:
         str: The agent's response which generally includes the code for the agent
     """
-    if thread_id not in active_threads:
-        write_to_log(f"Error: Thread not found - {thread_id}")
-        raise ValueError("Thread not found")
-
-    write_to_log(f"Processing message for thread {thread_id}: {user_input}")
+    message_count = thread_registry.get_message_count(thread_id)
+    if message_count is None:
+        # Unknown here (e.g. a fresh MCP container), but the graph may already have run for it
+        if not await _thread_has_checkpoint(thread_id):
+            write_to_log(f"Error: Thread not found - {thread_id}", thread_id=thread_id)
+            raise ValueError("Thread not found")
+        write_to_log(f"Restored thread from graph service checkpoint: {thread_id}", thread_id=thread_id)
+        thread_registry.create(thread_id, message_count=1)
+        message_count = 1
+
+    write_to_log(f"Processing message {message_count + 1} for thread {thread_id}: {user_input}", thread_id=thread_id)
 
     config = {
         "configurable": {
@@ -109,13 +198,10 @@ async def run_agent(thread_id: str, user_input: str) -> str:
         }
     }
     
-    try:
-        result = await asyncio.to_thread(_make_request, thread_id, user_input, config)
-        active_threads[thread_id].append(user_input)
-        return result['response']
-        
-    except Exception as e:
-        raise
+    async with get_run_semaphore():
+        response = await _stream_request(thread_id, user_input, message_count == 0, config, ctx)
+    thread_registry.record_message(thread_id)
+    return response
 
 
 if __name__ == "__main__":
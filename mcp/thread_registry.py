@@ -0,0 +1,100 @@
+from typing import Optional
+import threading
+import sqlite3
+import time
+import os
+
+class ThreadRegistry:
+    """Persistent, bounded registry of the conversation threads created through MCP.
+
+    Only counters are stored per thread (never the user messages), in a small SQLite
+    database, so threads survive an MCP server restart and memory use stays flat.
+    Threads unused for longer than ttl_seconds are evicted, and only the max_threads
+    most recently used threads are kept.
+
+    Args:
+        db_path: Path of the SQLite database file
+        ttl_seconds: Time after its last use at which a thread is evicted
+        max_threads: Maximum number of threads to keep
+    """
+
+    def __init__(self, db_path: str, ttl_seconds: float = 7 * 24 * 3600, max_threads: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_threads = max_threads
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS threads (
+                thread_id TEXT PRIMARY KEY,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL,
+                message_count INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_threads_last_used_at ON threads (last_used_at)")
+        self._conn.commit()
+
+    def _evict(self, now: float):
+        # Runs before an insert, so leave room for one more thread
+        self._conn.execute("DELETE FROM threads WHERE last_used_at < ?", (now - self.ttl_seconds,))
+        self._conn.execute(
+            """
+            DELETE FROM threads WHERE thread_id IN (
+                SELECT thread_id FROM threads ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (max(self.max_threads - 1, 0),)
+        )
+
+    def create(self, thread_id: str, message_count: int = 0):
+        """Register a thread, evicting expired threads first.
+
+        Args:
+            thread_id: The conversation thread ID
+            message_count: Number of messages already processed for the thread
+        """
+        now = time.time()
+        with self._lock:
+            self._evict(now)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO threads (thread_id, created_at, last_used_at, message_count) VALUES (?, ?, ?, ?)",
+                (thread_id, now, now, message_count)
+            )
+            self._conn.commit()
+
+    def get_message_count(self, thread_id: str) -> Optional[int]:
+        """Get the number of messages processed for a thread.
+
+        Args:
+            thread_id: The conversation thread ID
+
+        Returns:
+            The message count, or None if the thread is unknown or has expired
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT message_count, last_used_at FROM threads WHERE thread_id = ?",
+                (thread_id,)
+            ).fetchone()
+        if row is None or row[1] < time.time() - self.ttl_seconds:
+            return None
+        return row[0]
+
+    def record_message(self, thread_id: str):
+        """Count a successfully processed message and refresh the thread's TTL."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE threads SET message_count = message_count + 1, last_used_at = ? WHERE thread_id = ?",
+                (time.time(), thread_id)
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
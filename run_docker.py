@@ -64,8 +64,8 @@ def main():
     
     # Build the MCP container
     print("\n=== Building Archon MCP container ===")
-    mcp_dir = base_dir / "mcp"
-    if run_command(["docker", "build", "-t", "archon-mcp:latest", "."], cwd=mcp_dir) != 0:
+    # From the repository root, the MCP container also needs utils/log_writer.py
+    if run_command(["docker", "build", "-t", "archon-mcp:latest", "-f", "mcp/Dockerfile", "."], cwd=base_dir) != 0:
         print("Error building MCP container")
         return 1
     
@@ -8,7 +8,7 @@ import sys
 import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from utils.utils import reload_archon_graph
+from utils.streamlit_utils import reload_archon_graph
 
 def agent_service_tab():
     """Display the agent service interface for managing the Natenex graph service (for MCP)"""
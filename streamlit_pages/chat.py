@@ -75,13 +75,22 @@ async def chat_tab():
         response_content = ""
         with st.chat_message("assistant"):
             message_placeholder = st.empty()  # Placeholder for updating the message
+            progress_placeholder = st.empty()  # Nodes of the workflow as they are generated
+            workflow_nodes = []
             
             # Add a spinner while loading
             with st.spinner("Natenex is generating the workflow..."):
                 # Run the async generator to fetch responses
                 async for chunk in run_agent_with_streaming(user_input):
                     # Handle different chunk types (dictionary for JSON, string for text)
-                    if isinstance(chunk, dict):
+                    if isinstance(chunk, dict) and "event" in chunk:
+                        # Workflow nodes and errors parsed while the coder streams
+                        if chunk["event"] == "workflow_node":
+                            workflow_nodes.append(f"`{chunk['node'].get('name')}` ({chunk['node'].get('type')})")
+                            progress_placeholder.caption(f"Nodes generated: {', '.join(workflow_nodes)}")
+                        elif chunk["event"] == "workflow_error" and chunk["error"].get("severity") == "error":
+                            st.warning(f"{chunk['error']['code']}: {chunk['error']['message']}")
+                    elif isinstance(chunk, dict):
                         # Pretty print the JSON adding it to the stream
                         current_json_str = json.dumps(chunk, indent=2)
                         response_content = f"```json\n{current_json_str}\n```" # Format as JSON block
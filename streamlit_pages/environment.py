@@ -4,10 +4,11 @@ import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.utils import (
-    get_env_var, save_env_var, reload_archon_graph, 
+    get_env_var, save_env_var,
     get_current_profile, set_current_profile, get_all_profiles,
     create_profile, delete_profile, get_profile_env_vars
 )
+from utils.streamlit_utils import reload_archon_graph
 
 def environment_tab():    
     # Get all available profiles and current profile
@@ -355,7 +356,40 @@ def environment_tab():
         # Only update if user entered something (to avoid overwriting with empty string)
         if supabase_key:
             updated_values["SUPABASE_SERVICE_KEY"] = supabase_key
-        
+
+        # CHECKPOINTER
+        checkpointer_help = "Where conversation checkpoints are stored:\n\n" + \
+                            "memory: in-process, lost when the service restarts\n\n" + \
+                            "sqlite: a local file in the workbench directory\n\n" + \
+                            "postgres: the Supabase database (SUPABASE_DB_URL), shared by every service worker"
+        checkpointers = ["memory", "sqlite", "postgres"]
+        current_checkpointer = profile_env_vars.get("CHECKPOINTER", "memory")
+
+        checkpointer = st.selectbox(
+            "CHECKPOINTER:",
+            options=checkpointers,
+            index=checkpointers.index(current_checkpointer) if current_checkpointer in checkpointers else 0,
+            help=checkpointer_help,
+            key="input_CHECKPOINTER"
+        )
+        updated_values["CHECKPOINTER"] = checkpointer
+
+        # SUPABASE_DB_URL
+        supabase_db_url_help = "Postgres connection string used by the postgres checkpointer. Get it from the Database section of your Supabase project settings -\nhttps://supabase.com/dashboard/project/<your project ID>/settings/database"
+
+        # If there's already a value, show asterisks in the placeholder
+        placeholder = "Set but hidden" if profile_env_vars.get("SUPABASE_DB_URL", "") else ""
+        supabase_db_url = st.text_input(
+            "SUPABASE_DB_URL:",
+            type="password",
+            help=supabase_db_url_help,
+            key="input_SUPABASE_DB_URL",
+            placeholder=placeholder
+        )
+        # Only update if user entered something (to avoid overwriting with empty string)
+        if supabase_db_url:
+            updated_values["SUPABASE_DB_URL"] = supabase_db_url
+
         # Submit button
         submitted = st.form_submit_button("Save Environment Variables")
         
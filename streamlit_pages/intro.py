@@ -4,7 +4,7 @@ import os
 
 # Add the parent directory to sys.path to allow importing from the parent directory
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-# from utils.utils import create_new_tab_button # Not used here anymore
+# from utils.streamlit_utils import create_new_tab_button # Not used here anymore
 
 def intro_tab():
     """Display the introduction and setup guide for Natenex"""    
@@ -0,0 +1,101 @@
+import json
+import sys
+import os
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from archon.utils.workflow_patch import (
+    PatchError, apply_patch, apply_refinement, apply_workflow_patch, from_compact, make_patch, parse_refinement, to_compact
+)
+
+WORKFLOW = {
+    "id": "wf1",
+    "meta": {"instanceId": "abc"},
+    "name": "Signup",
+    "nodes": [
+        {"id": "1", "name": "Webhook", "webhookId": "hook", "type": "n8n-nodes-base.webhook", "typeVersion": 2, "position": [0, 0], "parameters": {"path": "signup"}},
+        {"id": "2", "name": "Send Email", "type": "n8n-nodes-base.emailSend", "typeVersion": 2, "position": [220, 0], "parameters": {"subject": "Welcome"}}
+    ],
+    "connections": {"Webhook": {"main": [[{"node": "Send Email", "type": "main", "index": 0}]]}}
+}
+
+def test_to_compact_drops_generated_fields():
+    compact = to_compact(WORKFLOW)
+    assert list(compact["nodes"]) == ["Webhook", "Send Email"]
+    assert compact["nodes"]["Webhook"] == {"type": "n8n-nodes-base.webhook", "typeVersion": 2, "parameters": {"path": "signup"}}
+    assert "id" not in compact and "meta" not in compact
+    assert compact["name"] == "Signup"
+
+def test_apply_patch_is_atomic():
+    document = {"a": 1, "b": [1, 2]}
+    with pytest.raises(PatchError):
+        apply_patch(document, [{"op": "replace", "path": "/a", "value": 2}, {"op": "remove", "path": "/missing"}])
+    assert document == {"a": 1, "b": [1, 2]}
+    assert apply_patch(document, [{"op": "add", "path": "/b/-", "value": 3}, {"op": "test", "path": "/a", "value": 1}]) == {"a": 1, "b": [1, 2, 3]}
+
+def test_apply_patch_rejects_move_into_itself():
+    with pytest.raises(PatchError):
+        apply_patch({"a": {"b": {}}}, [{"op": "move", "from": "/a", "path": "/a/b/c"}])
+
+def test_apply_workflow_patch_renames_connections():
+    compact = apply_workflow_patch(to_compact(WORKFLOW), [{"op": "move", "from": "/nodes/Send Email", "path": "/nodes/Welcome Email"}])
+    assert "Welcome Email" in compact["nodes"] and "Send Email" not in compact["nodes"]
+    assert compact["connections"]["Webhook"]["main"][0][0]["node"] == "Welcome Email"
+
+def test_from_compact_restores_generated_fields():
+    patch = [
+        {"op": "move", "from": "/nodes/Send Email", "path": "/nodes/Welcome Email"},
+        {"op": "add", "path": "/nodes/Slack", "value": {"type": "n8n-nodes-base.slack", "typeVersion": 2, "parameters": {}}},
+        {"op": "add", "path": "/connections/Welcome Email", "value": {"main": [[{"node": "Slack", "type": "main", "index": 0}]]}}
+    ]
+    compact = apply_workflow_patch(to_compact(WORKFLOW), patch)
+    workflow = from_compact(compact, WORKFLOW, {"Send Email": "Welcome Email"})
+    nodes = {node["name"]: node for node in workflow["nodes"]}
+    assert workflow["id"] == "wf1" and workflow["meta"] == {"instanceId": "abc"}
+    assert nodes["Webhook"]["id"] == "1" and nodes["Webhook"]["webhookId"] == "hook" and nodes["Webhook"]["position"] == [0, 0]
+    # The renamed node keeps its id and position
+    assert nodes["Welcome Email"]["id"] == "2" and nodes["Welcome Email"]["position"] == [220, 0]
+    # A new node gets a fresh id, right of the node feeding it
+    assert nodes["Slack"]["id"] not in ("1", "2")
+    assert nodes["Slack"]["position"] == [440, 0]
+
+def test_make_patch_round_trip():
+    old = to_compact(WORKFLOW)
+    new = json.loads(json.dumps(old))
+    new["nodes"]["Send Email"]["parameters"]["subject"] = "Hi"
+    new["nodes"]["Webhook"]["parameters"]["httpMethod"] = "POST"
+    del new["name"]
+    patch = make_patch(old, new)
+    assert apply_patch(old, patch) == new
+    assert make_patch(old, old) == []
+
+def test_parse_refinement_finds_the_patch_after_prose():
+    compact = to_compact(WORKFLOW)
+    patch = [{"op": "replace", "path": "/nodes/Send Email/parameters/subject", "value": "Hi"}]
+    assert parse_refinement(json.dumps(patch), compact) == patch
+    assert parse_refinement("Here you go:\n```json\n" + json.dumps(patch) + "\n```", compact) == patch
+    assert parse_refinement("See [1] for details.\n" + json.dumps(patch) + "\nDone.", compact) == patch
+    with pytest.raises(PatchError):
+        parse_refinement("Nothing to change.", compact)
+
+def test_parse_refinement_diffs_a_whole_workflow():
+    compact = to_compact(WORKFLOW)
+    changed = json.loads(json.dumps(WORKFLOW))
+    changed["nodes"][1]["parameters"]["subject"] = "Hi"
+    assert parse_refinement(json.dumps(changed), compact) == [
+        {"op": "replace", "path": "/nodes/Send Email/parameters/subject", "value": "Hi"}
+    ]
+
+def test_apply_refinement_applies_refiners_in_sequence():
+    answers = [
+        json.dumps([{"op": "move", "from": "/nodes/Send Email", "path": "/nodes/Welcome Email"}]),
+        "```json\n" + json.dumps([{"op": "replace", "path": "/nodes/Webhook/parameters/path", "value": "join"}]) + "\n```",
+        ""
+    ]
+    workflow = apply_refinement(WORKFLOW, answers)
+    nodes = {node["name"]: node for node in workflow["nodes"]}
+    assert nodes["Webhook"]["parameters"]["path"] == "join"
+    assert nodes["Welcome Email"]["id"] == "2"
+    assert workflow["connections"]["Webhook"]["main"][0][0]["node"] == "Welcome Email"
+    assert WORKFLOW["nodes"][0]["parameters"]["path"] == "signup"
@@ -0,0 +1,67 @@
+import json
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from archon.utils.workflow_stream import WorkflowStreamParser
+
+WORKFLOW = {
+    "nodes": [
+        {"id": "1", "name": "Webhook", "type": "n8n-nodes-base.webhook", "typeVersion": 2, "position": [0, 0], "parameters": {}},
+        {"id": "2", "name": "Set", "type": "n8n-nodes-base.set", "typeVersion": 3, "position": [220, 0], "parameters": {"value": "={{ $json.x }}"}}
+    ],
+    "connections": {"Webhook": {"main": [[{"node": "Set", "type": "main", "index": 0}]]}}
+}
+
+def stream(text: str, chunk_size: int = 7) -> WorkflowStreamParser:
+    parser = WorkflowStreamParser()
+    for i in range(0, len(text), chunk_size):
+        parser.feed(text[i:i + chunk_size])
+    parser.close()
+    return parser
+
+def assert_parsed(parser: WorkflowStreamParser):
+    assert not parser.errors
+    assert not parser.broken
+    assert parser.complete
+    assert [node["name"] for node in parser.nodes] == ["Webhook", "Set"]
+    assert parser.connections == WORKFLOW["connections"]
+
+def test_raw_workflow():
+    assert_parsed(stream(json.dumps(WORKFLOW, indent=2)))
+
+def test_fenced_workflow():
+    assert_parsed(stream("```json\n" + json.dumps(WORKFLOW) + "\n```"))
+
+def test_prose_with_braces_before_workflow():
+    text = (
+        "The Set node reads the field with {{ $json.x }}, so map it first.\n"
+        "{{ $json.x }} is an n8n expression.\n\n"
+        "```json\n" + json.dumps(WORKFLOW, indent=2) + "\n```"
+    )
+    assert_parsed(stream(text))
+
+def test_expression_object_before_workflow():
+    text = (
+        "The body maps the field:\n"
+        "{ \"email\": {{ $json.email }} }\n\n"
+        "```json\n" + json.dumps(WORKFLOW, indent=2) + "\n```"
+    )
+    assert_parsed(stream(text))
+
+def test_example_object_before_workflow():
+    text = 'The webhook receives\n{"name": "Ada"}\nand the workflow is\n' + json.dumps(WORKFLOW)
+    assert_parsed(stream(text))
+
+def test_missing_parameters_is_not_fatal():
+    workflow = json.loads(json.dumps(WORKFLOW))
+    del workflow["nodes"][0]["parameters"]
+    parser = stream(json.dumps(workflow))
+    assert not parser.broken
+    assert parser.complete
+    assert [error.code for error in parser.errors] == ["missing_field"]
+
+def test_invalid_json_is_fatal():
+    parser = stream('{"nodes": [{"name": "Webhook", ]}')
+    assert parser.broken
+    assert parser.errors[0].code == "invalid_json"
@@ -0,0 +1,115 @@
+import json
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from archon.utils.workflow_validator import parse_workflow, validate_workflow
+
+WORKFLOW = {"nodes": [], "connections": {}}
+
+def test_prose_is_not_a_workflow():
+    assert parse_workflow("Reference the field as {{ $json.email }} in the Send Email node.") == (None, None)
+    assert parse_workflow('Send {"name": "Ada"} as the request body.') == (None, None)
+
+def test_workflow_after_prose_with_braces():
+    text = "It reads {{ $json.email }}:\n```json\n" + json.dumps(WORKFLOW, indent=2) + "\n```"
+    assert parse_workflow(text) == (WORKFLOW, None)
+
+def test_workflow_after_example_object():
+    text = 'Example:\n{"name": "Ada"}\nWorkflow:\n' + json.dumps(WORKFLOW) + "\nDone."
+    assert parse_workflow(text) == (WORKFLOW, None)
+
+def test_broken_workflow_is_invalid_json():
+    workflow, error = parse_workflow('{"nodes": [}')
+    assert workflow is None
+    assert error.code == "invalid_json"
+
+# Schema projections as n8n_schema.project_node_schema builds them
+SPECS = {
+    "n8n-nodes-base.webhook": {"name": "n8n-nodes-base.webhook", "typeVersions": [1, 2], "outputs": {"main": 1}, "parameters": []},
+    "n8n-nodes-base.if": {"name": "n8n-nodes-base.if", "typeVersions": [2], "outputs": {"main": 2}, "parameters": []},
+    "n8n-nodes-base.gmail": {
+        "name": "n8n-nodes-base.gmail",
+        "typeVersions": [2],
+        "outputs": {"main": 1},
+        "parameters": [
+            {"name": "resource", "type": "options", "default": "message"},
+            {"name": "operation", "type": "options", "default": "send"},
+            {"name": "sendTo", "type": "string", "required": True, "show": {"resource": ["message"], "operation": ["send"]}},
+            {"name": "labelName", "type": "string", "required": True, "show": {"resource": ["label"]}}
+        ],
+        "credentials": [{"name": "gmailOAuth2", "required": True}]
+    }
+}
+
+def node(name, node_type="n8n-nodes-base.webhook", type_version=2, parameters=None, **fields):
+    return {
+        "id": fields.pop("id", name), "name": name, "type": node_type, "typeVersion": type_version,
+        "position": [0, 0], "parameters": {} if parameters is None else parameters, **fields
+    }
+
+def target(name, index=0):
+    return {"node": name, "type": "main", "index": index}
+
+def codes(workflow):
+    return [error.code for error in validate_workflow(workflow, SPECS) if error.severity == "error"]
+
+def test_valid_workflow():
+    workflow = {
+        "nodes": [
+            node("Webhook"),
+            node("If", "n8n-nodes-base.if", 2),
+            node("Gmail", "n8n-nodes-base.gmail", 2, {"sendTo": "ada@example.com"}, credentials={"gmailOAuth2": {"id": "1", "name": "Gmail"}})
+        ],
+        "connections": {"Webhook": {"main": [[target("If")]]}, "If": {"main": [[target("Gmail")], []]}}
+    }
+    assert validate_workflow(workflow, SPECS) == []
+
+def test_duplicate_name_and_id():
+    assert codes({"nodes": [node("A", id="1"), node("B", id="2")], "connections": {}}) == []
+    assert codes({"nodes": [node("A", id="1"), node("A", id="2")], "connections": {}}) == ["duplicate_name"]
+    assert codes({"nodes": [node("A", id="1"), node("B", id="1")], "connections": {}}) == ["duplicate_id"]
+
+def test_connection_source_and_target():
+    nodes = [node("A"), node("B")]
+    assert codes({"nodes": nodes, "connections": {"A": {"main": [[target("B")]]}}}) == []
+    assert codes({"nodes": nodes, "connections": {"C": {"main": [[target("B")]]}}}) == ["unknown_connection_source"]
+    assert codes({"nodes": nodes, "connections": {"A": {"main": [[target("C")]]}}}) == ["unknown_connection_target"]
+
+def test_output_type_and_index():
+    nodes = [node("If", "n8n-nodes-base.if", 2), node("A"), node("B")]
+    assert codes({"nodes": nodes, "connections": {"If": {"main": [[target("A")], [target("B")]]}}}) == []
+    assert codes({"nodes": nodes, "connections": {"If": {"ai_tool": [[target("A")]]}}}) == ["invalid_output_type"]
+    assert codes({"nodes": nodes, "connections": {"If": {"main": [[], [], [target("A")]]}}}) == ["invalid_output_index"]
+
+def test_type_version():
+    assert codes({"nodes": [node("A", type_version=1)], "connections": {}}) == []
+    assert codes({"nodes": [node("A", type_version=3)], "connections": {}}) == ["invalid_type_version"]
+    assert codes({"nodes": [node("A", type_version="2")], "connections": {}}) == ["invalid_type_version"]
+
+def test_unknown_node_type():
+    assert codes({"nodes": [node("A", "n8n-nodes-base.nothing")], "connections": {}}) == ["unknown_node_type"]
+    # A type the catalog lookup could not resolve is only a warning
+    errors = validate_workflow({"nodes": [node("A", "n8n-nodes-base.nothing")], "connections": {}}, SPECS, ["n8n-nodes-base.nothing"])
+    assert [(error.code, error.severity) for error in errors] == [("unknown_node_type", "warning")]
+    # Without node specs, types are not checked
+    assert validate_workflow({"nodes": [node("A", "n8n-nodes-base.nothing")], "connections": {}}) == []
+
+def test_required_parameters_follow_display_conditions():
+    gmail = lambda parameters: {"nodes": [node("Gmail", "n8n-nodes-base.gmail", 2, parameters)], "connections": {}}
+    # sendTo is shown for the default resource and operation
+    assert codes(gmail({"sendTo": "ada@example.com"})) == []
+    assert codes(gmail({})) == ["missing_parameter"]
+    # labelName only for resource "label", sendTo no longer applies
+    assert codes(gmail({"resource": "label", "labelName": "Inbox"})) == []
+    assert codes(gmail({"resource": "label"})) == ["missing_parameter"]
+    # An expression cannot be evaluated statically, so nothing is reported
+    assert codes(gmail({"resource": "={{ $json.resource }}"})) == []
+
+def test_credentials():
+    gmail = lambda **fields: {"nodes": [node("Gmail", "n8n-nodes-base.gmail", 2, {"sendTo": "a@b.c"}, **fields)], "connections": {}}
+    assert codes(gmail(credentials={"gmailOAuth2": {"id": "1", "name": "Gmail"}})) == []
+    assert codes(gmail(credentials={"slackApi": {"id": "1", "name": "Slack"}})) == ["unknown_credential_type"]
+    # A required credential that is not selected yet is only a warning
+    errors = validate_workflow(gmail(), SPECS)
+    assert [(error.code, error.severity) for error in errors] == [("missing_credential", "warning")]
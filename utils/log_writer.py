@@ -0,0 +1,89 @@
+"""Logging to workbench/logs.txt without file I/O on the calling thread.
+
+create_file_logger puts records on a queue (QueueHandler), and a QueueListener
+thread writes them to a size-rotated file (RotatingFileHandler). LogFormatter writes
+plain text or one JSON object per line, with the structured fields passed as
+extra={"fields": {...}}. Used by utils.utils.write_to_log and the MCP server.
+
+Configured from the process environment, so it is usable before env_vars.json is read:
+
+    LOG_FORMAT             text (default) or json
+    LOG_MAX_BYTES          size at which the file is rotated (0 disables rotation)
+    LOG_BACKUP_COUNT       number of rotated files to keep
+    LOG_MAX_MESSAGE_CHARS  messages and string fields longer than this are truncated
+"""
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from datetime import datetime
+from typing import Any
+import logging
+import atexit
+import queue
+import json
+import os
+
+class LogFormatter(logging.Formatter):
+    """Format records as "[timestamp] message key=value ..." or as JSON lines.
+
+    Args:
+        json_lines: Write one JSON object per line instead of plain text
+        max_message_chars: Messages and string fields longer than this are truncated
+    """
+
+    def __init__(self, json_lines: bool = False, max_message_chars: int = 4000):
+        super().__init__()
+        self.json_lines = json_lines
+        self.max_message_chars = max_message_chars
+
+    def _truncate(self, value: Any) -> Any:
+        if isinstance(value, str) and len(value) > self.max_message_chars:
+            omitted = len(value) - self.max_message_chars
+            return f"{value[:self.max_message_chars]}... [truncated {omitted} chars]"
+        return value
+
+    def format(self, record: logging.LogRecord) -> str:
+        timestamp = datetime.fromtimestamp(record.created)
+        message = self._truncate(record.getMessage())
+        fields = {key: self._truncate(value) for key, value in (getattr(record, "fields", None) or {}).items()}
+        if self.json_lines:
+            return json.dumps({"timestamp": timestamp.isoformat(timespec="milliseconds"), "message": message, **fields}, default=str)
+
+        extras = "".join(f" {key}={value}" for key, value in fields.items())
+        return f"[{timestamp.strftime('%Y-%m-%d %H:%M:%S')}] {message}{extras}"
+
+def create_file_logger(name: str, path: str) -> logging.Logger:
+    """Create a logger writing to path from a background thread.
+
+    Args:
+        name: Name of the logger, it does not propagate to the root logger
+        path: Path of the log file
+
+    Returns:
+        The logger, log structured fields with logger.info(message, extra={"fields": {...}})
+    """
+    logger = logging.getLogger(name)
+    if logger.handlers:
+        return logger
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    file_handler = RotatingFileHandler(
+        path,
+        maxBytes=int(os.environ.get("LOG_MAX_BYTES", 5 * 1024 * 1024)),
+        backupCount=int(os.environ.get("LOG_BACKUP_COUNT", 3)),
+        encoding="utf-8",
+        delay=True
+    )
+    file_handler.setFormatter(LogFormatter(
+        json_lines=os.environ.get("LOG_FORMAT", "text").lower() == "json",
+        max_message_chars=int(os.environ.get("LOG_MAX_MESSAGE_CHARS", 4000))
+    ))
+
+    log_queue = queue.Queue(-1)
+    listener = QueueListener(log_queue, file_handler)
+    listener.start()
+    # Write the remaining records on exit
+    atexit.register(listener.stop)
+
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    logger.addHandler(QueueHandler(log_queue))
+    return logger
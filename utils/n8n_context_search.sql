@@ -0,0 +1,74 @@
+-- Search function used by archon/utils/supabase_retriever.py::retrieve_n8n_context
+--
+-- Searches the four n8n_* node and credential tables in a single round trip,
+-- ranks the matches and returns only the columns the agents use: the compact
+-- schema_projection, and the full json_data only when include_json_data is set
+-- (or when the row has no projection yet).
+-- Run this once in the Supabase SQL editor, after n8n_tables.sql, n8n_schema_projection.sql
+-- and n8n_search_indexes.sql.
+-- It is used when N8N_RETRIEVAL_MODE is "name", or when rank_n8n_context is not installed.
+-- Without it, the retriever falls back to one query per table.
+
+-- The result columns changed when schema_projection was added, so replace the old version
+drop function if exists search_n8n_context(text[], int);
+
+create or replace function search_n8n_context (
+  keywords text[],
+  match_count int default 10,
+  include_json_data boolean default false
+) returns table (
+  source_table text,
+  id bigint,
+  name text,
+  tools text,
+  ts_content text,
+  schema_projection jsonb,
+  json_data jsonb,
+  score real
+)
+language sql stable
+as $$
+  with patterns as (
+    select distinct lower(trim(k)) as kw
+    from unnest(keywords) as k
+    where trim(k) <> ''
+  ),
+  candidates as (
+    select 'n8n_internal_nodes'::text as source_table, t.id, t.name::text, t.tools::text, t.ts_content::text, t.schema_projection, case when include_json_data or t.schema_projection is null then t.json_data::jsonb end as json_data
+    from n8n_internal_nodes t
+    where t.name ilike any (select '%' || kw || '%' from patterns)
+    union all
+    select 'n8n_external_nodes'::text, t.id, t.name::text, t.tools::text, t.ts_content::text, t.schema_projection, case when include_json_data or t.schema_projection is null then t.json_data::jsonb end
+    from n8n_external_nodes t
+    where t.name ilike any (select '%' || kw || '%' from patterns)
+    union all
+    select 'n8n_internal_credentials'::text, t.id, t.name::text, null::text, t.ts_content::text, t.schema_projection, case when include_json_data or t.schema_projection is null then t.json_data::jsonb end
+    from n8n_internal_credentials t
+    where t.name ilike any (select '%' || kw || '%' from patterns)
+    union all
+    select 'n8n_external_credentials'::text, t.id, t.name::text, null::text, t.ts_content::text, t.schema_projection, case when include_json_data or t.schema_projection is null then t.json_data::jsonb end
+    from n8n_external_credentials t
+    where t.name ilike any (select '%' || kw || '%' from patterns)
+  )
+  select
+    c.source_table,
+    c.id,
+    c.name,
+    c.tools,
+    c.ts_content,
+    c.schema_projection,
+    c.json_data,
+    -- Exact name matches rank above prefix matches, which rank above substring matches
+    (
+      select sum(case
+        when lower(c.name) = p.kw then 3
+        when lower(c.name) like p.kw || '%' then 2
+        else 1
+      end)
+      from patterns p
+      where lower(c.name) like '%' || p.kw || '%'
+    )::real as score
+  from candidates c
+  order by score desc, length(c.name), c.name
+  limit match_count;
+$$;
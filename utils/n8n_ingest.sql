@@ -0,0 +1,10 @@
+-- Change detection for the n8n catalog ingestion command (archon/utils/n8n_ingest.py)
+--
+-- content_hash is a SHA-256 of each row's node description and source. The ingestion
+-- command compares it with the hash of the input and only upserts rows that changed.
+-- Upserts match rows by name, which n8n_tables.sql declares unique.
+
+alter table n8n_internal_nodes add column if not exists content_hash text;
+alter table n8n_external_nodes add column if not exists content_hash text;
+alter table n8n_internal_credentials add column if not exists content_hash text;
+alter table n8n_external_credentials add column if not exists content_hash text;
@@ -0,0 +1,11 @@
+-- Compact schema projection of each n8n node and credential
+--
+-- schema_projection holds only what the agents need from json_data: parameter names,
+-- types, options, resource/operation conditions and credential types, per typeVersion.
+-- It is computed in Python at ingestion time (archon/utils/n8n_schema.py). For rows
+-- loaded before this column existed, run: python archon/utils/n8n_schema.py
+
+alter table n8n_internal_nodes add column if not exists schema_projection jsonb;
+alter table n8n_external_nodes add column if not exists schema_projection jsonb;
+alter table n8n_internal_credentials add column if not exists schema_projection jsonb;
+alter table n8n_external_credentials add column if not exists schema_projection jsonb;
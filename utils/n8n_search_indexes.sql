@@ -0,0 +1,144 @@
+-- Indexes and ranked search for the n8n_* node and credential tables
+--
+-- Adds a weighted full-text search column (name > tools > ts_content) and trigram
+-- indexes on name to every table, so keyword lookups are index scans instead of
+-- sequential scans. rank_n8n_context returns the best matching rows across all
+-- tables, ranked by ts_rank plus trigram word similarity. Rows carry the compact
+-- schema_projection, and the full json_data only when include_json_data is set
+-- (or when the row has no projection yet).
+-- Run after n8n_tables.sql and n8n_schema_projection.sql.
+-- Used by archon/utils/supabase_retriever.py when N8N_RETRIEVAL_MODE is "ranked" (the default).
+
+create extension if not exists pg_trgm;
+
+-- Weighted search vectors. ts_content can hold a node's full source, so only its
+-- start is indexed to stay well below the tsvector size limit.
+alter table n8n_internal_nodes add column if not exists search_vector tsvector
+    generated always as (
+        setweight(to_tsvector('simple'::regconfig, coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('simple'::regconfig, coalesce(tools::text, '')), 'B') ||
+        setweight(to_tsvector('simple'::regconfig, left(coalesce(ts_content, ''), 100000)), 'C')
+    ) stored;
+
+alter table n8n_external_nodes add column if not exists search_vector tsvector
+    generated always as (
+        setweight(to_tsvector('simple'::regconfig, coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('simple'::regconfig, coalesce(tools::text, '')), 'B') ||
+        setweight(to_tsvector('simple'::regconfig, left(coalesce(ts_content, ''), 100000)), 'C')
+    ) stored;
+
+-- Credential tables have no tools column
+alter table n8n_internal_credentials add column if not exists search_vector tsvector
+    generated always as (
+        setweight(to_tsvector('simple'::regconfig, coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('simple'::regconfig, left(coalesce(ts_content, ''), 100000)), 'C')
+    ) stored;
+
+alter table n8n_external_credentials add column if not exists search_vector tsvector
+    generated always as (
+        setweight(to_tsvector('simple'::regconfig, coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('simple'::regconfig, left(coalesce(ts_content, ''), 100000)), 'C')
+    ) stored;
+
+create index if not exists idx_n8n_internal_nodes_search_vector on n8n_internal_nodes using gin (search_vector);
+create index if not exists idx_n8n_external_nodes_search_vector on n8n_external_nodes using gin (search_vector);
+create index if not exists idx_n8n_internal_credentials_search_vector on n8n_internal_credentials using gin (search_vector);
+create index if not exists idx_n8n_external_credentials_search_vector on n8n_external_credentials using gin (search_vector);
+
+-- Trigram indexes serve both the ILIKE '%keyword%' name search and word similarity (%>)
+create index if not exists idx_n8n_internal_nodes_name_trgm on n8n_internal_nodes using gin (name gin_trgm_ops);
+create index if not exists idx_n8n_external_nodes_name_trgm on n8n_external_nodes using gin (name gin_trgm_ops);
+create index if not exists idx_n8n_internal_credentials_name_trgm on n8n_internal_credentials using gin (name gin_trgm_ops);
+create index if not exists idx_n8n_external_credentials_name_trgm on n8n_external_credentials using gin (name gin_trgm_ops);
+
+-- The result columns changed when schema_projection was added, so replace the old versions
+drop function if exists rank_n8n_context(text[], int);
+drop function if exists rank_n8n_table(text, text[], tsquery, int);
+
+-- Ranked search over a single table, returning at most match_count rows
+create or replace function rank_n8n_table (
+  source_table text,
+  keywords text[],
+  query tsquery,
+  match_count int,
+  include_json_data boolean
+) returns table (
+  id bigint,
+  name text,
+  tools text,
+  ts_content text,
+  schema_projection jsonb,
+  json_data jsonb,
+  score real
+)
+language plpgsql stable
+as $$
+begin
+  return query execute format($f$
+    select
+      t.id,
+      t.name::text,
+      %s,
+      t.ts_content::text,
+      t.schema_projection,
+      case when $4 or t.schema_projection is null then t.json_data::jsonb end,
+      (
+        ts_rank(t.search_vector, $2) +
+        coalesce((select max(word_similarity(k, t.name)) from unnest($1) as k), 0)
+      )::real as score
+    from %I t
+    where t.search_vector @@ $2
+       or t.id in (select m.id from %I m, unnest($1) as k where m.name %%> k)
+    order by score desc
+    limit $3
+  $f$,
+    case when source_table like '%_credentials' then 'null::text' else 't.tools::text' end,
+    source_table,
+    source_table
+  )
+  using keywords, query, match_count, include_json_data;
+end;
+$$;
+
+-- Ranked search across all n8n tables
+create or replace function rank_n8n_context (
+  keywords text[],
+  match_count int default 10,
+  include_json_data boolean default false
+) returns table (
+  source_table text,
+  id bigint,
+  name text,
+  tools text,
+  ts_content text,
+  schema_projection jsonb,
+  json_data jsonb,
+  score real
+)
+language sql stable
+as $$
+  with patterns as (
+    select array_agg(distinct lower(trim(k))) as kws
+    from unnest(keywords) as k
+    where trim(k) <> ''
+  ),
+  q as (
+    -- Prefix match on every keyword: 'slack':* | 'google sheets':*
+    select
+      kws,
+      to_tsquery('simple', (select string_agg(quote_literal(kw) || ':*', ' | ') from unnest(kws) as kw)) as query
+    from patterns
+  ),
+  ranked as (
+    select 'n8n_internal_nodes'::text as source_table, r.* from q, rank_n8n_table('n8n_internal_nodes', q.kws, q.query, match_count, include_json_data) r
+    union all
+    select 'n8n_external_nodes'::text, r.* from q, rank_n8n_table('n8n_external_nodes', q.kws, q.query, match_count, include_json_data) r
+    union all
+    select 'n8n_internal_credentials'::text, r.* from q, rank_n8n_table('n8n_internal_credentials', q.kws, q.query, match_count, include_json_data) r
+    union all
+    select 'n8n_external_credentials'::text, r.* from q, rank_n8n_table('n8n_external_credentials', q.kws, q.query, match_count, include_json_data) r
+  )
+  select * from ranked
+  order by score desc, length(name), name
+  limit match_count;
+$$;
@@ -0,0 +1,69 @@
+-- Tables Natenex retrieves n8n node and credential context from
+--
+-- Run the files in this order in the Supabase SQL editor:
+--   1. n8n_tables.sql             (this file)
+--   2. n8n_schema_projection.sql  (compact schema column, for tables created before it existed)
+--      n8n_ingest.sql             (change detection column, for tables created before it existed)
+--   3. n8n_search_indexes.sql     (trigram/full-text indexes and ranked search)
+--   4. n8n_context_search.sql     (name search used as a fallback)
+--   5. n8n_vector_search.sql      (optional: node embeddings and vector search, for
+--                                  N8N_RETRIEVAL_MODE=hybrid)
+-- No vector index or embeddings are needed by default.
+
+create table if not exists n8n_internal_nodes (
+    id bigint generated by default as identity primary key,
+    name text not null unique,
+    tools text,
+    json_data jsonb not null default '{}'::jsonb,
+    schema_projection jsonb,
+    content_hash text,
+    ts_content text,
+    created_at timestamp with time zone default timezone('utc'::text, now()) not null,
+    updated_at timestamp with time zone default timezone('utc'::text, now()) not null
+);
+
+create table if not exists n8n_external_nodes (
+    id bigint generated by default as identity primary key,
+    name text not null unique,
+    tools text,
+    json_data jsonb not null default '{}'::jsonb,
+    schema_projection jsonb,
+    content_hash text,
+    ts_content text,
+    created_at timestamp with time zone default timezone('utc'::text, now()) not null,
+    updated_at timestamp with time zone default timezone('utc'::text, now()) not null
+);
+
+create table if not exists n8n_internal_credentials (
+    id bigint generated by default as identity primary key,
+    name text not null unique,
+    json_data jsonb not null default '{}'::jsonb,
+    schema_projection jsonb,
+    content_hash text,
+    ts_content text,
+    created_at timestamp with time zone default timezone('utc'::text, now()) not null,
+    updated_at timestamp with time zone default timezone('utc'::text, now()) not null
+);
+
+create table if not exists n8n_external_credentials (
+    id bigint generated by default as identity primary key,
+    name text not null unique,
+    json_data jsonb not null default '{}'::jsonb,
+    schema_projection jsonb,
+    content_hash text,
+    ts_content text,
+    created_at timestamp with time zone default timezone('utc'::text, now()) not null,
+    updated_at timestamp with time zone default timezone('utc'::text, now()) not null
+);
+
+-- Everything above will work for any PostgreSQL database. The below commands are for Supabase security
+
+alter table n8n_internal_nodes enable row level security;
+alter table n8n_external_nodes enable row level security;
+alter table n8n_internal_credentials enable row level security;
+alter table n8n_external_credentials enable row level security;
+
+create policy "Allow public read access" on n8n_internal_nodes for select to public using (true);
+create policy "Allow public read access" on n8n_external_nodes for select to public using (true);
+create policy "Allow public read access" on n8n_internal_credentials for select to public using (true);
+create policy "Allow public read access" on n8n_external_credentials for select to public using (true);
@@ -0,0 +1,76 @@
+-- Semantic search over the n8n node tables (hybrid retrieval)
+--
+-- Adds an embedding column with an HNSW index to both node tables, and the
+-- match_n8n_nodes function that returns the nodes closest to a query embedding by
+-- cosine distance. HNSW needs no training data, unlike ivfflat, so the index stays
+-- accurate as nodes are added, and it can be created on empty tables.
+-- Embeddings are written by: python archon/utils/n8n_ingest.py <paths> --embed
+-- Credential tables are only searched by keyword.
+-- Run after n8n_tables.sql and n8n_schema_projection.sql.
+-- Used by archon/utils/supabase_retriever.py when N8N_RETRIEVAL_MODE is "hybrid".
+-- The column size must match EMBEDDING_DIMENSIONS (1536 for text-embedding-3-small).
+
+create extension if not exists vector;
+
+alter table n8n_internal_nodes add column if not exists embedding vector(1536);
+alter table n8n_external_nodes add column if not exists embedding vector(1536);
+
+create index if not exists idx_n8n_internal_nodes_embedding on n8n_internal_nodes
+    using hnsw (embedding vector_cosine_ops) with (m = 16, ef_construction = 64);
+create index if not exists idx_n8n_external_nodes_embedding on n8n_external_nodes
+    using hnsw (embedding vector_cosine_ops) with (m = 16, ef_construction = 64);
+
+-- Nearest nodes across both node tables. Each table is searched with its own
+-- ORDER BY distance LIMIT so both use their HNSW index, then the results are merged.
+create or replace function match_n8n_nodes (
+  query_embedding vector(1536),
+  match_count int default 10,
+  include_json_data boolean default false
+) returns table (
+  source_table text,
+  id bigint,
+  name text,
+  tools text,
+  ts_content text,
+  schema_projection jsonb,
+  json_data jsonb,
+  score real
+)
+language sql stable
+as $$
+  select * from (
+    (
+      select
+        'n8n_internal_nodes'::text,
+        t.id,
+        t.name::text,
+        t.tools::text,
+        t.ts_content::text,
+        t.schema_projection,
+        case when include_json_data or t.schema_projection is null then t.json_data::jsonb end,
+        (1 - (t.embedding <=> query_embedding))::real as score
+      from n8n_internal_nodes t
+      where t.embedding is not null
+      order by t.embedding <=> query_embedding
+      limit match_count
+    )
+    union all
+    (
+      select
+        'n8n_external_nodes'::text,
+        t.id,
+        t.name::text,
+        t.tools::text,
+        t.ts_content::text,
+        t.schema_projection,
+        case when include_json_data or t.schema_projection is null then t.json_data::jsonb end,
+        (1 - (t.embedding <=> query_embedding))::real as score
+      from n8n_external_nodes t
+      where t.embedding is not null
+      order by t.embedding <=> query_embedding
+      limit match_count
+    )
+  ) matches
+  order by score desc
+  limit match_count;
+$$;
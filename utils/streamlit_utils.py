@@ -0,0 +1,63 @@
+"""Helpers used only by the Streamlit UI.
+
+Kept out of utils.utils so that the headless services (graph_service, MCP) don't
+import streamlit at startup.
+"""
+
+import streamlit as st
+import webbrowser
+import importlib
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Helper function to create a button that opens a tab in a new window
+def create_new_tab_button(label, tab_name, key=None, use_container_width=False):
+    """Create a button that opens a specified tab in a new browser window"""
+    # Create a unique key if none provided
+    if key is None:
+        key = f"new_tab_{tab_name.lower().replace(' ', '_')}"
+    
+    # Get the base URL
+    base_url = st.query_params.get("base_url", "")
+    if not base_url:
+        # If base_url is not in query params, use the default localhost URL
+        base_url = "http://localhost:8501"
+    
+    # Create the URL for the new tab
+    new_tab_url = f"{base_url}/?tab={tab_name}"
+    
+    # Create a button that will open the URL in a new tab when clicked
+    if st.button(label, key=key, use_container_width=use_container_width):
+        webbrowser.open_new_tab(new_tab_url)
+
+# Function to reload the archon_graph module
+def reload_archon_graph(show_reload_success=True):
+    """Reload the agent modules and archon_graph to apply new environment variables"""
+    try:
+        # Reload the agent modules first so their cached agents are rebuilt on next use
+        import archon.advisor_agent
+        import archon.pydantic_ai_coder
+        import archon.refiner_agents.prompt_refiner_agent
+        import archon.refiner_agents.tools_refiner_agent
+        import archon.refiner_agents.agent_refiner_agent
+        for module in [
+            archon.advisor_agent,
+            archon.pydantic_ai_coder,
+            archon.refiner_agents.prompt_refiner_agent,
+            archon.refiner_agents.tools_refiner_agent,
+            archon.refiner_agents.agent_refiner_agent
+        ]:
+            importlib.reload(module)
+        
+        # Then reload archon_graph which imports the agent modules
+        import archon.archon_graph
+        importlib.reload(archon.archon_graph)
+        
+        if show_reload_success:
+            st.success("Successfully reloaded Archon modules with new environment variables!")
+        return True
+    except Exception as e:
+        st.error(f"Error reloading Archon modules: {str(e)}")
+        return False        
@@ -1,18 +1,16 @@
-from supabase import Client, create_client
-from openai import AsyncOpenAI
 from dotenv import load_dotenv
-from datetime import datetime
 from functools import wraps
 from typing import Optional
-import streamlit as st
-import webbrowser
-import importlib
-import inspect
+import threading
+import tempfile
+import copy
 import json
+import time
 import sys
 import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.log_writer import create_file_logger
 
 # Load environment variables from .env file
 load_dotenv()
@@ -21,21 +19,108 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
 workbench_dir = os.path.join(parent_dir, "workbench")
 
-def write_to_log(message: str):
+# Writes workbench/logs.txt from a background thread (see log_writer.py)
+file_logger = create_file_logger("archon.workbench", os.path.join(workbench_dir, "logs.txt"))
+
+def write_to_log(message: str, **fields):
     """Write a message to the logs.txt file in the workbench directory.
+
+    The record is queued and written by a background thread, so this is cheap to
+    call from async code.
     
     Args:
         message: The message to log
+        **fields: Optional structured fields (e.g. thread_id, node, latency_ms)
+    """
+    file_logger.info(message, extra={"fields": fields})
+
+class EnvVarsStore:
+    """In-memory snapshot of the env_vars.json file shared by all the env var helpers.
+
+    The file is parsed once and then revalidated with a single os.stat call: the
+    snapshot is only reloaded when the file's mtime, size or inode changes. Writes
+    go to a temporary file that is renamed over the original, so readers never see
+    a half-written file, and the snapshot is replaced with the data just written.
+
+    Args:
+        path: Path to the JSON file storing environment variables
     """
-    # Get the directory one level up from the current file
-    log_path = os.path.join(workbench_dir, "logs.txt")
-    os.makedirs(workbench_dir, exist_ok=True)
 
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_entry = f"[{timestamp}] {message}\n"
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._signature = None
+        self._data: dict = {}
+
+    def _stat_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def load(self) -> dict:
+        """Get the current contents of the file.
+
+        Returns:
+            The parsed file (shared, do not modify), or an empty dict if it doesn't exist
+        """
+        signature = self._stat_signature()
+        if signature is None:
+            return {}
+
+        with self._lock:
+            if signature != self._signature:
+                try:
+                    with open(self.path, "r") as f:
+                        self._data = json.load(f)
+                except (json.JSONDecodeError, IOError) as e:
+                    write_to_log(f"Error reading env_vars.json: {str(e)}")
+                    self._data = {}
+                self._signature = signature
+            return self._data
+
+    def load_for_update(self) -> dict:
+        """Get a private copy of the file contents that can be modified and saved."""
+        return copy.deepcopy(self.load())
+
+    def save(self, env_vars: dict) -> bool:
+        """Atomically replace the file with env_vars and refresh the snapshot.
+
+        Args:
+            env_vars: The complete contents to write
+
+        Returns:
+            True if successful, False otherwise
+        """
+        directory = os.path.dirname(self.path)
+        tmp_path = None
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with tempfile.NamedTemporaryFile("w", dir=directory, prefix=".env_vars.", suffix=".tmp", delete=False) as f:
+                tmp_path = f.name
+                json.dump(env_vars, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except (IOError, OSError) as e:
+            write_to_log(f"Error writing to env_vars.json: {str(e)}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+
+        with self._lock:
+            self._data = copy.deepcopy(env_vars)
+            self._signature = self._stat_signature()
+        return True
 
-    with open(log_path, "a", encoding="utf-8") as f:
-        f.write(log_entry)
+    def invalidate(self):
+        """Force the next load to re-read the file."""
+        with self._lock:
+            self._signature = None
+
+# Single store for workbench/env_vars.json
+env_vars_store = EnvVarsStore(os.path.join(workbench_dir, "env_vars.json"))
 
 def get_env_var(var_name: str, profile: Optional[str] = None) -> Optional[str]:
     """Get an environment variable from the saved JSON file or from environment variables.
@@ -47,29 +132,21 @@ def get_env_var(var_name: str, profile: Optional[str] = None) -> Optional[str]:
     Returns:
         The value of the environment variable or None if not found
     """
-    # Path to the JSON file storing environment variables
-    env_file_path = os.path.join(workbench_dir, "env_vars.json")
-    
     # First try to get from JSON file
-    if os.path.exists(env_file_path):
-        try:
-            with open(env_file_path, "r") as f:
-                env_vars = json.load(f)
-                
-                # If profile is specified, use it; otherwise use current profile
-                current_profile = profile or env_vars.get("current_profile", "default")
-                
-                # Get variables for the profile
-                if "profiles" in env_vars and current_profile in env_vars["profiles"]:
-                    profile_vars = env_vars["profiles"][current_profile]
-                    if var_name in profile_vars and profile_vars[var_name]:
-                        return profile_vars[var_name]
-                
-                # For backward compatibility, check the root level
-                if var_name in env_vars and env_vars[var_name]:
-                    return env_vars[var_name]
-        except (json.JSONDecodeError, IOError) as e:
-            write_to_log(f"Error reading env_vars.json: {str(e)}")
+    env_vars = env_vars_store.load()
+
+    # If profile is specified, use it; otherwise use current profile
+    current_profile = profile or env_vars.get("current_profile", "default")
+
+    # Get variables for the profile
+    if "profiles" in env_vars and current_profile in env_vars["profiles"]:
+        profile_vars = env_vars["profiles"][current_profile]
+        if var_name in profile_vars and profile_vars[var_name]:
+            return profile_vars[var_name]
+
+    # For backward compatibility, check the root level
+    if var_name in env_vars and env_vars[var_name]:
+        return env_vars[var_name]
     
     # If not found in JSON, try to get from environment variables
     return os.environ.get(var_name)
@@ -85,19 +162,8 @@ def save_env_var(var_name: str, value: str, profile: Optional[str] = None) -> bo
     Returns:
         True if successful, False otherwise
     """
-    # Path to the JSON file storing environment variables
-    env_file_path = os.path.join(workbench_dir, "env_vars.json")
-    os.makedirs(workbench_dir, exist_ok=True)
-    
-    # Load existing env vars or create empty dict
-    env_vars = {}
-    if os.path.exists(env_file_path):
-        try:
-            with open(env_file_path, "r") as f:
-                env_vars = json.load(f)
-        except (json.JSONDecodeError, IOError) as e:
-            write_to_log(f"Error reading env_vars.json: {str(e)}")
-            # Continue with empty dict if file is corrupted
+    # Load existing env vars (empty dict if the file is missing or corrupted)
+    env_vars = env_vars_store.load_for_update()
     
     # Initialize profiles structure if it doesn't exist
     if "profiles" not in env_vars:
@@ -118,13 +184,7 @@ def save_env_var(var_name: str, value: str, profile: Optional[str] = None) -> bo
     env_vars["profiles"][current_profile][var_name] = value
     
     # Save back to file
-    try:
-        with open(env_file_path, "w") as f:
-            json.dump(env_vars, f, indent=2)
-        return True
-    except IOError as e:
-        write_to_log(f"Error writing to env_vars.json: {str(e)}")
-        return False
+    return env_vars_store.save(env_vars)
 
 def get_current_profile() -> str:
     """Get the current environment profile name.
@@ -132,17 +192,7 @@ def get_current_profile() -> str:
     Returns:
         The name of the current profile, defaults to "default" if not set
     """
-    env_file_path = os.path.join(workbench_dir, "env_vars.json")
-    
-    if os.path.exists(env_file_path):
-        try:
-            with open(env_file_path, "r") as f:
-                env_vars = json.load(f)
-                return env_vars.get("current_profile", "default")
-        except (json.JSONDecodeError, IOError) as e:
-            write_to_log(f"Error reading env_vars.json: {str(e)}")
-    
-    return "default"
+    return env_vars_store.load().get("current_profile", "default")
 
 def set_current_profile(profile_name: str) -> bool:
     """Set the current environment profile.
@@ -153,18 +203,8 @@ def set_current_profile(profile_name: str) -> bool:
     Returns:
         True if successful, False otherwise
     """
-    env_file_path = os.path.join(workbench_dir, "env_vars.json")
-    os.makedirs(workbench_dir, exist_ok=True)
-    
-    # Load existing env vars or create empty dict
-    env_vars = {}
-    if os.path.exists(env_file_path):
-        try:
-            with open(env_file_path, "r") as f:
-                env_vars = json.load(f)
-        except (json.JSONDecodeError, IOError) as e:
-            write_to_log(f"Error reading env_vars.json: {str(e)}")
-            # Continue with empty dict if file is corrupted
+    # Load existing env vars (empty dict if the file is missing or corrupted)
+    env_vars = env_vars_store.load_for_update()
     
     # Initialize profiles structure if it doesn't exist
     if "profiles" not in env_vars:
@@ -178,13 +218,7 @@ def set_current_profile(profile_name: str) -> bool:
     env_vars["current_profile"] = profile_name
     
     # Save back to file
-    try:
-        with open(env_file_path, "w") as f:
-            json.dump(env_vars, f, indent=2)
-        return True
-    except IOError as e:
-        write_to_log(f"Error writing to env_vars.json: {str(e)}")
-        return False
+    return env_vars_store.save(env_vars)
 
 def get_all_profiles() -> list:
     """Get a list of all available environment profiles.
@@ -192,16 +226,9 @@ def get_all_profiles() -> list:
     Returns:
         List of profile names
     """
-    env_file_path = os.path.join(workbench_dir, "env_vars.json")
-    
-    if os.path.exists(env_file_path):
-        try:
-            with open(env_file_path, "r") as f:
-                env_vars = json.load(f)
-                if "profiles" in env_vars:
-                    return list(env_vars["profiles"].keys())
-        except (json.JSONDecodeError, IOError) as e:
-            write_to_log(f"Error reading env_vars.json: {str(e)}")
+    env_vars = env_vars_store.load()
+    if "profiles" in env_vars:
+        return list(env_vars["profiles"].keys())
     
     # Return default if no profiles exist
     return ["default"]
@@ -215,18 +242,8 @@ def create_profile(profile_name: str) -> bool:
     Returns:
         True if successful, False otherwise
     """
-    env_file_path = os.path.join(workbench_dir, "env_vars.json")
-    os.makedirs(workbench_dir, exist_ok=True)
-    
-    # Load existing env vars or create empty dict
-    env_vars = {}
-    if os.path.exists(env_file_path):
-        try:
-            with open(env_file_path, "r") as f:
-                env_vars = json.load(f)
-        except (json.JSONDecodeError, IOError) as e:
-            write_to_log(f"Error reading env_vars.json: {str(e)}")
-            # Continue with empty dict if file is corrupted
+    # Load existing env vars (empty dict if the file is missing or corrupted)
+    env_vars = env_vars_store.load_for_update()
     
     # Initialize profiles structure if it doesn't exist
     if "profiles" not in env_vars:
@@ -237,13 +254,7 @@ def create_profile(profile_name: str) -> bool:
         env_vars["profiles"][profile_name] = {}
         
         # Save back to file
-        try:
-            with open(env_file_path, "w") as f:
-                json.dump(env_vars, f, indent=2)
-            return True
-        except IOError as e:
-            write_to_log(f"Error writing to env_vars.json: {str(e)}")
-            return False
+        return env_vars_store.save(env_vars)
     
     # Profile already exists
     return True
@@ -261,27 +272,18 @@ def delete_profile(profile_name: str) -> bool:
     if profile_name == "default":
         return False
         
-    env_file_path = os.path.join(workbench_dir, "env_vars.json")
-    
-    if os.path.exists(env_file_path):
-        try:
-            with open(env_file_path, "r") as f:
-                env_vars = json.load(f)
+    env_vars = env_vars_store.load_for_update()
                 
-            if "profiles" in env_vars and profile_name in env_vars["profiles"]:
-                # Delete the profile
-                del env_vars["profiles"][profile_name]
-                
-                # If the current profile was deleted, set to default
-                if env_vars.get("current_profile") == profile_name:
-                    env_vars["current_profile"] = "default"
-                
-                # Save back to file
-                with open(env_file_path, "w") as f:
-                    json.dump(env_vars, f, indent=2)
-                return True
-        except (json.JSONDecodeError, IOError) as e:
-            write_to_log(f"Error reading/writing env_vars.json: {str(e)}")
+    if "profiles" in env_vars and profile_name in env_vars["profiles"]:
+        # Delete the profile
+        del env_vars["profiles"][profile_name]
+        
+        # If the current profile was deleted, set to default
+        if env_vars.get("current_profile") == profile_name:
+            env_vars["current_profile"] = "default"
+        
+        # Save back to file
+        return env_vars_store.save(env_vars)
     
     return False
 
@@ -294,27 +296,20 @@ def get_profile_env_vars(profile_name: Optional[str] = None) -> dict:
     Returns:
         Dictionary of environment variables for the profile
     """
-    env_file_path = os.path.join(workbench_dir, "env_vars.json")
-    
-    if os.path.exists(env_file_path):
-        try:
-            with open(env_file_path, "r") as f:
-                env_vars = json.load(f)
-                
-                # If profile is specified, use it; otherwise use current profile
-                current_profile = profile_name or env_vars.get("current_profile", "default")
-                
-                # Get variables for the profile
-                if "profiles" in env_vars and current_profile in env_vars["profiles"]:
-                    return env_vars["profiles"][current_profile]
+    env_vars = env_vars_store.load()
                 
-                # For backward compatibility, if no profiles structure but we're looking for default
-                if current_profile == "default" and "profiles" not in env_vars:
-                    # Return all variables except profiles and current_profile
-                    return {k: v for k, v in env_vars.items() 
-                            if k not in ["profiles", "current_profile"]}
-        except (json.JSONDecodeError, IOError) as e:
-            write_to_log(f"Error reading env_vars.json: {str(e)}")
+    # If profile is specified, use it; otherwise use current profile
+    current_profile = profile_name or env_vars.get("current_profile", "default")
+    
+    # Get variables for the profile
+    if "profiles" in env_vars and current_profile in env_vars["profiles"]:
+        return dict(env_vars["profiles"][current_profile])
+    
+    # For backward compatibility, if no profiles structure but we're looking for default
+    if current_profile == "default" and "profiles" not in env_vars:
+        # Return all variables except profiles and current_profile
+        return {k: v for k, v in env_vars.items() 
+                if k not in ["profiles", "current_profile"]}
     
     return {}
 
@@ -327,73 +322,31 @@ def log_node_execution(func):
     @wraps(func)
     async def wrapper(*args, **kwargs):
         func_name = func.__name__
-        write_to_log(f"Starting node: {func_name}")
+        write_to_log(f"Starting node: {func_name}", node=func_name)
+        start = time.perf_counter()
         try:
             result = await func(*args, **kwargs)
-            write_to_log(f"Completed node: {func_name}")
+            latency_ms = round((time.perf_counter() - start) * 1000, 1)
+            write_to_log(f"Completed node: {func_name}", node=func_name, latency_ms=latency_ms)
             return result
         except Exception as e:
-            write_to_log(f"Error in node {func_name}: {str(e)}")
+            latency_ms = round((time.perf_counter() - start) * 1000, 1)
+            write_to_log(f"Error in node {func_name}: {str(e)}", node=func_name, latency_ms=latency_ms)
             raise
     return wrapper
 
-# Helper function to create a button that opens a tab in a new window
-def create_new_tab_button(label, tab_name, key=None, use_container_width=False):
-    """Create a button that opens a specified tab in a new browser window"""
-    # Create a unique key if none provided
-    if key is None:
-        key = f"new_tab_{tab_name.lower().replace(' ', '_')}"
-    
-    # Get the base URL
-    base_url = st.query_params.get("base_url", "")
-    if not base_url:
-        # If base_url is not in query params, use the default localhost URL
-        base_url = "http://localhost:8501"
-    
-    # Create the URL for the new tab
-    new_tab_url = f"{base_url}/?tab={tab_name}"
-    
-    # Create a button that will open the URL in a new tab when clicked
-    if st.button(label, key=key, use_container_width=use_container_width):
-        webbrowser.open_new_tab(new_tab_url)
-
-# Function to reload the archon_graph module
-def reload_archon_graph(show_reload_success=True):
-    """Reload the archon_graph module to apply new environment variables"""
-    try:
-        # First reload pydantic_ai_coder
-        import archon.pydantic_ai_coder
-        importlib.reload(archon.pydantic_ai_coder)
-        
-        # Then reload archon_graph which imports pydantic_ai_coder
-        import archon.archon_graph
-        importlib.reload(archon.archon_graph)
+def get_clients():
+    """Create the embedding and Supabase clients.
 
-        # Then reload the crawler
-        import archon.crawl_pydantic_ai_docs
-        importlib.reload(archon.crawl_pydantic_ai_docs)        
-        
-        if show_reload_success:
-            st.success("Successfully reloaded Archon modules with new environment variables!")
-        return True
-    except Exception as e:
-        st.error(f"Error reloading Archon modules: {str(e)}")
-        return False        
+    The client libraries are imported here rather than at module level so that
+    importing utils.utils stays cheap for the headless services.
 
-def get_clients():
-    # LLM client setup
-    embedding_client = None
-    base_url = get_env_var('EMBEDDING_BASE_URL') or 'https://api.openai.com/v1'
-    api_key = get_env_var('EMBEDDING_API_KEY') or 'no-api-key-provided'
-    provider = get_env_var('EMBEDDING_PROVIDER') or 'OpenAI'
-    
-    # Setup OpenAI client for LLM
-    if provider == "Ollama":
-        if api_key == "NOT_REQUIRED":
-            api_key = "ollama"  # Use a dummy key for Ollama
-        embedding_client = AsyncOpenAI(base_url=base_url, api_key=api_key)
-    else:
-        embedding_client = AsyncOpenAI(base_url=base_url, api_key=api_key)
+    Returns:
+        tuple: (embedding_client, supabase), supabase is None if not configured
+    """
+    # LLM client setup (shared with the agents through the model registry's connection pool)
+    from archon.model_registry import get_embedding_client
+    embedding_client = get_embedding_client()
 
     # Supabase client setup
     supabase = None
@@ -401,6 +354,7 @@ def get_clients():
     supabase_key = get_env_var("SUPABASE_SERVICE_KEY")
     if supabase_url and supabase_key:
         try:
+            from supabase import Client
             supabase: Client = Client(supabase_url, supabase_key)
         except Exception as e:
             print(f"Failed to initialize Supabase: {e}")